@@ -0,0 +1,109 @@
+"""
+Background AI Move Worker
+
+Computes engine moves on a worker thread so a GUI event loop keeps running
+while the model thinks. Results are handed back through a callback (the
+pygame GUI posts them as a custom event). While the human is choosing a
+move, the worker pre-computes the AI's replies to the human's candidate
+moves, so an expected move is answered from the cache without waiting.
+The reply the engine predicts for the human (its ponder move) is
+pre-computed first, so the likely move is ready almost at once.
+"""
+
+import queue
+import threading
+from engine import evaluate_moves, ponder_move
+
+MAX_PRECOMPUTED = 256  # Cached replies kept at most
+
+
+def position_key(board):
+    """Cache key of a position (FEN without the move counters)."""
+    return board.epd()
+
+
+class AIWorker:
+    """Runs evaluate_moves on a single background thread.
+
+    on_result(move, key) is called from the worker thread with the chosen
+    move and the position_key of the position it was computed for, so the
+    caller can ignore stale results.
+    """
+
+    def __init__(self, on_result):
+        self.on_result = on_result
+        self.tasks = queue.Queue()
+        self.replies = {}  # position_key -> precomputed reply
+        self.expected = {}  # position_key -> predicted human move there
+        self.lock = threading.Lock()
+        self.generation = 0  # Bumped by every request to abort pre-computation
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def request_move(self, board):
+        """Ask for the AI's move in board; answered instantly if precomputed."""
+        key = position_key(board)
+        with self.lock:
+            self.generation += 1
+            move = self.replies.get(key)
+        if move is not None and move in board.legal_moves:
+            self.on_result(move, key)
+        else:
+            self.tasks.put(("move", board.copy(), self.generation))
+
+    def precompute_replies(self, board):
+        """Start computing the AI's replies to every move available in board."""
+        with self.lock:
+            self.generation += 1
+            self.replies.clear()
+        self.tasks.put(("precompute", board.copy(), self.generation))
+
+    def stop(self):
+        with self.lock:
+            self.generation += 1
+        self.tasks.put(None)
+
+    def _aborted(self, generation):
+        with self.lock:
+            return generation != self.generation
+
+    def _run(self):
+        while True:
+            task = self.tasks.get()
+            if task is None:
+                return
+            kind, board, generation = task
+            if kind == "move":
+                move = evaluate_moves(board)
+                self.on_result(move, position_key(board))
+                if move is not None:
+                    # Predict the human's answer while they are still looking at the move
+                    expected = ponder_move(board, move)
+                    board.push(move)
+                    with self.lock:
+                        self.expected = {position_key(board): expected} if expected else {}
+                    board.pop()
+            elif kind == "precompute":
+                self._precompute(board, generation)
+
+    def _precompute(self, board, generation):
+        moves = list(board.legal_moves)
+        with self.lock:
+            expected = self.expected.get(position_key(board))
+        if expected in moves:
+            moves.remove(expected)
+            moves.insert(0, expected)
+        for move in moves:
+            # A real request takes priority over speculative work
+            if self._aborted(generation) or not self.tasks.empty():
+                return
+            board.push(move)
+            key = position_key(board)
+            if not board.is_game_over():
+                reply = evaluate_moves(board)
+                with self.lock:
+                    if generation != self.generation or len(self.replies) >= MAX_PRECOMPUTED:
+                        board.pop()
+                        return
+                    self.replies[key] = reply
+            board.pop()
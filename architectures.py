@@ -0,0 +1,145 @@
+"""
+Model Architecture Registry and Inference Profiler
+
+Named value-network architectures shared by every script. An architecture
+is its list of hidden layers as (units, dropout); the input is the 768-value
+board encoding and the output a single linear value.
+
+    small     128-64               train_custom.py, engine.py fallback
+    standard  128-64-32            RLChessAgent, engine.py's new model
+    deep      256-128-64-32        train_model.py (dropout 0.2 after the first two)
+
+Anywhere an architecture is expected, widths such as "256-64" work too.
+
+The profiler reports what each one costs at play time on this machine:
+parameter count, FLOPs per position (a multiply-add counts as two) and the
+measured latency of one position and the throughput of batches, both
+through model.predict() as the engine calls it and through a direct model
+call. Pair it with sweep.py (hidden=small,deep) for the accuracy side.
+
+Usage: python architectures.py [small standard deep 256-64] [--batches 1,32,1024]
+       python architectures.py --model chess_model_complex.h5
+"""
+
+import os
+import time
+import argparse
+import numpy as np
+
+INPUT_SIZE = 8 * 8 * 12
+PROFILE_BATCHES = (1, 32, 1024)  # Single position, a move list, an MCTS leaf batch
+PROFILE_SECONDS = 0.5  # Measuring time per latency figure
+
+ARCHITECTURES = {
+    "small": [(128, 0.0), (64, 0.0)],
+    "standard": [(128, 0.0), (64, 0.0), (32, 0.0)],
+    "deep": [(256, 0.2), (128, 0.2), (64, 0.0), (32, 0.0)],
+}
+
+
+def hidden_layers(architecture):
+    """[(units, dropout)] of a registered name, of widths like "128-64", or of a list of widths."""
+    if isinstance(architecture, str) and architecture in ARCHITECTURES:
+        return ARCHITECTURES[architecture]
+    if isinstance(architecture, str):
+        widths = architecture.split("-")
+    elif isinstance(architecture, int):
+        widths = [architecture]
+    else:
+        widths = architecture
+    try:
+        return [(int(units), 0.0) for units in widths]
+    except ValueError:
+        raise ValueError(f"Unknown architecture {architecture!r}; registered: {', '.join(ARCHITECTURES)}")
+
+
+def build_model(architecture, learning_rate=0.001, compile=True):
+    """Keras Sequential model of an architecture, compiled with Adam and MSE unless compile is False."""
+    from tensorflow.keras.models import Sequential
+    from tensorflow.keras.layers import Dense, Dropout
+    from tensorflow.keras.optimizers import Adam
+
+    model = Sequential()
+    for i, (units, dropout) in enumerate(hidden_layers(architecture)):
+        if i == 0:
+            model.add(Dense(units, activation="relu", input_shape=(INPUT_SIZE,)))
+        else:
+            model.add(Dense(units, activation="relu"))
+        if dropout:
+            model.add(Dropout(dropout))
+    model.add(Dense(1, activation="linear"))
+    if compile:
+        model.compile(optimizer=Adam(learning_rate=learning_rate), loss="mse", metrics=["mae"])
+    return model
+
+
+def model_flops(model):
+    """FLOPs per position of a model's Dense layers: 2 per multiply-add, plus bias and activation per unit."""
+    from model_artifact import dense_layers
+    return sum(2 * kernel.shape[0] * kernel.shape[1] + 2 * kernel.shape[1] for kernel, _, _ in dense_layers(model))
+
+
+def latency(call, inputs, min_time=PROFILE_SECONDS):
+    """Seconds per call(inputs), measured for at least min_time after a warm-up call."""
+    call(inputs)  # Warm-up (graph tracing, allocation)
+    calls = 0
+    start = time.perf_counter()
+    while time.perf_counter() - start < min_time:
+        call(inputs)
+        calls += 1
+    return (time.perf_counter() - start) / calls
+
+
+def profile(model, batches=PROFILE_BATCHES):
+    """Return {"params", "flops", "predict", "call"}; latencies map batch size -> seconds per call."""
+    rng = np.random.default_rng(0)
+    result = {"params": model.count_params(), "flops": model_flops(model), "predict": {}, "call": {}}
+    for batch_size in batches:
+        inputs = (rng.random((batch_size, INPUT_SIZE)) < 0.04).astype(np.float32)  # About 32 pieces
+        result["predict"][batch_size] = latency(lambda x: model.predict(x, verbose=0), inputs)
+        result["call"][batch_size] = latency(lambda x: model(x, training=False), inputs)
+    return result
+
+
+def print_profiles(profiles, batches=PROFILE_BATCHES):
+    """Print one row per (name, profile()) pair."""
+    header = f"{'architecture':16s} {'params':>9} {'MFLOPs':>7} {'1 pos predict ms':>16} {'1 pos call ms':>13}"
+    header += "".join(f" {f'{b} pos/s':>11}" for b in batches if b > 1)
+    print(header)
+    for name, result in profiles:
+        row = (f"{name:16s} {result['params']:>9} {result['flops'] / 1e6:>7.3f} "
+               f"{result['predict'][batches[0]] * 1000:>16.3f} {result['call'][batches[0]] * 1000:>13.3f}")
+        row += "".join(f" {b / result['predict'][b]:>11.0f}" for b in batches if b > 1)
+        print(row)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Profile the inference cost of value-network architectures.")
+    parser.add_argument("architectures", nargs="*", help="registered names or widths like 256-64 (default: all)")
+    parser.add_argument("--model", action="append", default=[], help="also profile a saved Keras model or artifact")
+    parser.add_argument("--batches", default=",".join(map(str, PROFILE_BATCHES)),
+                        help="comma-separated batch sizes; the first is used for single-call latency")
+    parser.add_argument("--threads", type=int, help="TensorFlow intra-op threads (default: all cores)")
+    args = parser.parse_args()
+    batches = [int(b) for b in args.batches.split(",")]
+
+    import tensorflow as tf
+    if args.threads:
+        tf.config.threading.set_intra_op_parallelism_threads(args.threads)
+    names = args.architectures or ([] if args.model else list(ARCHITECTURES))
+    profiles = []
+    for name in names:
+        profiles.append((name, profile(build_model(name, compile=False), batches)))
+    for path in args.model:
+        if os.path.exists(path):
+            model = tf.keras.models.load_model(path, compile=False)
+        else:
+            import model_artifact
+            model = model_artifact.load_model(path)[1]
+        profiles.append((os.path.basename(path), profile(model, batches)))
+    print(f"{os.cpu_count()} CPUs, TensorFlow {tf.__version__}")
+    print_profiles(profiles, batches)
+
+
+if __name__ == "__main__":
+    main()
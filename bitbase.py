@@ -0,0 +1,475 @@
+"""
+Endgame Bitbase Generator
+
+Offline retrograde analysis of 3-piece endgames (KQvK, KRvK, KPvK, ...).
+Every position is solved to win/draw/loss for the side to move and stored
+as compact bit arrays indexed by a canonical position index, so the engine
+can probe a position in O(1) before calling the model.
+
+Positions are reduced by symmetry: the stronger side is always normalized to
+White, and the board is mirrored so the white king lies in the a1-d1-d4
+triangle (pawnless) or on files a-d (with pawns). Next to the two WDL bit
+arrays every table stores a depth byte per position: plies until mate with
+best play, counted through captures and promotions into smaller tables, so
+the engine converts won positions instead of shuffling between them.
+
+4-piece tables (KQvKR, ...) are not supported: solving millions of
+positions with python-chess move generation is impractical here.
+
+--verify plays the positions of PLAYOUT_SUITE out with the tables on both
+sides and checks that every won position ends in mate.
+
+Usage: python bitbase.py [KQvK KRvK KPvK ...] [--out bitbases] [--verify]
+"""
+
+import os
+import struct
+import argparse
+import numpy as np
+import chess
+
+BITBASE_DIR = "bitbases"
+MAX_PIECES = 3
+DEFAULT_SIGNATURES = ["KQvK", "KRvK", "KPvK"]
+
+WIN, DRAW, LOSS = 1, 0, -1
+MAX_DEPTH = 255
+
+HEADER_STRUCT = struct.Struct("<4sI")  # magic, number of positions
+MAGIC = b"BB02"  # BB01 tables counted depth only to the next smaller table
+
+PIECE_ORDER = "KQRBNP"
+PIECE_VALUES = {"K": 0, "Q": 9, "R": 5, "B": 3, "N": 3, "P": 1}
+
+# Won positions that --verify plays out to mate: (name, FEN)
+PLAYOUT_SUITE = [
+    ("KPvK loss", "4k3/8/4K3/4P3/8/8/8/8 b - - 0 1"),
+    ("KPvK win", "4k3/8/4K3/4P3/8/8/8/8 w - - 0 1"),
+    ("KPvK race", "7k/8/8/8/8/8/2PK4/8 b - - 0 1"),
+    ("KQvK", "8/8/8/3k4/8/8/8/Q3K3 w - - 0 1"),
+    ("KRvK", "8/8/8/3k4/8/8/8/R3K3 w - - 0 1"),
+    ("KRvK black", "r3k3/8/8/8/3K4/8/8/8 b - - 0 1"),
+]
+MAX_PLAYOUT_PLIES = 200
+
+# White king regions used for symmetry reduction
+TRIANGLE = [chess.A1, chess.B1, chess.C1, chess.D1, chess.B2,
+            chess.C2, chess.D2, chess.C3, chess.D3, chess.D4]
+HALF_BOARD = [square for square in chess.SQUARES if chess.square_file(square) < 4]
+
+
+def _flip_file(square):
+    return square ^ 7
+
+
+def _flip_rank(square):
+    return square ^ 56
+
+
+def _transpose(square):
+    return chess.square(chess.square_rank(square), chess.square_file(square))
+
+
+# Identity comes first so positions already in the region map to themselves
+PAWNLESS_TRANSFORMS = [
+    lambda s: s,
+    _flip_file,
+    _flip_rank,
+    lambda s: _flip_rank(_flip_file(s)),
+    _transpose,
+    lambda s: _transpose(_flip_file(s)),
+    lambda s: _transpose(_flip_rank(s)),
+    lambda s: _transpose(_flip_rank(_flip_file(s))),
+]
+PAWN_TRANSFORMS = PAWNLESS_TRANSFORMS[:2]
+
+
+def _side_string(board, color):
+    """Piece letters of one side in canonical order, e.g. "KQ"."""
+    return "".join(letter * chess.popcount(board.pieces_mask(chess.PIECE_SYMBOLS.index(letter.lower()), color))
+                   for letter in PIECE_ORDER)
+
+
+def _strength(side):
+    return (sum(PIECE_VALUES[letter] for letter in side), len(side), side)
+
+
+def signature_of(board):
+    """Material signature with the stronger side first, e.g. "KRvKN"."""
+    white, black = _side_string(board, chess.WHITE), _side_string(board, chess.BLACK)
+    if _strength(black) > _strength(white):
+        white, black = black, white
+    return f"{white}v{black}"
+
+
+def _table_layout(signature):
+    """Return (piece list, king region, transforms) for a signature."""
+    white, black = signature.split("v")
+    pieces = [(chess.KING, chess.WHITE), (chess.KING, chess.BLACK)]
+    pieces += [(chess.PIECE_SYMBOLS.index(letter.lower()), chess.WHITE) for letter in white[1:]]
+    pieces += [(chess.PIECE_SYMBOLS.index(letter.lower()), chess.BLACK) for letter in black[1:]]
+    if "P" in signature:
+        return pieces, HALF_BOARD, PAWN_TRANSFORMS
+    return pieces, TRIANGLE, PAWNLESS_TRANSFORMS
+
+
+def table_size(signature):
+    pieces, region, _ = _table_layout(signature)
+    return len(region) * 64 ** (len(pieces) - 1) * 2
+
+
+def canonical_index(board):
+    """Return (signature, index) of a position, or None if it cannot be indexed.
+
+    Positions with castling rights, a legal en passant capture or more than
+    MAX_PIECES pieces are not covered by the tables.
+    """
+    if chess.popcount(board.occupied) > MAX_PIECES or board.castling_rights:
+        return None
+    if board.ep_square is not None and board.has_legal_en_passant():
+        return None
+
+    white, black = _side_string(board, chess.WHITE), _side_string(board, chess.BLACK)
+    if _strength(black) > _strength(white):
+        board = board.mirror()
+        white, black = black, white
+    signature = f"{white}v{black}"
+    pieces, region, transforms = _table_layout(signature)
+
+    white_king = board.king(chess.WHITE)
+    for transform in transforms:
+        if transform(white_king) in region:
+            break
+
+    # Squares in layout order; identical pieces are sorted by square
+    groups = {}
+    for square, piece in board.piece_map().items():
+        groups.setdefault((piece.piece_type, piece.color), []).append(transform(square))
+    index = region.index(transform(white_king))
+    used = {}
+    for piece in pieces[1:]:
+        squares = sorted(groups[piece])
+        index = index * 64 + squares[used.get(piece, 0)]
+        used[piece] = used.get(piece, 0) + 1
+    return signature, index * 2 + (board.turn == chess.BLACK)
+
+
+def _decode(signature, index):
+    """Build the board for a table index, or None for an impossible position."""
+    pieces, region, _ = _table_layout(signature)
+    turn = chess.BLACK if index & 1 else chess.WHITE
+    index >>= 1
+    squares = []
+    for _ in pieces[1:]:
+        index, square = divmod(index, 64)
+        squares.append(square)
+    squares.append(region[index])
+    squares.reverse()
+
+    if len(set(squares)) != len(squares):
+        return None
+    board = chess.Board(None)
+    for (piece_type, color), square in zip(pieces, squares):
+        if piece_type == chess.PAWN and chess.square_rank(square) in (0, 7):
+            return None
+        board.set_piece_at(square, chess.Piece(piece_type, color))
+    board.turn = turn
+    if not board.is_valid():
+        return None
+    return board
+
+
+class Bitbase:
+    """A solved endgame table: WDL bit arrays plus a depth byte per position."""
+
+    def __init__(self, signature, win_bits, loss_bits, depth):
+        self.signature = signature
+        self.win_bits = win_bits
+        self.loss_bits = loss_bits
+        self.depth = depth
+
+    def probe_index(self, index):
+        """Return (wdl, depth) for a canonical index."""
+        byte, bit = index >> 3, 0x80 >> (index & 7)
+        if self.win_bits[byte] & bit:
+            return WIN, int(self.depth[index])
+        if self.loss_bits[byte] & bit:
+            return LOSS, int(self.depth[index])
+        return DRAW, 0
+
+    def save(self, path):
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "wb") as table_file:
+            table_file.write(HEADER_STRUCT.pack(MAGIC, len(self.depth)))
+            table_file.write(self.win_bits.tobytes())
+            table_file.write(self.loss_bits.tobytes())
+            table_file.write(self.depth.tobytes())
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, signature, path):
+        with open(path, "rb") as table_file:
+            magic, size = HEADER_STRUCT.unpack(table_file.read(HEADER_STRUCT.size))
+            if magic != MAGIC:
+                raise IOError(f"{path} is not a bitbase file")
+            packed = (size + 7) // 8
+            win_bits = np.fromfile(table_file, dtype=np.uint8, count=packed)
+            loss_bits = np.fromfile(table_file, dtype=np.uint8, count=packed)
+            depth = np.fromfile(table_file, dtype=np.uint8, count=size)
+        return cls(signature, win_bits, loss_bits, depth)
+
+
+class BitbaseSet:
+    """Loads, generates and probes tables from a directory."""
+
+    def __init__(self, directory=BITBASE_DIR, generate_missing=False):
+        self.directory = directory
+        self.generate_missing = generate_missing
+        self.tables = {}
+
+    def table(self, signature):
+        if signature not in self.tables:
+            path = os.path.join(self.directory, f"{signature}.bb")
+            table = None
+            if os.path.exists(path):
+                try:
+                    table = Bitbase.load(signature, path)
+                except IOError as e:
+                    print(f"Ignoring {path}: {e}")
+            if table is not None:
+                self.tables[signature] = table
+            elif self.generate_missing:
+                self.tables[signature] = generate(signature, self)
+                os.makedirs(self.directory, exist_ok=True)
+                self.tables[signature].save(path)
+                print(f"Bitbase {signature} saved to {path}")
+            else:
+                self.tables[signature] = None
+        return self.tables[signature]
+
+    def probe(self, board):
+        """Return (wdl, depth) for the side to move, or None if not covered."""
+        if board.is_insufficient_material():
+            return DRAW, 0
+        key = canonical_index(board)
+        if key is None:
+            return None
+        table = self.table(key[0])
+        if table is None:
+            return None
+        return table.probe_index(key[1])
+
+
+def select_moves(tables, board, legal_moves):
+    """Narrow legal_moves down using the tables.
+
+    Returns the fastest win as a single move, the drawing moves if no move
+    wins, or the longest resistance if every move loses. Returns None if some
+    successor is not covered by the tables.
+    """
+    results = []
+    for move in legal_moves:
+        board.push(move)
+        result = tables.probe(board)
+        board.pop()
+        if result is None:
+            return None
+        results.append((move, result[0], result[1]))
+
+    # Results are from the opponent's point of view after the move
+    wins = [(depth, move) for move, value, depth in results if value == LOSS]
+    if wins:
+        return [min(wins, key=lambda entry: entry[0])[1]]
+    draws = [move for move, value, _ in results if value == DRAW]
+    if draws:
+        return draws
+    return [max(((depth, move) for move, _, depth in results), key=lambda entry: entry[0])[1]]
+
+
+def playout(tables, board, max_plies=MAX_PLAYOUT_PLIES):
+    """Play both sides with select_moves; return the final board."""
+    board = board.copy(stack=False)
+    while not board.is_game_over() and len(board.move_stack) < max_plies:
+        candidates = select_moves(tables, board, list(board.legal_moves))
+        if not candidates:
+            break
+        board.push(candidates[0])
+    return board
+
+
+def run_verify(tables):
+    """Play out PLAYOUT_SUITE; returns True if every won position ends in mate by the winner."""
+    all_ok = True
+    print(f"{'position':16s} {'probe':>6} {'depth':>5} {'plies':>5} {'result':22s} {'ok':>3}")
+    for name, fen in PLAYOUT_SUITE:
+        board = chess.Board(fen)
+        result = tables.probe(board)
+        if result is None:
+            print(f"{name:16s} not covered by the tables")
+            all_ok = False
+            continue
+        value, depth = result
+        final = playout(tables, board)
+        outcome = final.outcome()
+        winner = board.turn if value == WIN else not board.turn
+        ok = (value != DRAW and outcome is not None
+              and outcome.termination == chess.Termination.CHECKMATE and outcome.winner == winner)
+        all_ok &= ok
+        ending = outcome.termination.name if outcome else "unfinished"
+        print(f"{name:16s} {value:>6} {depth:>5} {len(final.move_stack):>5} {ending:22s} {'yes' if ok else 'NO':>3}")
+    print("Every won position was converted." if all_ok else "BITBASE PLAYOUT FAILED: a won position was not converted.")
+    return all_ok
+
+
+def generate(signature, tables):
+    """Solve every position of a signature by iterating to a fixed point.
+
+    Moves that capture or promote lead into smaller tables, which are taken
+    from (or generated into) tables first and act as constants here. A
+    position is solved at iteration d only from successors whose depth is
+    below d, so depths are plies to mate across tables.
+    """
+    size = table_size(signature)
+    print(f"Generating {signature} ({size} positions)...")
+
+    values = [DRAW] * size
+    fixed = [True] * size
+    successors = [()] * size
+    extra = []  # Positions with a legal en passant capture, solved alongside
+    extra_nodes = {}
+    constants = set()
+
+    def children_of(board):
+        children = []
+        for move in board.legal_moves:
+            board.push(move)
+            children.append(node_of(board))
+            board.pop()
+        return children
+
+    def node_of(board):
+        if board.is_insufficient_material():
+            constants.add((DRAW, 0))
+            return ("const", (DRAW, 0))
+        key = canonical_index(board)
+        if key is None:
+            # A legal en passant capture is possible: solve it as its own node
+            fen = board.fen()
+            if fen not in extra_nodes:
+                extra_nodes[fen] = size + len(extra)
+                extra.append(None)
+                children = children_of(board)
+                terminal = (LOSS if board.is_check() else DRAW) if not children else None
+                extra[extra_nodes[fen] - size] = (terminal, children)
+            return extra_nodes[fen]
+        if key[0] == signature:
+            return key[1]
+        sub_table = tables.table(key[0])
+        if sub_table is None:
+            raise RuntimeError(f"Bitbase {key[0]} is required to generate {signature}")
+        result = sub_table.probe_index(key[1])
+        constants.add(result)
+        return ("const", result)
+
+    for index in range(size):
+        board = _decode(signature, index)
+        if board is None or canonical_index(board) != (signature, index):
+            continue
+        children = children_of(board)
+        if not children:
+            values[index] = LOSS if board.is_check() else DRAW
+            continue
+        successors[index] = children
+        fixed[index] = False
+
+    for terminal, children in extra:
+        values.append(DRAW if terminal is None else terminal)
+        fixed.append(terminal is not None)
+        successors.append(children)
+
+    # Constant nodes stand for positions in smaller tables, one per (value, depth)
+    constant_nodes = {}
+    constant_depth = []
+    for value, plies in sorted(constants):
+        constant_nodes[(value, plies)] = len(values)
+        constant_depth.append(plies)
+        values.append(value)
+        fixed.append(True)
+        successors.append(())
+
+    # Flatten to CSR arrays for vectorized iteration
+    nodes = np.array([i for i in range(len(values)) if not fixed[i]], dtype=np.int64)
+    lengths = np.array([len(successors[i]) for i in nodes], dtype=np.int64)
+    offsets = np.zeros(len(nodes), dtype=np.int64)
+    if len(nodes):
+        offsets[1:] = np.cumsum(lengths)[:-1]
+    flat = np.array([constant_nodes[child[1]] if isinstance(child, tuple) else child
+                     for i in nodes for child in successors[i]], dtype=np.int64)
+    del successors
+
+    values = np.array(values, dtype=np.int8)
+    depth = np.zeros(len(values), dtype=np.int32)
+    depth[len(values) - len(constant_depth):] = constant_depth
+    solved = np.array(fixed, dtype=bool)
+    last_constant = max(constant_depth, default=0)
+
+    iteration = 0
+    while len(nodes):
+        iteration += 1
+        # Only successors solved below this depth count, so every depth is optimal
+        child_values = values[flat]
+        child_known = solved[flat] & (depth[flat] < iteration)
+        any_loss = np.logical_or.reduceat((child_values == LOSS) & child_known, offsets)
+        all_win = np.logical_and.reduceat((child_values == WIN) & child_known, offsets)
+
+        open_nodes = ~solved[nodes]
+        new_win = nodes[open_nodes & any_loss]
+        new_loss = nodes[open_nodes & ~any_loss & all_win]
+        if not len(new_win) and not len(new_loss) and iteration > last_constant:
+            break
+        values[new_win] = WIN
+        values[new_loss] = LOSS
+        depth[new_win] = depth[new_loss] = iteration
+        solved[new_win] = solved[new_loss] = True
+
+    values = values[:size]
+    table = Bitbase(signature,
+                    np.packbits(values == WIN),
+                    np.packbits(values == LOSS),
+                    np.minimum(depth[:size], MAX_DEPTH).astype(np.uint8))
+    print(f"{signature}: {int(np.sum(values == WIN))} wins, {int(np.sum(values == LOSS))} losses, "
+          f"{iteration} iterations")
+    return table
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate endgame bitbases.")
+    parser.add_argument("signatures", nargs="*", default=DEFAULT_SIGNATURES,
+                        help="material signatures such as KQvK or KRvKN")
+    parser.add_argument("--out", default=BITBASE_DIR, help="output directory")
+    parser.add_argument("--verify", action="store_true", help="play PLAYOUT_SUITE out to mate with the tables")
+    args = parser.parse_args()
+
+    tables = BitbaseSet(args.out, generate_missing=True)
+    for signature in args.signatures:
+        sides = signature.upper().split("V")
+        if (len(sides) != 2 or not all(side.startswith("K") for side in sides)
+                or any(letter not in PIECE_ORDER for letter in "".join(sides))):
+            print(f"Skipping {signature}: expected a signature such as KQvK")
+            continue
+        if len(sides[0]) + len(sides[1]) > MAX_PIECES:
+            print(f"Skipping {signature}: only up to {MAX_PIECES} pieces are supported")
+            continue
+        # Normalize so the stronger side comes first
+        board = chess.Board(None)
+        for color, side in zip(chess.COLORS[::-1], sides):
+            for file, letter in enumerate(side):
+                board.set_piece_at(chess.square(file, 1 if color == chess.WHITE else 6),
+                                   chess.Piece(chess.PIECE_SYMBOLS.index(letter.lower()), color))
+        tables.table(signature_of(board))
+    if args.verify and not run_verify(tables):
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
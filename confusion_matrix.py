@@ -1,4 +1,23 @@
+"""
+Neural Network vs Reference Engine Evaluation
+
+Compares the network's 1-ply move choice with a reference UCI engine
+(Stockfish, or engine.py itself as a local stand-in). The suite harness
+keeps a pool of long-lived engine processes, hands positions to them
+concurrently with asyncio, ranks the network's moves in large batches and
+streams move-match accuracy and top-K agreement as results arrive.
+
+Usage: python confusion_matrix.py --suite positions.epd --engine stockfish [--pool 8] [--movetime 100] [--top-k 3]
+       python confusion_matrix.py  (confusion matrix demo)
+"""
+
+import sys
+import time
+import shlex
+import asyncio
+import argparse
 import chess
+import chess.engine
 import numpy as np
 import tensorflow as tf
 from sklearn.metrics import confusion_matrix, ConfusionMatrixDisplay
@@ -9,6 +28,10 @@ MODEL_PATH = "chess_model_complex.h5"
 model = tf.keras.models.load_model(MODEL_PATH, compile=False)
 model.compile(optimizer="adam", loss="mse", metrics=["mae"])
 
+STOCKFISH_PATH = "D:/stockfish/stockfish-windows-x86-64-avx2.exe"
+NN_BATCH_POSITIONS = 256  # Positions whose moves share one model.predict call
+PROGRESS_EVERY = 100  # Positions between streamed accuracy reports
+
 def board_to_input(board):
     """Convert board state to input format for the neural network."""
     input_array = np.zeros((8, 8, 12), dtype=np.float32)
@@ -47,21 +70,162 @@ def evaluate_with_nn(board):
     best_move_index = np.argmax(scores)
     return move_map[best_move_index].uci()
 
-def evaluate_with_stockfish(board, stockfish_path="D:/stockfish/stockfish-windows-x86-64-avx2.exe"):
-    """Evaluate the best move using Stockfish."""
-    import chess.engine
+def rank_moves_nn(boards):
+    """Rank the legal moves of many positions, best first, with one predict call.
+
+    Returns a list of UCI move lists, one per board (empty if no legal moves).
+    """
+    input_data = []
+    owners = []
+    moves = []
+    for i, board in enumerate(boards):
+        for move in board.legal_moves:
+            board.push(move)
+            input_data.append(board_to_input(board))
+            board.pop()
+            owners.append(i)
+            moves.append(move.uci())
+
+    rankings = [[] for _ in boards]
+    if not input_data:
+        return rankings
+    scores = model.predict(np.vstack(input_data), verbose=0).flatten()
+    owners = np.array(owners)
+    for i in range(len(boards)):
+        indices = np.nonzero(owners == i)[0]
+        order = indices[np.argsort(-scores[indices], kind="stable")]
+        rankings[i] = [moves[j] for j in order]
+    return rankings
+
+def evaluate_with_stockfish(board, stockfish_path=STOCKFISH_PATH):
+    """Evaluate the best move using Stockfish (one process per call; see evaluate_suite)."""
     with chess.engine.SimpleEngine.popen_uci(stockfish_path) as engine:
         result = engine.play(board, chess.engine.Limit(time=0.1))
         return result.move.uci()
 
+def load_suite(path):
+    """Read an EPD or FEN file into [(board, best moves from "bm" or None)]."""
+    suite = []
+    with open(path, "r") as suite_file:
+        for line in suite_file:
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            board = chess.Board()
+            operations = board.set_epd(line)
+            best_moves = operations.get("bm")
+            suite.append((board, [move.uci() for move in best_moves] if best_moves else None))
+    return suite
+
+class SuiteStats:
+    """Running move-match and top-K agreement counts."""
+
+    def __init__(self, total, top_k):
+        self.total = total
+        self.top_k = top_k
+        self.done = 0
+        self.matches = 0
+        self.top_k_hits = 0
+        self.start = time.time()
+
+    def add(self, nn_ranking, reference_moves):
+        self.done += 1
+        if nn_ranking and reference_moves:
+            self.matches += nn_ranking[0] in reference_moves
+            self.top_k_hits += any(move in reference_moves for move in nn_ranking[:self.top_k])
+        if self.done % PROGRESS_EVERY == 0 or self.done == self.total:
+            self.report()
+
+    def report(self):
+        elapsed = max(time.time() - self.start, 1e-9)
+        done = max(self.done, 1)
+        print(f"{self.done}/{self.total} positions  match {self.matches / done:.1%}  "
+              f"top-{self.top_k} {self.top_k_hits / done:.1%}  {self.done / elapsed:.1f} pos/s", flush=True)
+
+async def _reference_worker(engine, queue, limit, results, nn_rankings, stats):
+    """Analyse positions from the queue on one long-lived engine process."""
+    while True:
+        item = await queue.get()
+        if item is None:
+            return
+        index, board = item
+        try:
+            result = await engine.play(board, limit)
+            reference_move = result.move.uci() if result.move else None
+        except chess.engine.EngineError as e:
+            print(f"Engine error on {board.fen()}: {e}", file=sys.stderr)
+            reference_move = None
+        results[index] = reference_move
+        ranking = await nn_rankings[index]  # Ready as soon as the position's batch is ranked
+        stats.add(ranking, [reference_move] if reference_move else None)
+
+async def evaluate_suite(suite, engine_command=None, pool_size=4, movetime=0.1, top_k=3):
+    """Compare the network with a reference engine pool (or the suite's bm moves).
+
+    Returns (network rankings, reference moves per position).
+    """
+    boards = [board for board, _ in suite]
+    stats = SuiteStats(len(suite), top_k)
+
+    # The network ranks the suite batch by batch on a worker thread while the
+    # engine pool is busy with the same positions; each position's future is
+    # resolved as soon as its batch is done
+    loop = asyncio.get_running_loop()
+    nn_rankings = [loop.create_future() for _ in boards]
+
+    def rank_batch(start):
+        return rank_moves_nn([board.copy() for board in boards[start:start + NN_BATCH_POSITIONS]])
+
+    async def rank_all():
+        try:
+            for start in range(0, len(boards), NN_BATCH_POSITIONS):
+                batch = await loop.run_in_executor(None, rank_batch, start)
+                for offset, ranking in enumerate(batch):
+                    nn_rankings[start + offset].set_result(ranking)
+        except Exception as e:
+            for future in nn_rankings:
+                if not future.done():
+                    future.set_exception(e)  # Workers fail instead of waiting forever
+            raise
+
+    nn_task = asyncio.ensure_future(rank_all())
+
+    if engine_command is None:
+        # No reference engine: score against the suite's own "bm" operations
+        rankings = []
+        for future, (_, best_moves) in zip(nn_rankings, suite):
+            rankings.append(await future)
+            stats.add(rankings[-1], best_moves)
+        await nn_task
+        return rankings, [best_moves for _, best_moves in suite]
+
+    engines = []
+    try:
+        for _ in range(pool_size):
+            _, engine = await chess.engine.popen_uci(shlex.split(engine_command))
+            engines.append(engine)
+        queue = asyncio.Queue()
+        for item in enumerate(boards):
+            queue.put_nowait(item)
+        for _ in engines:
+            queue.put_nowait(None)
+        results = [None] * len(boards)
+        limit = chess.engine.Limit(time=movetime)
+        await asyncio.gather(*(_reference_worker(engine, queue, limit, results, nn_rankings, stats)
+                               for engine in engines))
+        await nn_task
+        return [future.result() for future in nn_rankings], results
+    finally:
+        for engine in engines:
+            try:
+                await engine.quit()
+            except chess.engine.EngineError:
+                pass
+
 def generate_confusion_matrix(test_positions, ground_truth_moves):
     """Generate a confusion matrix comparing NN predictions with Stockfish moves."""
-    predicted_moves = []
-
-    for fen in test_positions:
-        board = chess.Board(fen)
-        predicted_move = evaluate_with_nn(board)
-        predicted_moves.append(predicted_move)
+    rankings = rank_moves_nn([chess.Board(fen) for fen in test_positions])
+    predicted_moves = [ranking[0] if ranking else None for ranking in rankings]
 
     # Generate confusion matrix
     labels = list(set(ground_truth_moves + predicted_moves))  # Unique moves
@@ -73,7 +237,20 @@ def generate_confusion_matrix(test_positions, ground_truth_moves):
     plt.title("Confusion Matrix: Neural Network vs Stockfish")
     plt.show()
 
-if __name__ == "__main__":
+def main():
+    parser = argparse.ArgumentParser(description="Compare the network with a reference UCI engine.")
+    parser.add_argument("--suite", help="EPD/FEN file of test positions")
+    parser.add_argument("--engine", help='reference engine command, e.g. stockfish or "python engine.py"')
+    parser.add_argument("--pool", type=int, default=4, help="number of engine processes")
+    parser.add_argument("--movetime", type=int, default=100, help="milliseconds per position")
+    parser.add_argument("--top-k", type=int, default=3, help="network moves counted for top-K agreement")
+    args = parser.parse_args()
+
+    if args.suite:
+        suite = load_suite(args.suite)
+        asyncio.run(evaluate_suite(suite, args.engine, args.pool, args.movetime / 1000.0, args.top_k))
+        return
+
     # Test positions (FEN strings)
     test_positions = [
         "rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1",  # Starting position
@@ -85,4 +262,7 @@ if __name__ == "__main__":
     ground_truth_moves = ["e2e4", "d2d4", "g1f3"]
 
     # Generate the confusion matrix
-    generate_confusion_matrix(test_positions, ground_truth_moves)
\ No newline at end of file
+    generate_confusion_matrix(test_positions, ground_truth_moves)
+
+if __name__ == "__main__":
+    main()
\ No newline at end of file
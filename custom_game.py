@@ -3,7 +3,9 @@ import chess
 import os
 import chess.pgn
 import random
-from engine import evaluate_moves  # Import your AI engine
+import datetime
+from ai_worker import AIWorker, position_key  # Runs your AI engine off the event thread
+from game_store import GameStore
 
 # Initialize Pygame
 pygame.init()
@@ -15,19 +17,41 @@ SQUARE_SIZE = WIDTH // 8
 WHITE, BLACK = (255, 255, 255), (0, 0, 0)
 LIGHT_BROWN, DARK_BROWN = (222, 184, 135), (139, 69, 19)
 HIGHLIGHT_COLOR = (0, 255, 0)
+LOG_BACKGROUND = (200, 200, 200)
+FPS = 30  # Frame cap; frames are only redrawn when the state changed
+AI_MOVE_EVENT = pygame.USEREVENT + 1  # Posted by the AI worker with its move
 
-# Load piece images
+# Pygame window
+screen = pygame.display.set_mode((WIDTH + SIDE_PANEL_WIDTH, HEIGHT))
+pygame.display.set_caption("Chess")
+clock = pygame.time.Clock()
+
+# Load piece images, scaled once to the square size
 IMAGE_PATH = "images"
 piece_images = {}
 piece_names = {'p': 'pawn', 'r': 'rook', 'n': 'knight', 'b': 'bishop', 'q': 'queen', 'k': 'king'}
 
 for piece, name in piece_names.items():
-    piece_images[f'w{piece}'] = pygame.image.load(os.path.join(IMAGE_PATH, f'w_{name}.png'))
-    piece_images[f'b{piece}'] = pygame.image.load(os.path.join(IMAGE_PATH, f'b_{name}.png'))
+    for color in ('w', 'b'):
+        image = pygame.image.load(os.path.join(IMAGE_PATH, f'{color}_{name}.png')).convert_alpha()
+        piece_images[f'{color}{piece}'] = pygame.transform.scale(image, (SQUARE_SIZE, SQUARE_SIZE))
 
-# Pygame window
-screen = pygame.display.set_mode((WIDTH + SIDE_PANEL_WIDTH, HEIGHT))
-pygame.display.set_caption("Chess")
+# Cached rendering state
+log_font = pygame.font.SysFont(None, 30)
+game_over_font = pygame.font.SysFont(None, 72)
+board_surface = pygame.Surface((WIDTH, HEIGHT))  # Empty squares, drawn once
+for row in range(8):
+    for col in range(8):
+        color = LIGHT_BROWN if (row + col) % 2 == 0 else DARK_BROWN
+        pygame.draw.rect(board_surface, color, (col * SQUARE_SIZE, row * SQUARE_SIZE, SQUARE_SIZE, SQUARE_SIZE))
+move_log_surface = pygame.Surface((SIDE_PANEL_WIDTH, HEIGHT))
+move_log_lines = []  # (uci, rendered text) per move in the log
+selected_destinations = set()  # Target squares of the selected piece
+thinking_shown = False  # Whether the panel currently shows the thinking indicator
+needs_redraw = True
+full_redraw = True  # Whole window, e.g. after it was uncovered
+BOARD_RECT = pygame.Rect(0, 0, WIDTH, HEIGHT)
+PANEL_RECT = pygame.Rect(WIDTH, 0, SIDE_PANEL_WIDTH, HEIGHT)
 
 # Chess board
 board = chess.Board()
@@ -35,56 +59,119 @@ selected_square = None
 game_over = False
 winner = ""
 
-# Ensure train directory exists
-TRAIN_DIR = "train"
-os.makedirs(TRAIN_DIR, exist_ok=True)
+# Finished games are appended to the binary game store used for training
+game_store = GameStore()
 
 # Randomly assign AI as White or Black
 ai_plays_white = random.choice([True, False])
 
+# AI moves are computed on a worker thread and delivered as AI_MOVE_EVENT
+ai_thinking = False
+ai_worker = AIWorker(lambda move, key: pygame.event.post(pygame.event.Event(AI_MOVE_EVENT, move=move, key=key)))
+
+def mark_dirty(full=False):
+    """Request a redraw on the next frame."""
+    global needs_redraw, full_redraw
+    needs_redraw = True
+    full_redraw = full_redraw or full
+
+def select_square(square):
+    """Select a square and compute its legal destinations once."""
+    global selected_square, selected_destinations
+    selected_square = square
+    if square is None:
+        selected_destinations = set()
+    else:
+        selected_destinations = {move.to_square for move in board.legal_moves if move.from_square == square}
+    mark_dirty()
+
 def draw_board():
-    for row in range(8):
-        for col in range(8):
-            color = LIGHT_BROWN if (row + col) % 2 == 0 else DARK_BROWN
-            pygame.draw.rect(screen, color, (col * SQUARE_SIZE, row * SQUARE_SIZE, SQUARE_SIZE, SQUARE_SIZE))
-            
-            if selected_square is not None:
-                moves = [move.to_square for move in board.legal_moves if move.from_square == selected_square]
-                if chess.square(col, 7 - row) in moves:
-                    pygame.draw.circle(screen, HIGHLIGHT_COLOR, (col * SQUARE_SIZE + SQUARE_SIZE // 2, row * SQUARE_SIZE + SQUARE_SIZE // 2), 10)
+    screen.blit(board_surface, (0, 0))
+    for square in selected_destinations:
+        col, row = chess.square_file(square), 7 - chess.square_rank(square)
+        pygame.draw.circle(screen, HIGHLIGHT_COLOR, (col * SQUARE_SIZE + SQUARE_SIZE // 2, row * SQUARE_SIZE + SQUARE_SIZE // 2), 10)
 
 def draw_pieces():
-    for row in range(8):
-        for col in range(8):
-            piece = board.piece_at(chess.square(col, 7 - row))
-            if piece:
-                piece_key = ('w' if piece.color == chess.WHITE else 'b') + piece.symbol().lower()
-                piece_img = piece_images.get(piece_key)
-                if piece_img:
-                    screen.blit(pygame.transform.scale(piece_img, (SQUARE_SIZE, SQUARE_SIZE)), (col * SQUARE_SIZE, row * SQUARE_SIZE))
+    for square, piece in board.piece_map().items():
+        piece_key = ('w' if piece.color == chess.WHITE else 'b') + piece.symbol().lower()
+        piece_img = piece_images.get(piece_key)
+        if piece_img:
+            col, row = chess.square_file(square), 7 - chess.square_rank(square)
+            screen.blit(piece_img, (col * SQUARE_SIZE, row * SQUARE_SIZE))
 
 def draw_game_over():
-    font = pygame.font.SysFont(None, 72)
-    text = font.render(f"Game Over: {winner}", True, (255, 0, 0))
+    text = game_over_font.render(f"Game Over: {winner}", True, (255, 0, 0))
     screen.blit(text, (WIDTH // 4, HEIGHT // 2))
 
 def draw_move_log():
-    font = pygame.font.SysFont(None, 30)
-    move_log_surface = pygame.Surface((SIDE_PANEL_WIDTH, HEIGHT))
-    move_log_surface.fill((200, 200, 200))
+    """Draw the move log, rendering only moves that are not cached yet.
+
+    Returns True if the panel changed.
+    """
+    global thinking_shown
     moves = board.move_stack
-    for i, move in enumerate(moves):
-        move_text = font.render(f"{i+1}: {move.uci()}", True, BLACK)
-        move_log_surface.blit(move_text, (10, 30 * i))
-    screen.blit(move_log_surface, (WIDTH, 0))
+    changed = len(move_log_lines) != len(moves) or thinking_shown != ai_thinking
+    # Drop cached lines for moves that were taken back or replaced
+    if len(move_log_lines) > len(moves):
+        del move_log_lines[len(moves):]
+    if move_log_lines and move_log_lines[-1][0] != moves[len(move_log_lines) - 1].uci():
+        move_log_lines.clear()
+        changed = True
+    for i in range(len(move_log_lines), len(moves)):
+        move_log_lines.append((moves[i].uci(), log_font.render(f"{i+1}: {moves[i].uci()}", True, BLACK)))
+
+    if changed or full_redraw:
+        move_log_surface.fill(LOG_BACKGROUND)
+        for i, (_, move_text) in enumerate(move_log_lines):
+            move_log_surface.blit(move_text, (10, 30 * i))
+        if ai_thinking:
+            move_log_surface.blit(log_font.render("AI is thinking...", True, (180, 0, 0)), (10, HEIGHT - 30))
+        thinking_shown = ai_thinking
+        screen.blit(move_log_surface, PANEL_RECT)
+        return True
+    return False
+
+def render():
+    """Redraw the dirty regions of the window if anything changed."""
+    global needs_redraw, full_redraw
+    if not needs_redraw:
+        return
+    dirty = [BOARD_RECT]
+    draw_board()
+    draw_pieces()
+    if draw_move_log():
+        dirty.append(PANEL_RECT)
+    if game_over:
+        draw_game_over()
+    if full_redraw:
+        pygame.display.flip()
+    else:
+        pygame.display.update(dirty)
+    needs_redraw = full_redraw = False
 
 def make_ai_move():
-    global game_over, winner
+    """Ask the worker for the AI's move; the UI keeps running meanwhile."""
+    global ai_thinking
+    if ai_thinking or game_over:
+        return
     if not board.is_game_over() and board.turn == (chess.WHITE if ai_plays_white else chess.BLACK):
-        best_move = evaluate_moves(board)  # AI calculates best move
-        if best_move and best_move in board.legal_moves:
-            board.push(best_move)
-            check_game_over()
+        ai_thinking = True
+        mark_dirty()
+        ai_worker.request_move(board)  # AI calculates best move
+
+def apply_ai_move(event):
+    """Play the move delivered by the worker if it is still for this position."""
+    global ai_thinking
+    if event.key != position_key(board):
+        return  # Stale result
+    ai_thinking = False
+    mark_dirty()
+    if event.move and event.move in board.legal_moves:
+        board.push(event.move)
+        check_game_over()
+    if not game_over:
+        # Think about the replies to the human's candidate moves meanwhile
+        ai_worker.precompute_replies(board)
 
 def check_game_over():
     global game_over, winner
@@ -104,6 +191,7 @@ def check_game_over():
         game_over = True
         winner = "Draw (Fivefold Repetition)"
     if game_over:
+        mark_dirty()
         save_game_pgn()
 
 def save_game_pgn():
@@ -111,7 +199,7 @@ def save_game_pgn():
     game = chess.pgn.Game()
     game.headers["Event"] = "Pygame Chess Game"
     game.headers["Site"] = "Local"
-    game.headers["Date"] = "????.??.??"
+    game.headers["Date"] = datetime.date.today().strftime("%Y.%m.%d")
     game.headers["Round"] = "1"
     game.headers["White"] = "AI" if ai_plays_white else "Player"
     game.headers["Black"] = "Player" if ai_plays_white else "AI"
@@ -131,17 +219,14 @@ def save_game_pgn():
     for move in board.move_stack:
         node = node.add_variation(move)
     
-    # Save to file
-    game_count = len(os.listdir(TRAIN_DIR)) + 1
-    game_file = os.path.join(TRAIN_DIR, f"game_{game_count}.pgn")
-    with open(game_file, "w") as pgn_file:
-        pgn_file.write(str(game))
+    # Append to the game store (export with: python game_store.py export out.pgn)
+    game_id = game_store.append_game(game)
     
-    print(f"Game saved to {game_file} with result: {game.headers['Result']}")
+    print(f"Game {game_id} saved to {game_store.path} with result: {game.headers['Result']}")
 
 def handle_click(pos):
-    global selected_square, game_over
-    if game_over:
+    global game_over
+    if game_over or ai_thinking:
         return
     
     col, row = pos[0] // SQUARE_SIZE, pos[1] // SQUARE_SIZE
@@ -151,40 +236,43 @@ def handle_click(pos):
     square = chess.square(col, 7 - row)
     if selected_square is None:
         if board.piece_at(square) and board.piece_at(square).color == board.turn:
-            selected_square = square
+            select_square(square)
     else:
         move = chess.Move(selected_square, square)
         if move in board.legal_moves:
             board.push(move)
+            mark_dirty()
             check_game_over()
             if not game_over:
                 make_ai_move()
-        selected_square = None
+        select_square(None)
 
 def main():
     global selected_square, game_over
     running = True
 
-    # AI plays first if it is White
+    # AI plays first if it is White, otherwise it prepares replies
     if ai_plays_white:
         make_ai_move()
+    else:
+        ai_worker.precompute_replies(board)
 
     while running:
-        draw_board()
-        draw_pieces()
-        draw_move_log()
-        if game_over:
-            draw_game_over()
-        pygame.display.flip()
+        render()
+        clock.tick(FPS)  # Cap the frame rate so the idle GUI does not spin a core
 
         for event in pygame.event.get():
             if event.type == pygame.QUIT:
                 running = False
+            elif event.type == pygame.VIDEOEXPOSE:
+                mark_dirty(full=True)
+            elif event.type == AI_MOVE_EVENT:
+                apply_ai_move(event)
             elif event.type == pygame.MOUSEBUTTONDOWN:
                 if not game_over and board.turn != (chess.WHITE if ai_plays_white else chess.BLACK):
-                    handle_click(pygame.mouse.get_pos())
-                    make_ai_move()  # AI moves after player
+                    handle_click(pygame.mouse.get_pos())  # AI moves after player
 
+    ai_worker.stop()
     pygame.quit()
 
 if __name__ == "__main__":
@@ -0,0 +1,221 @@
+"""
+Deduplicated Dataset Builder
+
+The training corpora contain the start position and common openings
+thousands of times. This stage hashes every position (Zobrist) across the
+whole corpus and merges duplicates into one sample with the mean outcome and
+a visit count, so an epoch visits every distinct position once.
+
+It works out-of-core: positions are first hash-partitioned into bucket files
+on disk, then every bucket (small enough for RAM) is reduced on its own and
+appended to the output arrays.
+
+Output directory (all .npy, loadable with mmap_mode="r"):
+    keys.npy    uint64 Zobrist key per position
+    boards.npy  int8 (N, 64) piece codes: 1..6 white P..K, -1..-6 black, 0 empty
+    values.npy  float32 mean game outcome from White's point of view
+    counts.npy  uint32 number of occurrences in the corpus
+
+Usage: python dataset_builder.py [--pgn-dir train] [--shards selfplay] [--out dataset] [--buckets 64]
+"""
+
+import os
+import shutil
+import argparse
+import numpy as np
+import chess
+import chess.pgn
+from game_state import GameStateTracker
+from game_store import GameStore, GAME_DB_DIR
+from selfplay_shards import shard_paths, read_games, SHARD_DIR
+
+TRAIN_FOLDER = "train"
+DATASET_DIR = "dataset"
+NUM_BUCKETS = 64
+FLUSH_RECORDS = 65536  # Records buffered in memory per bucket before writing
+
+RECORD_DTYPE = np.dtype([("key", "<u8"), ("value", "<f4"), ("board", "i1", (64,))])
+RESULT_VALUES = {"1-0": 1.0, "0-1": -1.0, "1/2-1/2": 0.0}
+
+
+def board_codes(board):
+    """Piece codes of the 64 squares as an int8 array."""
+    codes = np.zeros(64, dtype=np.int8)
+    for square, piece in board.piece_map().items():
+        codes[square] = piece.piece_type if piece.color == chess.WHITE else -piece.piece_type
+    return codes
+
+
+def codes_to_input(boards):
+    """Convert (N, 64) piece codes to train_custom.py's (N, 768) input encoding."""
+    boards = np.asarray(boards)
+    planes = np.zeros((len(boards), 64, 12), dtype=np.float32)
+    for piece_type in range(1, 7):
+        planes[:, :, piece_type - 1] = (boards == piece_type).astype(np.float32) - (boards == -piece_type)
+    return planes.reshape(len(boards), -1)
+
+
+def codes_to_planes(boards):
+    """Convert (N, 64) piece codes to engine.py's one-hot (N, 768) input encoding."""
+    boards = np.asarray(boards)
+    planes = np.zeros((len(boards), 64, 12), dtype=np.float32)
+    for piece_type in range(1, 7):
+        planes[:, :, piece_type - 1] = boards == piece_type
+        planes[:, :, piece_type + 5] = boards == -piece_type
+    return planes.reshape(len(boards), -1)
+
+
+class BucketWriter:
+    """Hash-partitions position records into bucket files on disk."""
+
+    def __init__(self, directory, num_buckets=NUM_BUCKETS):
+        self.directory = directory
+        self.num_buckets = num_buckets
+        self.buffers = [[] for _ in range(num_buckets)]
+        os.makedirs(directory, exist_ok=True)
+
+    def path(self, bucket):
+        return os.path.join(self.directory, f"bucket_{bucket:04d}.bin")
+
+    def add(self, key, value, codes):
+        bucket = key % self.num_buckets
+        self.buffers[bucket].append((key, value, codes))
+        if len(self.buffers[bucket]) >= FLUSH_RECORDS:
+            self.flush(bucket)
+
+    def flush(self, bucket=None):
+        buckets = range(self.num_buckets) if bucket is None else [bucket]
+        for bucket in buckets:
+            if not self.buffers[bucket]:
+                continue
+            records = np.array(self.buffers[bucket], dtype=RECORD_DTYPE)
+            with open(self.path(bucket), "ab") as bucket_file:
+                records.tofile(bucket_file)
+            self.buffers[bucket] = []
+
+
+def add_game(writer, board, moves, result):
+    """Record every position reached in a game (after each move, like train_custom.py)."""
+    value = RESULT_VALUES.get(result, 0.0)
+    tracker = GameStateTracker(board)
+    for move in moves:
+        tracker.push(move)
+        writer.add(tracker.key, value, board_codes(board))
+
+
+def corpus_games(train_folder=TRAIN_FOLDER, store_path=GAME_DB_DIR, shard_dir=SHARD_DIR):
+    """Yield (start board, moves, result) of every game in the PGNs, the game store and the shards."""
+    if os.path.isdir(train_folder):
+        for file in sorted(os.listdir(train_folder)):
+            if file.endswith(".pgn"):
+                file_path = os.path.join(train_folder, file)
+                print(f"Processing {file_path}...")
+                with open(file_path, "r") as pgn_file:
+                    while True:
+                        game = chess.pgn.read_game(pgn_file)
+                        if game is None:
+                            break
+                        yield game.board(), game.mainline_moves(), game.headers.get("Result", "*")
+    store = GameStore(store_path)
+    if len(store):
+        print(f"Processing {len(store)} games from {store_path}...")
+    for game_id in range(len(store)):
+        yield store.start_board(game_id), store.moves(game_id), store.result(game_id)
+    for _, shard_path in shard_paths(shard_dir):
+        print(f"Processing {shard_path}...")
+        yield from read_games(shard_path)
+
+
+def reduce_bucket(path):
+    """Merge duplicate keys of one bucket: mean value, visit count, one board."""
+    records = np.fromfile(path, dtype=RECORD_DTYPE)
+    keys, first, inverse, counts = np.unique(records["key"], return_index=True,
+                                             return_inverse=True, return_counts=True)
+    sums = np.bincount(inverse.ravel(), weights=records["value"], minlength=len(keys))
+    return keys, records["board"][first], (sums / counts).astype(np.float32), counts.astype(np.uint32)
+
+
+def build_dataset(train_folder=TRAIN_FOLDER, store_path=GAME_DB_DIR, out_dir=DATASET_DIR,
+                  num_buckets=NUM_BUCKETS, shard_dir=SHARD_DIR):
+    """Scan the corpus, then reduce it bucket by bucket into out_dir."""
+    tmp_dir = os.path.join(out_dir, "buckets")
+    if os.path.exists(tmp_dir):
+        shutil.rmtree(tmp_dir)
+    writer = BucketWriter(tmp_dir, num_buckets)
+
+    # Pass 1: hash-partition every position to disk
+    total = 0
+    for board, moves, result in corpus_games(train_folder, store_path, shard_dir):
+        add_game(writer, board, moves, result)
+        total += 1
+    writer.flush()
+
+    # Pass 2: reduce each bucket, collecting the per-bucket results on disk
+    reduced = []
+    positions = 0
+    for bucket in range(num_buckets):
+        path = writer.path(bucket)
+        if not os.path.exists(path):
+            continue
+        positions += os.path.getsize(path) // RECORD_DTYPE.itemsize
+        keys, boards, values, counts = reduce_bucket(path)
+        reduced_path = path + ".reduced.npz"
+        np.savez(reduced_path, keys=keys, boards=boards, values=values, counts=counts)
+        reduced.append((reduced_path, len(keys)))
+        os.remove(path)
+
+    # Pass 3: concatenate into memory-mappable output arrays
+    unique = sum(size for _, size in reduced)
+    outputs = {
+        "keys": np.lib.format.open_memmap(os.path.join(out_dir, "keys.npy"), mode="w+", dtype=np.uint64, shape=(unique,)),
+        "boards": np.lib.format.open_memmap(os.path.join(out_dir, "boards.npy"), mode="w+", dtype=np.int8, shape=(unique, 64)),
+        "values": np.lib.format.open_memmap(os.path.join(out_dir, "values.npy"), mode="w+", dtype=np.float32, shape=(unique,)),
+        "counts": np.lib.format.open_memmap(os.path.join(out_dir, "counts.npy"), mode="w+", dtype=np.uint32, shape=(unique,)),
+    }
+    offset = 0
+    for reduced_path, size in reduced:
+        with np.load(reduced_path) as arrays:
+            for name, output in outputs.items():
+                output[offset:offset + size] = arrays[name]
+        offset += size
+        os.remove(reduced_path)
+    for output in outputs.values():
+        output.flush()
+    shutil.rmtree(tmp_dir)
+
+    print(f"Dataset: {total} games, {positions} positions, {unique} unique "
+          f"({unique / max(positions, 1):.1%}) saved to {out_dir}")
+    return unique
+
+
+def load_dataset(out_dir=DATASET_DIR, max_count=None, mmap=True):
+    """Return (boards, values, sample_weight) from a built dataset.
+
+    boards and values stay memory-mapped (int8 piece codes and float32), so
+    callers encode them a batch at a time with codes_to_input. sample_weight
+    is the visit count, capped at max_count so very common positions (the
+    start position, main openings) cannot dominate.
+    """
+    mode = "r" if mmap else None
+    boards = np.load(os.path.join(out_dir, "boards.npy"), mmap_mode=mode)
+    values = np.load(os.path.join(out_dir, "values.npy"), mmap_mode=mode)
+    counts = np.load(os.path.join(out_dir, "counts.npy"), mmap_mode=mode).astype(np.float32)
+    if max_count is not None:
+        counts = np.minimum(counts, max_count)
+    return boards, values, counts
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build a deduplicated position dataset.")
+    parser.add_argument("--pgn-dir", default=TRAIN_FOLDER, help="folder of PGN games")
+    parser.add_argument("--store", default=GAME_DB_DIR, help="binary game store directory")
+    parser.add_argument("--shards", default=SHARD_DIR, help="self-play shard directory")
+    parser.add_argument("--out", default=DATASET_DIR, help="output directory")
+    parser.add_argument("--buckets", type=int, default=NUM_BUCKETS,
+                        help="number of on-disk partitions; raise it for corpora larger than RAM")
+    args = parser.parse_args()
+    build_dataset(args.pgn_dir, args.store, args.out, args.buckets, args.shards)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,202 @@
+"""
+Teacher-Student Distillation
+
+Trades training compute for play-time latency: a large teacher network (by
+default train_model.py's deep 256-128-64-32 network, chess_model_deep.h5)
+labels every position of the deduplicated dataset (dataset_builder.py) in
+big predict batches, and a small student of configurable width and depth
+is trained on those soft targets. The student is exported as the engine's model artifact,
+so running engines hot-reload it.
+
+Teacher labels are cached next to the dataset (teacher_values.npy plus a
+.json noting the teacher file, the encoding and the mtimes of the teacher
+and the dataset), so trying several student sizes labels the positions
+only once.
+
+At the end the student is compared with the teacher on held-out positions:
+value agreement (MAE, correlation, same sign) and predict latency per call
+at the batch sizes the engine uses.
+
+The teacher sees positions in the encoding it was trained on: the
+artifact's "encoding" entry, or --teacher-encoding for a Keras file
+("planes" by default, "signed" for train_custom.py models). The student
+always learns engine.py's one-hot "planes" encoding.
+
+Usage: python distill.py [--teacher chess_model_deep.h5] [--hidden small] [--epochs 10]
+                         [--dataset dataset] [--artifact chess_model_complex]
+                         [--teacher-encoding planes|signed]
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+import numpy as np
+import tensorflow as tf
+import model_artifact
+import training_metrics
+import architectures
+from model_artifact import ARTIFACT_PATH
+from dataset_builder import build_dataset, codes_to_planes, codes_to_input, DATASET_DIR, TRAIN_FOLDER
+from train_custom import ProgressLogger
+
+TEACHER_PATH = "chess_model_deep.h5"  # Written by train_model.py
+ENCODERS = {"planes": codes_to_planes, "signed": codes_to_input}
+LABEL_CHUNK = 65536  # Positions converted and sent to the teacher at a time
+LABEL_BATCH = 4096  # predict() batch size while labelling
+TRAIN_BATCH = 256
+HOLDOUT = 0.05  # Fraction of positions kept out of training for the comparison
+MAX_HOLDOUT = 20000
+LATENCY_BATCHES = (1, 32, 1024)  # Single position, a move list, an MCTS leaf batch
+
+
+def load_teacher(path, encoding=None):
+    """Load a Keras model file or a model artifact (path without extension).
+
+    Returns (model, encoding); an artifact's recorded encoding wins over
+    the encoding argument, which defaults to "planes".
+    """
+    if not os.path.exists(path) and model_artifact.read_metadata(path) is not None:
+        metadata, model = model_artifact.load_model(path)
+        return model, metadata.get("encoding", encoding or "planes")
+    return tf.keras.models.load_model(path, compile=False), encoding or "planes"
+
+
+def _mtime(path):
+    return os.path.getmtime(path) if os.path.exists(path) else None
+
+
+def teacher_labels(teacher, teacher_path, encoding, boards, dataset_dir):
+    """Teacher values of every board, read from the cache when it is current."""
+    cache_path = os.path.join(dataset_dir, "teacher_values.npy")
+    info_path = os.path.join(dataset_dir, "teacher_values.json")
+    teacher_file = teacher_path if os.path.exists(teacher_path) else teacher_path + ".json"
+    info = {"teacher": os.path.abspath(teacher_path), "encoding": encoding, "positions": len(boards),
+            "mtime": _mtime(teacher_file),
+            "dataset_mtimes": [_mtime(os.path.join(dataset_dir, f"{name}.npy")) for name in ("boards", "values")]}
+    if os.path.exists(cache_path) and os.path.exists(info_path):
+        with open(info_path, "r") as info_file:
+            if json.load(info_file) == info:
+                print(f"Using cached teacher labels from {cache_path}")
+                return np.load(cache_path)
+
+    labels = np.zeros(len(boards), dtype=np.float32)
+    start = time.time()
+    with training_metrics.timed("label", items=len(boards)):
+        for first in range(0, len(boards), LABEL_CHUNK):
+            inputs = ENCODERS[encoding](boards[first:first + LABEL_CHUNK])
+            labels[first:first + len(inputs)] = teacher.predict(inputs, batch_size=LABEL_BATCH, verbose=0)[:, 0]
+            print(f"Labelled {first + len(inputs)}/{len(boards)} positions "
+                  f"({(first + len(inputs)) / max(time.time() - start, 1e-9):.0f}/sec)", flush=True)
+    np.save(cache_path, labels)
+    with open(info_path, "w") as info_file:
+        json.dump(info, info_file)
+    return labels
+
+
+def training_batches(boards, targets, indices, batch_size):
+    """Endless shuffled (inputs, targets) batches; boards are encoded a batch at a time."""
+    while True:
+        order = np.random.permutation(indices)
+        for first in range(0, len(order) - batch_size + 1, batch_size):
+            batch = np.sort(order[first:first + batch_size])  # Sorted reads from the memory map
+            yield codes_to_planes(boards[batch]), targets[batch]
+
+
+def compare(teacher, student, boards, encoding):
+    """Print value agreement on boards and the predict latency of both networks."""
+    teacher_inputs, inputs = ENCODERS[encoding](boards), codes_to_planes(boards)
+    teacher_values = teacher.predict(teacher_inputs, batch_size=LABEL_BATCH, verbose=0)[:, 0]
+    student_values = student.predict(inputs, batch_size=LABEL_BATCH, verbose=0)[:, 0]
+    errors = np.abs(teacher_values - student_values)
+    correlation = np.corrcoef(teacher_values, student_values)[0, 1] if len(inputs) > 1 else float("nan")
+    same_sign = np.mean(np.sign(teacher_values) == np.sign(student_values))
+    print(f"Agreement on {len(inputs)} held-out positions: MAE {errors.mean():.4f}, "
+          f"max error {errors.max():.4f}, correlation {correlation:.4f}, same sign {same_sign:.1%}")
+    training_metrics.log("agreement", positions=len(inputs), mae=float(errors.mean()),
+                         correlation=float(correlation), same_sign=float(same_sign))
+
+    print(f"{'batch':>6} {'teacher ms':>11} {'student ms':>11} {'speedup':>8}")
+    for batch_size in LATENCY_BATCHES:
+        rows = np.arange(batch_size) % len(inputs)
+        teacher_time = architectures.latency(lambda x: teacher.predict(x, verbose=0), teacher_inputs[rows])
+        student_time = architectures.latency(lambda x: student.predict(x, verbose=0), inputs[rows])
+        print(f"{batch_size:>6} {teacher_time * 1000:>11.3f} {student_time * 1000:>11.3f} "
+              f"{teacher_time / student_time:>7.2f}x")
+        training_metrics.log("latency", batch=batch_size, teacher_seconds=teacher_time,
+                             student_seconds=student_time)
+
+
+def distill(teacher_path=TEACHER_PATH, hidden="small", epochs=10, dataset_dir=DATASET_DIR,
+            artifact_path=ARTIFACT_PATH, outcome_weight=0.0, teacher_encoding=None):
+    """Label the dataset with the teacher, train the student and export it.
+
+    outcome_weight mixes the positions' mean game outcome into the soft
+    targets (0 = teacher values only). Returns None without training if
+    the student would have the teacher's architecture.
+    """
+    teacher, encoding = load_teacher(teacher_path, teacher_encoding)
+    teacher_widths = [kernel.shape[1] for kernel, _, _ in model_artifact.dense_layers(teacher)]
+    if teacher_widths == [units for units, _ in architectures.hidden_layers(hidden)] + [1]:
+        print(f"The student ({hidden}) has the teacher's architecture; choose a smaller --hidden.")
+        return None
+
+    if not os.path.exists(os.path.join(dataset_dir, "boards.npy")):
+        with training_metrics.timed("build_dataset"):
+            build_dataset(TRAIN_FOLDER, out_dir=dataset_dir)
+    boards = np.load(os.path.join(dataset_dir, "boards.npy"), mmap_mode="r")
+    if not len(boards):
+        print("No positions to distill on.")
+        return None
+
+    targets = teacher_labels(teacher, teacher_path, encoding, boards, dataset_dir)
+    if outcome_weight:
+        values = np.load(os.path.join(dataset_dir, "values.npy"))
+        targets = (1 - outcome_weight) * targets + outcome_weight * values
+
+    order = np.random.permutation(len(boards))
+    holdout_size = min(MAX_HOLDOUT, max(1, int(len(boards) * HOLDOUT)))
+    holdout, train = np.sort(order[:holdout_size]), order[holdout_size:]
+    if not len(train):
+        train = holdout
+    batch_size = min(TRAIN_BATCH, len(train))
+    steps = len(train) // batch_size
+
+    student = architectures.build_model(hidden)
+    print(f"Distilling {teacher_path} ({teacher.count_params()} parameters) into "
+          f"{hidden} ({student.count_params()} parameters) on {len(train)} positions...")
+    with training_metrics.timed("fit", items=steps * batch_size * epochs):
+        student.fit(training_batches(boards, targets, train, batch_size), steps_per_epoch=steps,
+                    epochs=epochs, verbose=0, callbacks=[ProgressLogger(steps * batch_size)])
+
+    with training_metrics.timed("save"):
+        model_artifact.save_model(student, artifact_path, source=f"distill:{teacher_path}")
+    compare(teacher, student, boards[holdout], encoding)
+    return student
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Distill a large value network into a small, fast one.")
+    parser.add_argument("--teacher", default=TEACHER_PATH, help="teacher Keras model or model artifact")
+    parser.add_argument("--hidden", default="small",
+                        help="student architecture: a registered name (architectures.py) or widths like 128-64")
+    parser.add_argument("--epochs", type=int, default=10)
+    parser.add_argument("--dataset", default=DATASET_DIR, help="dataset_builder.py output directory")
+    parser.add_argument("--artifact", default=ARTIFACT_PATH, help="where to export the student")
+    parser.add_argument("--outcome-weight", type=float, default=0.0,
+                        help="weight of the game outcome in the targets (0..1)")
+    parser.add_argument("--teacher-encoding", choices=sorted(ENCODERS),
+                        help="input encoding of a Keras teacher (artifacts record their own; default planes)")
+    args = parser.parse_args()
+    training_metrics.start_run("distill", teacher=args.teacher, hidden=args.hidden, epochs=args.epochs)
+    try:
+        if distill(args.teacher, args.hidden, args.epochs, args.dataset, args.artifact, args.outcome_weight,
+                   args.teacher_encoding) is None:
+            sys.exit(1)
+    finally:
+        training_metrics.end_run()
+
+
+if __name__ == "__main__":
+    main()
@@ -2,43 +2,59 @@ import sys
 import chess
 import numpy as np
 import tensorflow as tf
-from tensorflow.keras.models import Sequential
-from tensorflow.keras.layers import Dense
 from tensorflow.keras.optimizers import Adam
 import random  # Add import for random fallback
+import time
+import threading
 import os     # Add import for file operations
+import model_artifact
+import architectures
+from model_artifact import ArtifactWatcher, ARTIFACT_PATH
+from opening_book import OpeningBook, BOOK_PATH
+from bitbase import BitbaseSet, select_moves, BITBASE_DIR, MAX_PIECES
+from mcts import MAX_NODES
+from parallel_search import ParallelSearch
+from quiescence import Quiescence
+from perft import perft, divide
+from game_state import (GameStateTracker, CHECKMATE, STALEMATE, INSUFFICIENT_MATERIAL,
+                        SEVENTYFIVE_MOVES, FIVEFOLD_REPETITION)
 
 # Load trained neural network model with explicit loss function
 MODEL_PATH = "chess_model_complex.h5"
+MODEL_ARTIFACT = ARTIFACT_PATH  # Versioned .npz/.json weights, preferred when present
+model_version = 0
 
-# Try to load existing model, create new one if not found
+# Try the versioned artifact first: it loads without HDF5 deserialization
+loaded = None
 try:
-    if os.path.exists(MODEL_PATH):
-        model = tf.keras.models.load_model(MODEL_PATH, compile=False)
-        print(f"Loaded existing model from {MODEL_PATH}")
-    else:
-        print(f"Model file {MODEL_PATH} not found. Creating new model...")
-        # Create a new model with the same architecture as train_rl.py
-        model = Sequential([
-            Dense(128, activation="relu", input_shape=(8*8*12,)),
-            Dense(64, activation="relu"),
-            Dense(32, activation="relu"),
-            Dense(1, activation="linear")
-        ])
-        model.save(MODEL_PATH)  # Keep original format
-        print(f"New model created and saved to {MODEL_PATH}")
-        
+    loaded = model_artifact.load_model(MODEL_ARTIFACT)
 except Exception as e:
-    print(f"Error loading model: {e}")
-    print("Creating new model...")
-    # Create a simple fallback model
-    model = Sequential([
-        Dense(128, activation="relu", input_shape=(8*8*12,)),
-        Dense(64, activation="relu"),
-        Dense(1, activation="linear")
-    ])
-    model.save(MODEL_PATH)  # Keep original format
-    print(f"Fallback model created and saved to {MODEL_PATH}")
+    print(f"Error loading model artifact: {e}")
+
+if loaded is not None:
+    metadata, model = loaded
+    model_version = metadata["version"]
+    print(f"Loaded model artifact v{model_version} from {MODEL_ARTIFACT}")
+else:
+    # Try to load existing model, create new one if not found
+    try:
+        if os.path.exists(MODEL_PATH):
+            model = tf.keras.models.load_model(MODEL_PATH, compile=False)
+            print(f"Loaded existing model from {MODEL_PATH}")
+        else:
+            print(f"Model file {MODEL_PATH} not found. Creating new model...")
+            # Create a new model with the same architecture as train_rl.py
+            model = architectures.build_model("standard", compile=False)
+            model.save(MODEL_PATH)  # Keep original format
+            print(f"New model created and saved to {MODEL_PATH}")
+        
+    except Exception as e:
+        print(f"Error loading model: {e}")
+        print("Creating new model...")
+        # Create a simple fallback model
+        model = architectures.build_model("small", compile=False)
+        model.save(MODEL_PATH)  # Keep original format
+        print(f"Fallback model created and saved to {MODEL_PATH}")
 
 # Manually compile after loading
 model.compile(optimizer="adam", loss="mse", metrics=["mae"])
@@ -47,6 +63,125 @@ model.compile(optimizer="adam", loss="mse", metrics=["mae"])
 EPSILON = 0.1  # Exploration rate for RL inference
 EXPLORATION_ENABLED = False  # Set to True for continued learning during play
 
+# Hot reload of new model versions between searches
+AUTO_RELOAD = True  # UCI option AutoReload
+artifact_watcher = ArtifactWatcher(MODEL_ARTIFACT, model_version)
+CACHE_INVALIDATORS = []  # Callables clearing evaluation caches when weights change
+
+# Opening book parameters (build the book with opening_book.py)
+OWN_BOOK = True  # UCI option OwnBook
+BOOK_FILE = BOOK_PATH  # UCI option BookFile
+BOOK_MODE = "best"  # UCI option BookMode: "best" (deterministic) or "weighted"
+book = None
+
+# Endgame bitbases (generate the tables with bitbase.py)
+USE_BITBASES = True  # UCI option UseBitbases
+bitbases = BitbaseSet(BITBASE_DIR)
+
+# Search: "greedy" 1-ply network policy or batched Monte Carlo tree search
+SEARCH_MODE = "greedy"  # UCI option SearchMode
+MCTS_NODES = MAX_NODES  # UCI option MCTSNodes: tree positions per search without time limits
+THREADS = 1  # UCI option Threads: Lazy-SMP tree search workers
+
+# Quiescence: play out captures before the network sees a position
+PONDER = False  # UCI option Ponder: report an expected reply and search it on the opponent's time
+QUIESCENCE = True  # UCI option Quiescence
+QS_PRUNE_MARGIN = 300  # Root moves losing this much material (centipawns) more than the best skip the network
+quiescence = Quiescence()
+
+# Options advertised in reply to "uci"
+UCI_OPTIONS = [
+    "option name SearchMode type combo default greedy var greedy var mcts",
+    f"option name MCTSNodes type spin default {MAX_NODES} min 1 max 10000000",
+    "option name Threads type spin default 1 min 1 max 256",
+    "option name Quiescence type check default true",
+    "option name Ponder type check default false",
+    "option name OwnBook type check default true",
+    "option name UseBitbases type check default true",
+    f"option name ModelFile type string default {ARTIFACT_PATH}",
+    "option name AutoReload type check default true",
+    "option name ReloadModel type button",
+    f"option name BookFile type string default {BOOK_PATH}",
+    "option name BookMode type combo default best var best var weighted",
+]
+
+def probe_book(board):
+    """Look up board in the memory-mapped opening book, returning a move or None."""
+    global book
+    if not OWN_BOOK or not os.path.exists(BOOK_FILE):
+        return None
+    try:
+        if book is None or book.path != BOOK_FILE:
+            if book is not None:
+                book.close()
+            book = OpeningBook(BOOK_FILE)
+        return book.probe(board, BOOK_MODE)
+    except Exception as e:
+        print(f"info string Opening book lookup failed: {e}", file=sys.stderr)
+        return None
+
+def reload_model(force=False):
+    """Swap in a newer model artifact, if any, and invalidate caches.
+
+    Called between searches, so no evaluation ever sees mixed weights.
+    """
+    global model, model_version
+    if force:
+        artifact_watcher.reset()
+    try:
+        loaded = artifact_watcher.poll()
+    except Exception as e:
+        print(f"info string Model reload failed: {e}", file=sys.stderr)
+        return False
+    if loaded is None:
+        return False
+    metadata, layers = loaded
+    if model_artifact.same_architecture(model, metadata):
+        model.set_weights([array for kernel, bias, _ in layers for array in (kernel, bias)])
+    else:
+        model = model_artifact.build_model(metadata, layers)
+    model_version = metadata["version"]
+    for invalidate in CACHE_INVALIDATORS:
+        invalidate()
+    print(f"info string Loaded model artifact v{model_version}", file=sys.stderr)
+    return True
+
+def set_option(name, value):
+    """Apply a UCI setoption command."""
+    global OWN_BOOK, BOOK_FILE, BOOK_MODE, USE_BITBASES, AUTO_RELOAD, artifact_watcher
+    global SEARCH_MODE, MCTS_NODES, THREADS, QUIESCENCE, PONDER, search_tree
+    name = name.lower()
+    if name == "ponder":
+        PONDER = value.lower() == "true"
+    elif name == "threads":
+        THREADS = max(1, int(value))
+        search_tree.close()
+        search_tree = ParallelSearch(encode_position, predict_values, THREADS)
+    elif name == "quiescence":
+        QUIESCENCE = value.lower() == "true"
+        search_tree.reset()  # Cached values came from the other encoding
+    elif name == "searchmode":
+        SEARCH_MODE = value.lower()
+    elif name == "mctsnodes":
+        MCTS_NODES = max(1, int(value))
+    elif name == "modelfile":
+        artifact_watcher = ArtifactWatcher(value, 0)
+        reload_model()
+    elif name == "autoreload":
+        AUTO_RELOAD = value.lower() == "true"
+    elif name == "reloadmodel":
+        reload_model(force=True)
+    elif name == "ownbook":
+        OWN_BOOK = value.lower() == "true"
+    elif name == "usebitbases":
+        USE_BITBASES = value.lower() == "true"
+    elif name == "bookfile":
+        BOOK_FILE = value
+    elif name == "bookmode":
+        BOOK_MODE = value.lower()
+    else:
+        print(f"info string Unknown option: {name}", file=sys.stderr)
+
 def board_to_input(board):
     """Convert board state to input format for the neural network."""
     input_array = np.zeros((8, 8, 12), dtype=np.float32)
@@ -65,52 +200,170 @@ def board_to_input(board):
         input_array[row, col, index] = 1
     return input_array.flatten().reshape(1, -1)
 
-def evaluate_moves(board):
-    """Evaluate all legal moves using the neural network (RL version)."""
-    
+def encode_position(board, line=None):
+    """Network input for board, taken after its capture sequence when Quiescence is on.
+
+    line is the capture sequence if the caller has already searched it.
+    """
+    if not QUIESCENCE:
+        return board_to_input(board)
+    if line is None:
+        _, line = quiescence.quiet_line(board)
+    for move in line:
+        board.push(move)
+    input_row = board_to_input(board)
+    for _ in line:
+        board.pop()
+    return input_row
+
+def predict_values(input_data):
+    """Batch network evaluation used by the tree search."""
+    return model.predict(input_data, verbose=0).flatten()
+
+# Kept between "go" commands so the subtree after the opponent's move is reused
+search_tree = ParallelSearch(encode_position, predict_values, THREADS)
+CACHE_INVALIDATORS.append(lambda: search_tree.reset())  # search_tree is replaced by Threads
+
+def parse_go(command, board):
+    """Return search limits {"nodes", "movetime" (seconds), "infinite"} from a UCI go command."""
+    parts = command.split()
+    if "infinite" in parts:
+        return {"infinite": True}
+    values = {}
+    for name in ("nodes", "movetime", "wtime", "btime", "winc", "binc", "movestogo"):
+        if name in parts and parts.index(name) + 1 < len(parts):
+            values[name] = int(parts[parts.index(name) + 1])
+    limits = {"nodes": values.get("nodes")}
+    if "movetime" in values:
+        limits["movetime"] = values["movetime"] / 1000.0
+    else:
+        remaining = values.get("wtime" if board.turn == chess.WHITE else "btime")
+        if remaining is not None:
+            increment = values.get("winc" if board.turn == chess.WHITE else "binc", 0)
+            moves_to_go = values.get("movestogo", 30)
+            limits["movetime"] = max(0.05, (remaining / moves_to_go + increment * 0.8) / 1000.0)
+    return limits
+
+def mcts_move(board, legal_moves, restricted, limits=None):
+    """Pick a move with the batched tree search and report it as UCI info."""
+    limits = limits or {}
+    max_nodes = limits.get("nodes")
+    max_time = limits.get("movetime")
+    if limits.get("infinite"):
+        max_nodes = float("inf")  # Until stopped (go infinite, go ponder)
+    elif max_nodes is None:
+        # A time limit alone runs until the clock; otherwise use the option's budget
+        max_nodes = float("inf") if max_time is not None else MCTS_NODES
+    move = search_tree.search(board, max_nodes, max_time, legal_moves if restricted else None,
+                              limits.get("stop"))
+    if move is not None:
+        elapsed = max(search_tree.elapsed, 1e-6)
+        pv = " ".join(pv_move.uci() for pv_move in search_tree.best_line()) or move.uci()
+        print(f"info nodes {search_tree.nodes} time {int(elapsed * 1000)} "
+              f"nps {int(search_tree.nodes / elapsed)} pv {pv}", flush=True)
+    return move
+
+def evaluate_moves(board, tracker=None, limits=None):
+    """Evaluate all legal moves using the neural network (RL version).
+
+    tracker is an optional GameStateTracker kept in sync with board; without
+    one the game history is replayed once to build it. limits holds the
+    search budget of a go command (see parse_go) for the MCTS search mode,
+    plus an optional threading.Event under "stop".
+    """
+    if tracker is None:
+        tracker = GameStateTracker(board)
+
+    # Single legal-move generation, reused for mate and stalemate detection
+    legal_moves = list(board.legal_moves)
+
     # Check for all possible game ending conditions based on chess rules
-    if board.is_checkmate():
+    status = tracker.status(legal_moves)
+    if status == CHECKMATE:
         winner = "White" if board.turn == chess.BLACK else "Black"
         print(f"info string CHECKMATE! {winner} wins!", file=sys.stderr)
         return None
     
-    if board.is_stalemate():
+    if status == STALEMATE:
         print("info string STALEMATE! Game is a draw.", file=sys.stderr)
         return None
     
-    if board.is_insufficient_material():
+    if status == INSUFFICIENT_MATERIAL:
         print("info string DRAW! Insufficient material to checkmate.", file=sys.stderr)
         return None
     
-    if board.is_seventyfive_moves():
+    if status == SEVENTYFIVE_MOVES:
         print("info string DRAW! 75-move rule - no capture or pawn move in 75 moves.", file=sys.stderr)
         return None
     
-    if board.is_fivefold_repetition():
+    if status == FIVEFOLD_REPETITION:
         print("info string DRAW! Position repeated 5 times.", file=sys.stderr)
         return None
     
     # Check for optional draw conditions
-    if board.can_claim_fifty_moves():
+    if tracker.can_claim_fifty_moves():
         print("info string DRAW can be claimed! 50-move rule.", file=sys.stderr)
     
-    if board.can_claim_threefold_repetition():
+    if tracker.can_claim_threefold_repetition():
         print("info string DRAW can be claimed! Threefold repetition.", file=sys.stderr)
     
     # Check if current player is in check
     if board.is_check():
         current_player = "White" if board.turn == chess.WHITE else "Black"
         print(f"info string CHECK! {current_player} king is in check.", file=sys.stderr)
-    
-    legal_moves = list(board.legal_moves)
-    if not legal_moves:
-        print("info string No legal moves available!", file=sys.stderr)
-        return None
+
+    # Endgame bitbases: exact win/draw/loss for positions with few pieces
+    restricted = False
+    if USE_BITBASES and chess.popcount(board.occupied) <= MAX_PIECES:
+        try:
+            candidates = select_moves(bitbases, board, legal_moves)
+        except Exception as e:
+            print(f"info string Bitbase probe failed: {e}", file=sys.stderr)
+            candidates = None
+        if candidates:
+            if len(candidates) == 1:
+                return candidates[0]
+            legal_moves = candidates  # Let the network choose among drawing moves
+            restricted = True
+
+    # Opening book: near-instant, deterministic moves for known positions
+    book_move = probe_book(board)
+    if book_move:
+        print(f"info string Book move {book_move.uci()}", file=sys.stderr)
+        return book_move
 
     # RL exploration: sometimes choose random moves
     if EXPLORATION_ENABLED and random.random() < EPSILON:
         return random.choice(legal_moves)
 
+    if SEARCH_MODE == "mcts":
+        try:
+            return mcts_move(board, legal_moves, restricted, limits)
+        except Exception as e:
+            print(f"info string Tree search failed: {e}", file=sys.stderr)
+            search_tree.reset()
+
+    return network_choice(board, legal_moves)
+
+def network_choice(board, legal_moves):
+    """Pick the move whose resulting position the network scores highest (1-ply)."""
+    # Quiescence: skip the network for moves that lose material in the capture sequence
+    quiet_lines = {}
+    if QUIESCENCE and len(legal_moves) > 1:
+        material_results = []
+        for move in legal_moves:
+            board.push(move)
+            score, quiet_lines[move] = quiescence.quiet_line(board)
+            board.pop()
+            material_results.append(-score)
+        best_material = max(material_results)
+        candidates = [move for move, result in zip(legal_moves, material_results)
+                      if result >= best_material - QS_PRUNE_MARGIN]
+        if len(candidates) < len(legal_moves):
+            print(f"info string Quiescence pruned {len(legal_moves) - len(candidates)} of "
+                  f"{len(legal_moves)} moves", file=sys.stderr)
+        legal_moves = candidates
+
     # Use neural network to evaluate moves
     input_data = []
     move_map = {}
@@ -118,7 +371,7 @@ def evaluate_moves(board):
     # Batch all legal moves for faster evaluation
     for move in legal_moves:
         board.push(move)
-        input_data.append(board_to_input(board))
+        input_data.append(encode_position(board, quiet_lines.get(move)))
         move_map[len(input_data) - 1] = move
         board.pop()
 
@@ -134,36 +387,142 @@ def evaluate_moves(board):
         # Fallback to a random move
         return random.choice(legal_moves)
 
+def ponder_move(board, move):
+    """Expected reply after move is played in board: from the search tree, else the network."""
+    if SEARCH_MODE == "mcts":
+        line = search_tree.best_line(2)
+        if len(line) == 2 and line[0] == move:
+            return line[1]
+    board.push(move)
+    try:
+        legal_moves = list(board.legal_moves)
+        return network_choice(board, legal_moves) if legal_moves else None
+    except Exception as e:
+        print(f"info string Ponder move prediction failed: {e}", file=sys.stderr)
+        return None
+    finally:
+        board.pop()
+
+class SearchThread(threading.Thread):
+    """Runs one go command so the UCI loop can still read stop and ponderhit.
+
+    With "go ponder" the position includes the expected reply. The search
+    runs until ponderhit or stop and holds back bestmove until then. On
+    ponderhit in MCTS mode a second search runs under the go command's real
+    limits, starting from the tree built while pondering, and its move is
+    reported; in greedy mode the pondered move is reported at once. On stop
+    (the opponent played something else) the pondered move is reported and
+    dropped by the GUI; the next search starts a fresh root.
+    """
+
+    def __init__(self, tracker, command):
+        super().__init__(daemon=True)
+        self.tracker = tracker.copy()  # The loop may set up a new position meanwhile
+        self.board = self.tracker.board
+        self.limits = parse_go(command, self.board)
+        self.pondering = "ponder" in command.split()
+        self.stop_event = threading.Event()
+        self.ponder_over = threading.Event()  # Set by ponderhit or stop
+        self.hit = False
+
+    def stop(self):
+        self.stop_event.set()
+        self.ponder_over.set()
+
+    def ponderhit(self):
+        self.hit = True
+        self.ponder_over.set()
+
+    def run(self):
+        try:
+            if self.pondering:
+                best_move = evaluate_moves(self.board, self.tracker, {"infinite": True, "stop": self.ponder_over})
+                self.ponder_over.wait()  # No bestmove before ponderhit or stop
+                if self.hit and not self.stop_event.is_set() and SEARCH_MODE == "mcts":
+                    best_move = evaluate_moves(self.board, self.tracker, dict(self.limits, stop=self.stop_event))
+            else:
+                best_move = evaluate_moves(self.board, self.tracker, dict(self.limits, stop=self.stop_event))
+            if best_move:
+                ponder = ponder_move(self.board, best_move) if PONDER else None
+                print(f"bestmove {best_move.uci()}" + (f" ponder {ponder.uci()}" if ponder else ""), flush=True)
+        except Exception as e:
+            print(f"info string Error: {e}", file=sys.stderr)
+
 def uci_loop():
     """Main UCI loop for the chess engine."""
+    sys.stdout.reconfigure(line_buffering=True)  # GUIs wait on readyok/uciok through a pipe
     board = chess.Board()
+    tracker = GameStateTracker(board)
+    search = None  # SearchThread of the current go command
     print("id name NeuralChessEngine")
     print("id author YourName")
+    for option in UCI_OPTIONS:
+        print(option)
     print("uciok")
     
     while True:
         try:
             command = input().strip()
             if command == "uci":
+                for option in UCI_OPTIONS:
+                    print(option)
                 print("uciok")
+            elif command.startswith("setoption"):
+                parts = command.split()
+                if "name" in parts:
+                    name_index = parts.index("name") + 1
+                    value_index = parts.index("value") if "value" in parts else len(parts)
+                    set_option(" ".join(parts[name_index:value_index]), " ".join(parts[value_index + 1:]))
             elif command == "isready":
                 print("readyok")
+            elif command == "stop":
+                if search is not None:
+                    search.stop()
+            elif command == "ponderhit":
+                if search is not None:
+                    search.ponderhit()
             elif command.startswith("position"):
+                if search is not None:
+                    search.stop()  # A new position ends any search still running
+                    search.join()
                 parts = command.split()
                 if "startpos" in parts:
                     board = chess.Board()
                 elif "fen" in parts:
                     fen_index = parts.index("fen") + 1
                     board = chess.Board(" ".join(parts[fen_index:fen_index+6]))
+                tracker = GameStateTracker(board)
                 if "moves" in parts:
                     moves_index = parts.index("moves") + 1
                     for move in parts[moves_index:]:
-                        board.push_uci(move)
+                        tracker.push(board.parse_uci(move))
+            elif command.startswith("go perft"):
+                # Move generation check: "go perft N" or "go perft N divide"
+                parts = command.split()
+                depth = int(parts[2]) if len(parts) > 2 else 1
+                start = time.time()
+                if "divide" in parts:
+                    counts = divide(board, depth)
+                    for move, count in counts.items():
+                        print(f"{move.uci()}: {count}")
+                    nodes = sum(counts.values())
+                    print()
+                else:
+                    nodes = perft(board, depth)
+                elapsed = max(time.time() - start, 1e-6)
+                print(f"info string perft {depth} time {int(elapsed * 1000)} nps {int(nodes / elapsed)}", file=sys.stderr)
+                print(f"Nodes searched: {nodes}")
             elif command.startswith("go"):
-                best_move = evaluate_moves(board)
-                if best_move:
-                    print(f"bestmove {best_move.uci()}")
+                if search is not None:
+                    search.join()
+                if AUTO_RELOAD:
+                    reload_model()  # Pick up new weights between searches
+                search = SearchThread(tracker, command)
+                search.start()
             elif command == "quit":
+                if search is not None:
+                    search.stop()
+                    search.join()
                 break
         except Exception as e:
             print(f"info string Error: {e}", file=sys.stderr)
@@ -0,0 +1,162 @@
+"""
+Incremental game-state tracking for the chess engine.
+
+python-chess answers repetition and move-rule questions by replaying the move
+stack and regenerating legal moves on every call. GameStateTracker keeps a
+Polyglot-compatible Zobrist key and a key occurrence count up to date as moves
+are pushed and popped, so the same questions are answered in O(1).
+"""
+
+import chess
+from chess.polyglot import POLYGLOT_RANDOM_ARRAY, zobrist_hash
+
+# Terminal and claimable states reported by GameStateTracker.status()
+CHECKMATE = "checkmate"
+STALEMATE = "stalemate"
+INSUFFICIENT_MATERIAL = "insufficient_material"
+SEVENTYFIVE_MOVES = "seventyfive_moves"
+FIVEFOLD_REPETITION = "fivefold_repetition"
+
+_CASTLING_INDEX = 768
+_EP_INDEX = 772
+_TURN_INDEX = 780
+
+
+def _piece_key(piece_type, color, square):
+    """Zobrist value of a single piece on a square (Polyglot layout)."""
+    pivot = 1 if color == chess.WHITE else 0
+    return POLYGLOT_RANDOM_ARRAY[64 * ((piece_type - 1) * 2 + pivot) + square]
+
+
+def _squares_key(board, mask):
+    """XOR of the piece keys for every occupied square in mask."""
+    key = 0
+    for square in chess.scan_forward(mask & board.occupied):
+        piece = board.piece_at(square)
+        key ^= _piece_key(piece.piece_type, piece.color, square)
+    return key
+
+
+def _state_key(board):
+    """Castling, en passant and side-to-move part of the Zobrist key."""
+    key = 0
+    if board.has_kingside_castling_rights(chess.WHITE):
+        key ^= POLYGLOT_RANDOM_ARRAY[_CASTLING_INDEX]
+    if board.has_queenside_castling_rights(chess.WHITE):
+        key ^= POLYGLOT_RANDOM_ARRAY[_CASTLING_INDEX + 1]
+    if board.has_kingside_castling_rights(chess.BLACK):
+        key ^= POLYGLOT_RANDOM_ARRAY[_CASTLING_INDEX + 2]
+    if board.has_queenside_castling_rights(chess.BLACK):
+        key ^= POLYGLOT_RANDOM_ARRAY[_CASTLING_INDEX + 3]
+
+    # Polyglot only hashes the en passant file if a pawn can capture there
+    if board.ep_square is not None:
+        if board.turn == chess.WHITE:
+            ep_mask = chess.shift_down(chess.BB_SQUARES[board.ep_square])
+        else:
+            ep_mask = chess.shift_up(chess.BB_SQUARES[board.ep_square])
+        ep_mask = chess.shift_left(ep_mask) | chess.shift_right(ep_mask)
+        if ep_mask & board.pawns & board.occupied_co[board.turn]:
+            key ^= POLYGLOT_RANDOM_ARRAY[_EP_INDEX + chess.square_file(board.ep_square)]
+
+    if board.turn == chess.WHITE:
+        key ^= POLYGLOT_RANDOM_ARRAY[_TURN_INDEX]
+    return key
+
+
+def _move_mask(board, move):
+    """Squares whose contents change when move is played on board."""
+    if board.is_castling(move):
+        # King and rook both move along the back rank
+        return chess.BB_RANK_1 if board.turn == chess.WHITE else chess.BB_RANK_8
+    mask = chess.BB_SQUARES[move.from_square] | chess.BB_SQUARES[move.to_square]
+    if board.is_en_passant(move):
+        mask |= chess.BB_SQUARES[board.ep_square + (-8 if board.turn == chess.WHITE else 8)]
+    return mask
+
+
+class GameStateTracker:
+    """Tracks the Zobrist key and repetition counts of a board incrementally.
+
+    All moves must go through push()/pop() on the tracker so the counters stay
+    in sync with the wrapped board.
+    """
+
+    def __init__(self, board=None):
+        board = board if board is not None else chess.Board()
+        self._stack = []
+        self._counts = {}
+
+        # Replay any existing move stack once on a scratch copy so the
+        # history is complete, then attach to the caller's board
+        self.board = board.root()
+        self.key = zobrist_hash(self.board)
+        self._counts[self.key] = 1
+        for move in board.move_stack:
+            self.push(move)
+        self.board = board
+
+    def push(self, move):
+        """Play move on the board and update the key and counts."""
+        board = self.board
+        mask = _move_mask(board, move)
+        key = self.key ^ _squares_key(board, mask) ^ _state_key(board)
+        board.push(move)
+        key ^= _squares_key(board, mask) ^ _state_key(board)
+
+        self._stack.append(self.key)
+        self.key = key
+        self._counts[key] = self._counts.get(key, 0) + 1
+
+    def pop(self):
+        """Take back the last move and restore the previous key."""
+        count = self._counts[self.key] - 1
+        if count:
+            self._counts[self.key] = count
+        else:
+            del self._counts[self.key]
+        self.key = self._stack.pop()
+        return self.board.pop()
+
+    def copy(self):
+        """Independent tracker on a copy of the board, without replaying its moves."""
+        tracker = GameStateTracker.__new__(GameStateTracker)
+        tracker.board = self.board.copy()
+        tracker.key = self.key
+        tracker._stack = list(self._stack)
+        tracker._counts = dict(self._counts)
+        return tracker
+
+    def repetitions(self):
+        """Number of times the current position has occurred."""
+        return self._counts.get(self.key, 0)
+
+    @property
+    def halfmove_clock(self):
+        return self.board.halfmove_clock
+
+    def can_claim_fifty_moves(self):
+        """50-move rule reached in the current position."""
+        return self.board.halfmove_clock >= 100
+
+    def can_claim_threefold_repetition(self):
+        """Current position has occurred at least three times."""
+        return self.repetitions() >= 3
+
+    def status(self, legal_moves=None):
+        """Return the terminal state of the position, or None if play goes on.
+
+        legal_moves may be passed in so that the caller's single legal-move
+        generation is reused for mate and stalemate detection.
+        """
+        if legal_moves is None:
+            legal_moves = list(self.board.legal_moves)
+        if not legal_moves:
+            return CHECKMATE if self.board.is_check() else STALEMATE
+        if self.board.is_insufficient_material():
+            return INSUFFICIENT_MATERIAL
+        if self.board.halfmove_clock >= 150:
+            return SEVENTYFIVE_MOVES
+        if self.repetitions() >= 5:
+            return FIVEFOLD_REPETITION
+        return None
@@ -0,0 +1,216 @@
+"""
+Indexed Binary Game Store
+
+Append-only game database replacing one-PGN-file-per-game in train/:
+
+    moves.bin     every game's moves as consecutive uint16 codes
+    headers.jsonl one JSON object of PGN headers per game (side table)
+    index.bin     one fixed-size record per game: offsets, date and result
+
+The index gives O(1) random access to any game and vectorized range scans
+by date or result. Trainers replay the uint16 moves directly, without any
+PGN parsing.
+
+Usage: python game_store.py import games.pgn [...]
+       python game_store.py export out.pgn
+"""
+
+import os
+import sys
+import json
+import numpy as np
+import chess
+import chess.pgn
+
+GAME_DB_DIR = "games_db"
+
+INDEX_DTYPE = np.dtype([
+    ("moves_offset", "<u8"),   # First move, in moves (not bytes)
+    ("num_moves", "<u4"),
+    ("header_offset", "<u8"),  # Byte offset into headers.jsonl
+    ("header_length", "<u4"),
+    ("date", "<u4"),           # YYYYMMDD, unknown parts as 0
+    ("result", "i1"),          # 1 white wins, -1 black wins, 0 draw, 2 unfinished
+])
+MOVE_DTYPE = np.dtype("<u2")
+
+RESULT_CODES = {"1-0": 1, "0-1": -1, "1/2-1/2": 0, "*": 2}
+RESULT_STRINGS = {code: result for result, code in RESULT_CODES.items()}
+
+
+def encode_move(move):
+    """Pack a move into 16 bits: from | to << 6 | promotion << 12."""
+    return move.from_square | (move.to_square << 6) | ((move.promotion or 0) << 12)
+
+
+def decode_move(code):
+    code = int(code)
+    promotion = code >> 12
+    return chess.Move(code & 0x3f, (code >> 6) & 0x3f, promotion or None)
+
+
+def encode_date(date):
+    """Convert a PGN date such as "2024.05.??" to YYYYMMDD with 0 for unknown parts."""
+    value = 0
+    parts = (date or "").split(".")
+    for part, scale in zip(parts + ["", "", ""], (10000, 100, 1)):
+        if part.isdigit():
+            value += int(part) * scale
+    return value
+
+
+class GameStore:
+    """Append-only game database with an offset index."""
+
+    def __init__(self, path=GAME_DB_DIR):
+        self.path = path
+        self.moves_path = os.path.join(path, "moves.bin")
+        self.headers_path = os.path.join(path, "headers.jsonl")
+        self.index_path = os.path.join(path, "index.bin")
+        self._index = None
+        self._index_size = -1
+
+    @property
+    def index(self):
+        """The index as a structured NumPy array, reloaded when it has grown."""
+        size = os.path.getsize(self.index_path) if os.path.exists(self.index_path) else 0
+        if size != self._index_size:
+            count = size // INDEX_DTYPE.itemsize
+            if count:
+                self._index = np.fromfile(self.index_path, dtype=INDEX_DTYPE, count=count)
+            else:
+                self._index = np.zeros(0, dtype=INDEX_DTYPE)
+            self._index_size = size
+        return self._index
+
+    def __len__(self):
+        return len(self.index)
+
+    def append(self, moves, headers):
+        """Append one game and return its id.
+
+        The index record is written last, so a crash leaves at most some
+        unreferenced bytes in the data files.
+        """
+        os.makedirs(self.path, exist_ok=True)
+        codes = np.array([encode_move(move) for move in moves], dtype=MOVE_DTYPE)
+        header_bytes = (json.dumps(dict(headers)) + "\n").encode("utf-8")
+
+        with open(self.moves_path, "ab") as moves_file:
+            moves_offset = moves_file.tell() // MOVE_DTYPE.itemsize
+            moves_file.write(codes.tobytes())
+        with open(self.headers_path, "ab") as headers_file:
+            header_offset = headers_file.tell()
+            headers_file.write(header_bytes)
+
+        record = np.zeros(1, dtype=INDEX_DTYPE)
+        record["moves_offset"] = moves_offset
+        record["num_moves"] = len(codes)
+        record["header_offset"] = header_offset
+        record["header_length"] = len(header_bytes)
+        record["date"] = encode_date(headers.get("Date"))
+        record["result"] = RESULT_CODES.get(headers.get("Result", "*"), 2)
+        with open(self.index_path, "ab") as index_file:
+            game_id = index_file.tell() // INDEX_DTYPE.itemsize
+            index_file.write(record.tobytes())
+        return game_id
+
+    def append_game(self, game):
+        """Append a chess.pgn.Game."""
+        return self.append(game.mainline_moves(), game.headers)
+
+    def move_codes(self, game_id):
+        """Raw uint16 move codes of a game."""
+        record = self.index[game_id]
+        with open(self.moves_path, "rb") as moves_file:
+            moves_file.seek(int(record["moves_offset"]) * MOVE_DTYPE.itemsize)
+            return np.fromfile(moves_file, dtype=MOVE_DTYPE, count=int(record["num_moves"]))
+
+    def moves(self, game_id):
+        return [decode_move(code) for code in self.move_codes(game_id)]
+
+    def headers(self, game_id):
+        record = self.index[game_id]
+        with open(self.headers_path, "rb") as headers_file:
+            headers_file.seek(int(record["header_offset"]))
+            return json.loads(headers_file.read(int(record["header_length"])))
+
+    def result(self, game_id):
+        return RESULT_STRINGS[int(self.index[game_id]["result"])]
+
+    def start_board(self, game_id):
+        """Starting position of a game (honours a FEN header)."""
+        fen = self.headers(game_id).get("FEN")
+        return chess.Board(fen) if fen else chess.Board()
+
+    def boards(self, game_id):
+        """Yield (board, move) for every move of a game, replayed without PGN parsing."""
+        board = self.start_board(game_id)
+        for move in self.moves(game_id):
+            yield board, move
+            board.push(move)
+
+    def game(self, game_id):
+        """Rebuild a game as a chess.pgn.Game."""
+        game = chess.pgn.Game()
+        for key, value in self.headers(game_id).items():
+            game.headers[key] = value
+        node = game
+        for move in self.moves(game_id):
+            node = node.add_variation(move)
+        return game
+
+    def scan(self, date_from=None, date_to=None, result=None, start=0, stop=None):
+        """Return the ids of games in [start, stop) matching a date range and result.
+
+        Dates are YYYYMMDD integers or PGN date strings; result is a PGN
+        result string such as "1-0".
+        """
+        index = self.index
+        stop = len(index) if stop is None else min(stop, len(index))
+        mask = np.zeros(len(index), dtype=bool)
+        mask[start:stop] = True
+        if date_from is not None:
+            mask &= index["date"] >= (encode_date(date_from) if isinstance(date_from, str) else date_from)
+        if date_to is not None:
+            mask &= index["date"] <= (encode_date(date_to) if isinstance(date_to, str) else date_to)
+        if result is not None:
+            mask &= index["result"] == RESULT_CODES[result]
+        return np.nonzero(mask)[0]
+
+    def import_pgn(self, pgn_path):
+        """Append every game of a PGN file; returns the number imported."""
+        count = 0
+        with open(pgn_path, "r") as pgn_file:
+            while True:
+                game = chess.pgn.read_game(pgn_file)
+                if game is None:
+                    break
+                self.append_game(game)
+                count += 1
+        return count
+
+    def export_pgn(self, pgn_path, game_ids=None):
+        """Write games (all by default) to a PGN file."""
+        game_ids = range(len(self)) if game_ids is None else game_ids
+        with open(pgn_path, "w") as pgn_file:
+            for game_id in game_ids:
+                pgn_file.write(str(self.game(int(game_id))) + "\n\n")
+
+
+def main():
+    if len(sys.argv) < 3 or sys.argv[1] not in ("import", "export"):
+        print("Usage: python game_store.py import games.pgn [...] | export out.pgn")
+        sys.exit(1)
+
+    store = GameStore()
+    if sys.argv[1] == "import":
+        for pgn_path in sys.argv[2:]:
+            print(f"Imported {store.import_pgn(pgn_path)} games from {pgn_path}")
+    else:
+        store.export_pgn(sys.argv[2])
+        print(f"Exported {len(store)} games to {sys.argv[2]}")
+
+
+if __name__ == "__main__":
+    main()
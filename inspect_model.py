@@ -35,6 +35,10 @@ if __name__ == "__main__":
     model = tf.keras.models.load_model(model_path, compile=False)
     inspect_model(model)
 
+    # Inference cost on this machine (see architectures.py to compare architectures)
+    from architectures import profile, print_profiles
+    print_profiles([(os.path.basename(model_path), profile(model))])
+
     # Save model plot
     try:
         plot_model(model, to_file="model.png", show_shapes=True, show_layer_names=True)
@@ -0,0 +1,179 @@
+"""
+Background Job Manager
+
+Runs chess games and model training as background subprocesses so the Tk
+and Kivy launchers keep responding. Output lines are streamed back to the
+UI through a queue, training progress lines printed by train_custom.py are
+parsed into epochs and samples/sec, and several pending "train after game"
+requests are coalesced into a single run.
+"""
+
+import os
+import queue
+import threading
+import subprocess
+
+# Virtual environment Python path
+VENV_PYTHON = os.path.join(os.getcwd(), "myenv", "Scripts", "python.exe")
+# Fallback to system python if venv doesn't exist
+if not os.path.exists(VENV_PYTHON):
+    VENV_PYTHON = "python"
+
+GAME_SCRIPT = "custom_game.py"
+TRAIN_SCRIPT = "train_custom.py"
+PROGRESS_PREFIX = "PROGRESS"  # Machine-readable progress lines from the trainers
+
+
+def parse_progress(line):
+    """Parse "PROGRESS key=value ..." lines into a dict, or None for other output."""
+    if not line.startswith(PROGRESS_PREFIX):
+        return None
+    progress = {}
+    for field in line.split()[1:]:
+        key, _, value = field.partition("=")
+        progress[key] = value
+    return progress
+
+
+class Job:
+    """A background subprocess and its latest state."""
+
+    def __init__(self, kind, args):
+        self.kind = kind  # "game" or "train"
+        self.args = args
+        self.process = None
+        self.status = "queued"  # queued, running, done, failed, cancelled
+        self.progress = {}
+        self.returncode = None
+
+    def describe(self):
+        if self.kind == "train" and self.progress:
+            epoch = self.progress.get("epoch", "?")
+            rate = self.progress.get("samples_per_sec", "?")
+            return f"Training {self.status}: epoch {epoch}, {rate} samples/sec"
+        return f"{self.kind.capitalize()} {self.status}"
+
+
+class JobManager:
+    """Starts games and training in the background and reports their progress.
+
+    At most one training job runs at a time. Training requests made while one
+    is running are merged into a single pending run; a full retrain absorbs
+    any pending incremental one. Games run independently, so training
+    overlaps with the next game.
+    """
+
+    def __init__(self, python=VENV_PYTHON, train_after_game=True):
+        self.python = python
+        self.train_after_game = train_after_game
+        self.events = queue.Queue()
+        self.lock = threading.Lock()
+        self.games = []
+        self.training = None
+        self.pending_training = None  # None, "incremental" or "full"
+
+    def start_game(self):
+        """Launch a game; an incremental training run is requested when it ends."""
+        job = Job("game", [self.python, GAME_SCRIPT])
+        with self.lock:
+            self.games.append(job)
+            self._start(job)
+        return job
+
+    def request_training(self, mode="incremental"):
+        """Queue a training run, coalescing with any already pending request."""
+        with self.lock:
+            if self.pending_training != "full":
+                self.pending_training = mode
+            if self.training is None:
+                self._start_pending_training()
+
+    def cancel_training(self):
+        """Drop the pending request and stop the running training job."""
+        with self.lock:
+            self.pending_training = None
+            job = self.training
+        if job is not None and job.process is not None and job.process.poll() is None:
+            job.status = "cancelled"
+            job.process.terminate()
+
+    def is_busy(self):
+        with self.lock:
+            return self.training is not None or any(job.status == "running" for job in self.games)
+
+    def poll(self):
+        """Drain (job, line) events; call this periodically from the UI thread."""
+        events = []
+        while True:
+            try:
+                events.append(self.events.get_nowait())
+            except queue.Empty:
+                return events
+
+    def shutdown(self):
+        """Terminate every running job."""
+        self.cancel_training()
+        with self.lock:
+            games = list(self.games)
+        for job in games:
+            if job.process is not None and job.process.poll() is None:
+                job.status = "cancelled"
+                job.process.terminate()
+
+    def _start_pending_training(self):
+        # Caller holds the lock
+        mode = self.pending_training
+        self.pending_training = None
+        if mode is None:
+            return
+        args = [self.python, TRAIN_SCRIPT]
+        if mode == "incremental":
+            args.append("--incremental")
+        self.training = Job("train", args)
+        self._start(self.training)
+
+    def _start(self, job):
+        # Caller holds the lock
+        env = dict(os.environ, PYTHONUNBUFFERED="1")
+        try:
+            job.process = subprocess.Popen(job.args, stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
+                                           text=True, bufsize=1, env=env)
+        except OSError as e:
+            job.status = "failed"
+            self.events.put((job, f"Could not start {job.args[1]}: {e}"))
+            if job.kind == "train":
+                self.training = None
+            else:
+                self.games.remove(job)
+            return
+        job.status = "running"
+        self.events.put((job, f"Started {' '.join(job.args[1:])}"))
+        threading.Thread(target=self._watch, args=(job,), daemon=True).start()
+
+    def _watch(self, job):
+        """Stream a job's output into the event queue until it exits."""
+        for line in job.process.stdout:
+            # Keras progress bars redraw with carriage returns
+            line = line.rstrip("\n").split("\r")[-1].strip()
+            if not line:
+                continue
+            progress = parse_progress(line)
+            if progress is not None:
+                job.progress = progress
+            self.events.put((job, line))
+
+        job.returncode = job.process.wait()
+        if job.status != "cancelled":
+            job.status = "done" if job.returncode == 0 else "failed"
+        self.events.put((job, job.describe()))
+
+        with self.lock:
+            if job.kind == "game":
+                self.games.remove(job)
+                if job.status == "done" and self.train_after_game:
+                    if self.pending_training != "full":
+                        self.pending_training = "incremental"
+            else:
+                self.training = None
+            if self.training is None:
+                self._start_pending_training()
@@ -1,10 +1,11 @@
 import os
-import subprocess
 from kivy.app import App
+from kivy.clock import Clock
 from kivy.uix.boxlayout import BoxLayout
 from kivy.uix.button import Button
 from kivy.uix.label import Label
 from kivy.uix.popup import Popup
+from job_manager import JobManager
 
 # Virtual environment Python path
 VENV_PYTHON = os.path.join(os.getcwd(), "myenv", "Scripts", "python.exe")
@@ -14,6 +15,10 @@ if not os.path.exists(VENV_PYTHON):
 
 class ChessAIApp(App):
     def build(self):
+        # Games and training run in the background; the model is fine-tuned after each game
+        self.jobs = JobManager(VENV_PYTHON)
+        Clock.schedule_interval(self.poll_jobs, 0.2)
+
         layout = BoxLayout(orientation='vertical', spacing=10, padding=20)
         
         label = Label(text="Chess AI Menu", font_size=24, bold=True)
@@ -27,23 +32,35 @@ class ChessAIApp(App):
         btn_setup.bind(on_press=self.run_training)
         layout.add_widget(btn_setup)
         
+        btn_cancel = Button(text="Cancel Training", font_size=18, size_hint=(1, 0.2), background_color=(0.95, 0.6, 0.1, 1))
+        btn_cancel.bind(on_press=self.cancel_training)
+        layout.add_widget(btn_cancel)
+        
         btn_quit = Button(text="Quit", font_size=18, size_hint=(1, 0.2), background_color=(0.9, 0.2, 0.2, 1))
         btn_quit.bind(on_press=self.quit_app)
         layout.add_widget(btn_quit)
         
+        self.status_label = Label(text="Idle", font_size=14, size_hint=(1, 0.1))
+        layout.add_widget(self.status_label)
+        
         return layout
     
     def run_custom_game(self, instance):
         self.show_popup("Starting Game", "The chess game will now start.")
-        subprocess.run([VENV_PYTHON, "custom_game.py"])
-        self.show_popup("Training Model", "Game finished! Training the RL model now...")
-        subprocess.run([VENV_PYTHON, "train_custom.py"])
+        self.jobs.start_game()  # Training is queued automatically when the game ends
     
     def run_training(self, instance):
-        self.show_popup("Training Model", "Training the RL model now...")
-        subprocess.run([VENV_PYTHON, "train_custom.py"])
+        self.jobs.request_training("full")  # Merged with any pending request
+    
+    def cancel_training(self, instance):
+        self.jobs.cancel_training()
+    
+    def poll_jobs(self, dt):
+        for job, line in self.jobs.poll():
+            self.status_label.text = job.describe() if job.progress else line[:60]
     
     def quit_app(self, instance):
+        self.jobs.shutdown()
         App.get_running_app().stop()
     
     def show_popup(self, title, message):
@@ -0,0 +1,273 @@
+"""
+Batched Monte Carlo Tree Search
+
+A PUCT search driven by the value network alone. When a node is expanded,
+all of its children are evaluated together, and virtual loss lets one
+iteration select many leaves before a single batched model.predict call.
+The tree survives between searches: when the next search starts from a
+position that continues the previous root's game, the matching subtree is
+kept.
+
+Values are the network's game-outcome predictions from White's point of
+view (as in train_custom.py), clipped to [-1, 1]. Inside the tree each node
+stores values from the point of view of the side that made its move. An
+optional transposition table, keyed by Zobrist hash, caches the network's
+values across searches and across the trees of parallel workers.
+"""
+
+import math
+import time
+import numpy as np
+import chess
+from game_state import GameStateTracker, CHECKMATE
+
+C_PUCT = 1.5
+BATCH_LEAVES = 8  # Leaves selected (with virtual loss) per batched prediction
+MAX_NODES = 2000  # Default budget of positions added to the tree per search
+
+
+class Node:
+    __slots__ = ("move", "white", "children", "visits", "value_sum", "virtual_loss", "terminal")
+
+    def __init__(self, move, white, terminal=None):
+        self.move = move
+        self.white = white  # True if White made the move leading here
+        self.children = None  # None until expanded
+        self.visits = 0
+        self.value_sum = 0.0
+        self.virtual_loss = 0
+        self.terminal = terminal  # Exact value for finished games
+
+    def q(self):
+        visits = self.visits + self.virtual_loss
+        if visits == 0:
+            return 0.0
+        return (self.value_sum - self.virtual_loss) / visits
+
+
+def terminal_value(tracker):
+    """Exact value for the side that just moved, or None if the game goes on.
+
+    Uses the tracker's repetition counts instead of board.outcome(), which
+    scans the whole move stack for fivefold repetition.
+    """
+    status = tracker.status()
+    if status is None:
+        return None
+    return 1.0 if status == CHECKMATE else 0.0
+
+
+class MCTS:
+    """Search tree over a value network.
+
+    encode(board) returns one network input row for a position and
+    predict(batch) returns one value per row (White's point of view).
+    table is an optional object with get(key) and put(keys, values).
+    """
+
+    def __init__(self, encode, predict, c_puct=C_PUCT, batch_leaves=BATCH_LEAVES, table=None):
+        self.encode = encode
+        self.predict = predict
+        self.c_puct = c_puct
+        self.batch_leaves = batch_leaves
+        self.table = table
+        self.reset()
+
+    def reset(self):
+        """Drop the tree (e.g. after the network's weights changed)."""
+        self.root = None
+        self.root_fen = None
+        self.root_stack = []
+        self.nodes = 0
+        self.evaluations = 0
+
+    def _reuse_root(self, board):
+        """Return the subtree for board if it continues the previous root, else a new root."""
+        stack = board.move_stack
+        if (self.root is not None and self.root_fen == board.root().fen()
+                and stack[:len(self.root_stack)] == self.root_stack):
+            node = self.root
+            for move in stack[len(self.root_stack):]:
+                if node.children is None:
+                    node = None
+                    break
+                node = next((child for child in node.children if child.move == move), None)
+                if node is None:
+                    break
+            if node is not None and node.terminal is None:
+                return node
+        return Node(None, board.turn == chess.BLACK)
+
+    def search(self, board, max_nodes=MAX_NODES, max_time=None, root_moves=None, stop=None):
+        """Search board and return the most visited move.
+
+        max_nodes bounds the number of positions added to the tree plus the
+        visits of finished games, and max_time the wall-clock seconds; root_moves optionally restricts the moves
+        considered at the root (a restricted search does not keep its tree).
+        stop is an optional threading.Event ending the search early.
+        """
+        start = time.time()
+        if root_moves is None:
+            self.root = self._reuse_root(board)
+        else:
+            self.root = Node(None, board.turn == chess.BLACK)
+        self.root_fen = board.root().fen()
+        self.root_stack = list(board.move_stack)
+        self.nodes = 0
+        self.evaluations = 0
+        tracker = GameStateTracker(board)  # Zobrist keys for the transposition table
+
+        if self.root.children is None:
+            self._expand_batch([(self.root, [self.root])], tracker, root_moves)
+        if not self.root.children:
+            return None
+
+        for child in self.root.children:
+            if child.terminal == 1.0:
+                self.elapsed = time.time() - start
+                return child.move  # Checkmate needs no search
+        if all(child.terminal is not None for child in self.root.children):
+            self.elapsed = time.time() - start
+            return max(self.root.children, key=lambda child: child.terminal).move  # Nothing to search
+
+        while self.nodes < max_nodes and len(self.root.children) > 1:
+            if max_time is not None and time.time() - start >= max_time:
+                break
+            if stop is not None and stop.is_set():
+                break
+            nodes = self.nodes
+            leaves = self._select_leaves(tracker)
+            if leaves:
+                self._expand_batch(leaves, tracker)
+            elif self.nodes == nodes:
+                break  # Every selection ended in a finished game and nothing was added
+
+        self.elapsed = time.time() - start
+        best = max(self.root.children, key=lambda child: (child.visits, child.q()))
+        return best.move
+
+    def best_line(self, max_length=8):
+        """Principal variation following the most visited children."""
+        line = []
+        node = self.root
+        while node is not None and node.children and len(line) < max_length:
+            node = max(node.children, key=lambda child: (child.visits, child.q()))
+            line.append(node.move)
+        return line
+
+    def root_value(self):
+        """Expected outcome for the side to move at the root."""
+        best = max(self.root.children, key=lambda child: (child.visits, child.q()))
+        return best.q()
+
+    def visit_counts(self):
+        """[(move, visits)] of the root's children."""
+        return [(child.move, child.visits) for child in self.root.children]
+
+    def _select_child(self, node):
+        sqrt_visits = math.sqrt(max(node.visits + node.virtual_loss, 1))
+        prior = 1.0 / len(node.children)  # No policy head: uniform priors
+        best, best_score = None, -float("inf")
+        for child in node.children:
+            score = child.q() + self.c_puct * prior * sqrt_visits / (1 + child.visits + child.virtual_loss)
+            if score > best_score:
+                best, best_score = child, score
+        return best
+
+    def _select_leaves(self, tracker):
+        """Walk down the tree up to batch_leaves times, applying virtual loss.
+
+        Terminal leaves are backed up at once; the others are returned as
+        (leaf, path) for batched expansion.
+        """
+        leaves = []
+        pending = set()
+        for _ in range(self.batch_leaves):
+            node = self.root
+            path = [node]
+            while node.children:
+                node = self._select_child(node)
+                path.append(node)
+                tracker.push(node.move)
+            if node.terminal is None and node.children is None:
+                if id(node) in pending:
+                    # Collision: all paths now lead to leaves already queued
+                    for _ in range(len(path) - 1):
+                        tracker.pop()
+                    break
+                pending.add(id(node))
+                for path_node in path:
+                    path_node.virtual_loss += 1
+                leaves.append((node, path))
+            else:
+                # Finished game (or a node without legal moves): exact value
+                value = node.terminal if node.terminal is not None else 0.0
+                self._backup(path, value, node.white)
+                self.nodes += 1  # Counts toward the budget, or a tree of finished games never ends
+            for _ in range(len(path) - 1):
+                tracker.pop()
+        return leaves
+
+    def _expand_batch(self, leaves, tracker, root_moves=None):
+        """Create and evaluate the children of every leaf in one predict call."""
+        board = tracker.board
+        rows = []
+        keys = []
+        expansions = []
+        for leaf, path in leaves:
+            for node in path[1:]:
+                tracker.push(node.move)
+            children = []
+            moves = root_moves if root_moves is not None and leaf is self.root else list(board.legal_moves)
+            for move in moves:
+                tracker.push(move)
+                terminal = terminal_value(tracker)
+                child = Node(move, board.turn == chess.BLACK, terminal=terminal)
+                if terminal is not None:
+                    value = terminal
+                else:
+                    value = self.table.get(tracker.key) if self.table is not None else None
+                    if value is None:
+                        rows.append(self.encode(board))
+                        keys.append(tracker.key)
+                    else:
+                        value = value if child.white else -value
+                if value is not None:
+                    child.visits, child.value_sum = 1, value
+                children.append(child)
+                tracker.pop()
+            for _ in range(len(path) - 1):
+                tracker.pop()
+            self.nodes += len(children)
+            expansions.append((leaf, path, children))
+
+        values = np.zeros(0, dtype=np.float32)
+        if rows:
+            values = np.clip(np.asarray(self.predict(np.vstack(rows))).reshape(-1), -1.0, 1.0)
+            self.evaluations += len(rows)
+            if self.table is not None:
+                self.table.put(keys, values)
+
+        offset = 0
+        for leaf, path, children in expansions:
+            for child in children:
+                if child.visits == 0:
+                    value = float(values[offset])
+                    offset += 1
+                    child.visits = 1
+                    child.value_sum = value if child.white else -value
+            leaf.children = children
+            for node in path:
+                node.virtual_loss = max(node.virtual_loss - 1, 0)
+            if leaf is self.root:
+                continue
+            # One-ply lookahead: the side to move picks its best reply
+            value = -max(child.q() for child in children) if children else 0.0
+            self._backup(path, value, leaf.white)
+
+    def _backup(self, path, value, white):
+        """Add a leaf value (for the side that moved into it) along the path."""
+        for node in path[1:]:
+            node.visits += 1
+            node.value_sum += value if node.white == white else -value
+        path[0].visits += 1
@@ -1,7 +1,7 @@
 import os
-import subprocess
 import tkinter as tk
 from tkinter import messagebox
+from job_manager import JobManager
 
 # Virtual environment Python path
 VENV_PYTHON = os.path.join(os.getcwd(), "myenv", "Scripts", "python.exe")
@@ -9,26 +9,37 @@ VENV_PYTHON = os.path.join(os.getcwd(), "myenv", "Scripts", "python.exe")
 if not os.path.exists(VENV_PYTHON):
     VENV_PYTHON = "python"
 
+# Games and training run in the background; the model is fine-tuned after each game
+jobs = JobManager(VENV_PYTHON)
+
 # Function to run the chess game and train afterward
 def run_custom_game():
     messagebox.showinfo("Starting Game", "The chess game will now start.")
-    subprocess.run([VENV_PYTHON, "custom_game.py"])  # Run the game with venv
-    messagebox.showinfo("Training Model", "Game finished! Training the RL model now...")
-    subprocess.run([VENV_PYTHON, "train_custom.py"])  # Train after game with RL
+    jobs.start_game()  # Training is queued automatically when the game ends
 
 # Function to run only the training script
 def run_training():
-    messagebox.showinfo("Training Model", "Training the RL model now...")
-    subprocess.run([VENV_PYTHON, "train_custom.py"])  # Run RL training with venv
+    jobs.request_training("full")  # Full RL retrain, merged with any pending request
+
+# Function to cancel running and pending training
+def cancel_training():
+    jobs.cancel_training()
+
+# Forward background job output to the status label
+def poll_jobs():
+    for job, line in jobs.poll():
+        status_var.set(job.describe() if job.progress else line[:60])
+    root.after(200, poll_jobs)
 
 # Function to quit the application
 def quit_app():
+    jobs.shutdown()
     root.quit()
 
 # Create the main window
 root = tk.Tk()
 root.title("Chess AI Menu")
-root.geometry("400x300")
+root.geometry("400x360")
 root.configure(bg="#2C3E50")
 
 # Header label
@@ -44,9 +55,19 @@ btn_setup = tk.Button(root, text="Setup (Train Model)", font=("Arial", 14), widt
                       command=run_training)
 btn_setup.pack(pady=10)
 
+btn_cancel = tk.Button(root, text="Cancel Training", font=("Arial", 14), width=20, bg="#F39C12", fg="white",
+                       command=cancel_training)
+btn_cancel.pack(pady=10)
+
 btn_quit = tk.Button(root, text="Quit", font=("Arial", 14), width=20, bg="#E74C3C", fg="white",
                      command=quit_app)
 btn_quit.pack(pady=10)
 
+# Background job status
+status_var = tk.StringVar(value="Idle")
+status_label = tk.Label(root, textvariable=status_var, font=("Arial", 10), fg="white", bg="#2C3E50")
+status_label.pack(pady=5)
+
 # Run the GUI loop
+root.after(200, poll_jobs)
 root.mainloop()
@@ -0,0 +1,194 @@
+"""
+Versioned Model Artifact
+
+One model format shared by the trainers and the engine: a weights-only
+.npz file plus a metadata .json file describing the Dense architecture.
+Loading it needs no HDF5/Keras deserialization, and the version number lets
+a running engine notice new weights and swap them in without restarting.
+
+    chess_model_complex.npz   kernel/bias arrays of every Dense layer
+    chess_model_complex.json  {"format_version", "version", "layers", ...}
+
+The .npz is written first and the .json last, each atomically; the version
+is stored in both so a reader never pairs new metadata with old weights.
+
+The metadata also names the input encoding the weights were trained on:
+"planes" (engine.py's one-hot 12 planes) or "signed" (train_custom.py's
++1/-1 in six piece channels).
+
+Usage: python model_artifact.py export chess_model_complex.h5 [artifact]
+"""
+
+import os
+import sys
+import json
+import time
+import numpy as np
+
+ARTIFACT_PATH = "chess_model_complex"  # Without extension
+FORMAT_VERSION = 1
+ENCODINGS = ("planes", "signed")
+
+
+def _paths(artifact_path):
+    return artifact_path + ".npz", artifact_path + ".json"
+
+
+def read_metadata(artifact_path=ARTIFACT_PATH):
+    """Return the artifact's metadata, or None if there is no artifact."""
+    _, json_path = _paths(artifact_path)
+    if not os.path.exists(json_path):
+        return None
+    with open(json_path, "r") as json_file:
+        return json.load(json_file)
+
+
+def dense_layers(model):
+    """Extract [(kernel, bias, activation)] from the Dense layers of a Keras model.
+
+    Dropout and other weightless layers are skipped; they do nothing at
+    inference time.
+    """
+    layers = []
+    for layer in model.layers:
+        weights = layer.get_weights()
+        if not weights:
+            continue
+        activation = getattr(layer.activation, "__name__", "linear")
+        layers.append((weights[0], weights[1], activation))
+    return layers
+
+
+def save_layers(layers, artifact_path=ARTIFACT_PATH, source="", encoding="planes"):
+    """Write [(kernel, bias, activation)] as the next version of the artifact."""
+    if encoding not in ENCODINGS:
+        raise ValueError(f"Unknown input encoding {encoding!r}")
+    npz_path, json_path = _paths(artifact_path)
+    previous = read_metadata(artifact_path)
+    version = previous["version"] + 1 if previous else 1
+
+    arrays = {"version": np.array(version, dtype=np.int64)}
+    for i, (kernel, bias, _) in enumerate(layers):
+        arrays[f"kernel_{i}"] = np.asarray(kernel, dtype=np.float32)
+        arrays[f"bias_{i}"] = np.asarray(bias, dtype=np.float32)
+    tmp_path = artifact_path + ".tmp.npz"
+    np.savez(tmp_path, **arrays)
+    os.replace(tmp_path, npz_path)
+
+    metadata = {
+        "format_version": FORMAT_VERSION,
+        "version": version,
+        "input_size": int(np.shape(layers[0][0])[0]),
+        "layers": [{"units": int(np.shape(kernel)[1]), "activation": activation}
+                   for kernel, _, activation in layers],
+        "source": source,
+        "encoding": encoding,
+        "created": time.strftime("%Y-%m-%d %H:%M:%S"),
+    }
+    tmp_path = json_path + ".tmp"
+    with open(tmp_path, "w") as json_file:
+        json.dump(metadata, json_file, indent=2)
+    os.replace(tmp_path, json_path)
+    return version
+
+
+def save_model(model, artifact_path=ARTIFACT_PATH, source="", encoding="planes"):
+    """Export a Keras model as the next version of the artifact."""
+    version = save_layers(dense_layers(model), artifact_path, source, encoding)
+    print(f"Model artifact v{version} saved to {artifact_path}.npz/.json")
+    return version
+
+
+def load_layers(artifact_path=ARTIFACT_PATH):
+    """Return (metadata, [(kernel, bias, activation)]) or None if unavailable.
+
+    None is also returned while a writer is between the .npz and .json
+    replacements; callers simply try again later.
+    """
+    npz_path, _ = _paths(artifact_path)
+    metadata = read_metadata(artifact_path)
+    if metadata is None or not os.path.exists(npz_path):
+        return None
+    if metadata.get("format_version") != FORMAT_VERSION:
+        raise ValueError(f"Unsupported model artifact format {metadata.get('format_version')}")
+    with np.load(npz_path) as arrays:
+        if int(arrays["version"]) != metadata["version"]:
+            return None
+        layers = [(arrays[f"kernel_{i}"], arrays[f"bias_{i}"], layer["activation"])
+                  for i, layer in enumerate(metadata["layers"])]
+    return metadata, layers
+
+
+def same_architecture(model, metadata):
+    """True if a Keras model's Dense layers match the artifact's."""
+    layers = dense_layers(model)
+    return (len(layers) == len(metadata["layers"]) and
+            all(kernel.shape[1] == layer["units"] and activation == layer["activation"]
+                for (kernel, _, activation), layer in zip(layers, metadata["layers"])))
+
+
+def build_model(metadata, layers=None):
+    """Build a Keras Sequential model for the artifact's architecture."""
+    from tensorflow.keras.models import Sequential
+    from tensorflow.keras.layers import Dense
+
+    model = Sequential()
+    for i, layer in enumerate(metadata["layers"]):
+        if i == 0:
+            model.add(Dense(layer["units"], activation=layer["activation"], input_shape=(metadata["input_size"],)))
+        else:
+            model.add(Dense(layer["units"], activation=layer["activation"]))
+    if layers is not None:
+        model.set_weights([array for kernel, bias, _ in layers for array in (kernel, bias)])
+    return model
+
+
+def load_model(artifact_path=ARTIFACT_PATH):
+    """Return (metadata, Keras model) for the artifact, or None if unavailable."""
+    loaded = load_layers(artifact_path)
+    if loaded is None:
+        return None
+    metadata, layers = loaded
+    return metadata, build_model(metadata, layers)
+
+
+class ArtifactWatcher:
+    """Detects new artifact versions by polling the metadata file's mtime."""
+
+    def __init__(self, artifact_path=ARTIFACT_PATH, version=0):
+        self.artifact_path = artifact_path
+        self.version = version
+        self._mtime = None
+
+    def reset(self):
+        """Forget the current version so the next poll reloads unconditionally."""
+        self.version = 0
+        self._mtime = None
+
+    def poll(self):
+        """Return (metadata, layers) if a newer complete version exists, else None."""
+        _, json_path = _paths(self.artifact_path)
+        try:
+            mtime = os.path.getmtime(json_path)
+        except OSError:
+            return None
+        if mtime == self._mtime:
+            return None
+        loaded = load_layers(self.artifact_path)
+        if loaded is None:
+            return None  # Mid-write; try again on the next poll
+        self._mtime = mtime
+        if loaded[0]["version"] <= self.version:
+            return None
+        self.version = loaded[0]["version"]
+        return loaded
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 3 or sys.argv[1] != "export":
+        print("Usage: python model_artifact.py export path_to_model.h5 [artifact]")
+        sys.exit(1)
+
+    import tensorflow as tf
+    keras_model = tf.keras.models.load_model(sys.argv[2], compile=False)
+    save_model(keras_model, sys.argv[3] if len(sys.argv) > 3 else ARTIFACT_PATH, source=sys.argv[2])
@@ -0,0 +1,188 @@
+"""
+Opening Book Builder
+
+Aggregates move statistics by Zobrist key from the PGN games in train/ and
+the binary game store (and optionally from existing Polyglot .bin books) and writes them as a sorted
+Polyglot-format book. engine.py memory-maps the book and binary-searches it
+before falling back to the neural network.
+
+Usage: python opening_book.py [--pgn-dir train] [--import book.bin] [--out opening_book.bin]
+"""
+
+import os
+import sys
+import struct
+import argparse
+import chess
+import chess.pgn
+import chess.polyglot
+from game_store import GameStore, GAME_DB_DIR
+
+TRAIN_FOLDER = "train"
+BOOK_PATH = "opening_book.bin"
+BOOK_MAX_PLY = 20  # Only record the first moves of every game
+BOOK_MIN_GAMES = 1  # Minimum number of games a move must appear in
+
+ENTRY_STRUCT = struct.Struct(">QHHI")  # key, move, weight, learn
+MAX_WEIGHT = 0xFFFF
+MAX_LEARN = 0xFFFFFFFF
+
+
+def encode_move(board, move):
+    """Encode a move in Polyglot's 16-bit format (castling as king takes rook)."""
+    to_square = move.to_square
+    if board.is_castling(move) and not board.chess960:
+        rook_file = 7 if chess.square_file(move.to_square) > chess.square_file(move.from_square) else 0
+        to_square = chess.square(rook_file, chess.square_rank(move.from_square))
+    promotion = move.promotion - 1 if move.promotion else 0
+    return to_square | (move.from_square << 6) | (promotion << 12)
+
+
+def add_game(stats, game, max_ply=BOOK_MAX_PLY):
+    """Add the opening moves of one game to the statistics table.
+
+    stats maps Zobrist key -> {raw_move: [games, score]} where score counts
+    2 for a win and 1 for a draw from the point of view of the side to move.
+    """
+    result = game.headers.get("Result", "*")
+    if result not in ("1-0", "0-1", "1/2-1/2"):
+        return
+
+    board = game.board()
+    for ply, move in enumerate(game.mainline_moves()):
+        if ply >= max_ply:
+            break
+
+        if result == "1/2-1/2":
+            score = 1
+        elif (result == "1-0") == (board.turn == chess.WHITE):
+            score = 2
+        else:
+            score = 0
+
+        moves = stats.setdefault(chess.polyglot.zobrist_hash(board), {})
+        entry = moves.setdefault(encode_move(board, move), [0, 0])
+        entry[0] += 1
+        entry[1] += score
+        board.push(move)
+
+
+def build_from_pgn(train_folder, stats=None, max_ply=BOOK_MAX_PLY):
+    """Aggregate opening statistics from every PGN file in train_folder."""
+    stats = {} if stats is None else stats
+    for file in sorted(os.listdir(train_folder)):
+        if file.endswith(".pgn"):
+            file_path = os.path.join(train_folder, file)
+            print(f"Processing {file_path}...")
+            with open(file_path, "r") as pgn_file:
+                while True:
+                    game = chess.pgn.read_game(pgn_file)
+                    if game is None:
+                        break
+                    add_game(stats, game, max_ply)
+    return stats
+
+
+def build_from_store(store_path, stats=None, max_ply=BOOK_MAX_PLY):
+    """Aggregate opening statistics from the binary game store."""
+    stats = {} if stats is None else stats
+    store = GameStore(store_path)
+    if len(store):
+        print(f"Processing {len(store)} games from {store_path}...")
+    for game_id in range(len(store)):
+        add_game(stats, store.game(game_id), max_ply)
+    return stats
+
+
+def import_polyglot(book_path, stats=None):
+    """Merge the entries of an existing Polyglot book into the statistics table.
+
+    Polyglot weights are taken as scores; the learn field, if set, as games.
+    """
+    stats = {} if stats is None else stats
+    with open(book_path, "rb") as book_file:
+        data = book_file.read()
+    if len(data) % ENTRY_STRUCT.size:
+        raise IOError(f"invalid file size: {book_path} is not a Polyglot book")
+
+    for key, raw_move, weight, learn in ENTRY_STRUCT.iter_unpack(data):
+        entry = stats.setdefault(key, {}).setdefault(raw_move, [0, 0])
+        entry[0] += learn or 1
+        entry[1] += weight
+    print(f"Imported {len(data) // ENTRY_STRUCT.size} entries from {book_path}")
+    return stats
+
+
+def write_book(stats, book_path=BOOK_PATH, min_games=BOOK_MIN_GAMES):
+    """Write the statistics table as a sorted Polyglot book, atomically."""
+    entries = []
+    for key, moves in stats.items():
+        moves = {raw: entry for raw, entry in moves.items() if entry[0] >= min_games}
+        if not moves:
+            continue
+        # Scale weights per position so they fit Polyglot's 16-bit field
+        top = max(score for _, score in moves.values())
+        scale = MAX_WEIGHT / top if top > MAX_WEIGHT else 1
+        for raw_move, (games, score) in moves.items():
+            entries.append((key, raw_move, int(score * scale), min(games, MAX_LEARN)))
+    entries.sort()
+
+    tmp_path = book_path + ".tmp"
+    with open(tmp_path, "wb") as book_file:
+        for entry in entries:
+            book_file.write(ENTRY_STRUCT.pack(*entry))
+    os.replace(tmp_path, book_path)
+    print(f"Opening book with {len(entries)} entries saved to {book_path}")
+    return len(entries)
+
+
+class OpeningBook:
+    """Memory-mapped, binary-searched lookup into a Polyglot book."""
+
+    def __init__(self, book_path=BOOK_PATH):
+        self.path = book_path
+        self.reader = chess.polyglot.open_reader(book_path)
+
+    def probe(self, board, mode="best", rng=None):
+        """Return a book move for board, or None if the position is not in the book.
+
+        mode "best" deterministically picks the highest-weighted move;
+        mode "weighted" picks randomly in proportion to the weights.
+        """
+        try:
+            if mode == "weighted":
+                return self.reader.weighted_choice(board, random=rng).move
+            return self.reader.find(board).move
+        except IndexError:
+            return None
+
+    def close(self):
+        self.reader.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build an opening book from PGN games.")
+    parser.add_argument("--pgn-dir", default=TRAIN_FOLDER, help="folder of PGN games")
+    parser.add_argument("--store", default=GAME_DB_DIR, help="binary game store directory")
+    parser.add_argument("--import", dest="imports", action="append", default=[],
+                        help="Polyglot .bin book to merge (may be repeated)")
+    parser.add_argument("--out", default=BOOK_PATH, help="output book file")
+    parser.add_argument("--max-ply", type=int, default=BOOK_MAX_PLY)
+    parser.add_argument("--min-games", type=int, default=BOOK_MIN_GAMES)
+    args = parser.parse_args()
+
+    stats = {}
+    for book_path in args.imports:
+        import_polyglot(book_path, stats)
+    if os.path.isdir(args.pgn_dir):
+        build_from_pgn(args.pgn_dir, stats, args.max_ply)
+    build_from_store(args.store, stats, args.max_ply)
+
+    if not stats:
+        print("No opening data found!")
+        sys.exit(1)
+    write_book(stats, args.out, args.min_games)
+
+
+if __name__ == "__main__":
+    main()
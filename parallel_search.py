@@ -0,0 +1,286 @@
+"""
+Lazy-SMP Parallel Tree Search
+
+Several MCTS workers search the same position at once, each in its own
+tree (Lazy SMP: no coordination beyond shared data). They share
+
+    TranspositionTable  network values by Zobrist key, behind striped locks,
+                        so a position one worker evaluated is free for all
+    InferenceBatcher    one thread running model.predict on the leaf batches
+                        of all workers together, so more threads mean bigger
+                        batches instead of concurrent calls into the model
+
+At the end the root visit counts of all trees are summed to pick the move.
+Workers use slightly different exploration constants so their trees diverge.
+
+Usage: python parallel_search.py [--threads 1,2,4,8] [--nodes 4000] [--synthetic [--latency 20]]
+"""
+
+import time
+import queue
+import argparse
+import threading
+import numpy as np
+import chess
+from mcts import MCTS, C_PUCT, MAX_NODES
+
+TT_ENTRIES = 1 << 20  # Values kept in the transposition table
+TT_STRIPES = 64  # Independent locks; workers rarely contend for the same one
+MAX_BATCH_ROWS = 4096  # Upper bound on rows per coalesced predict call
+BATCH_WAIT = 0.002  # Seconds the batcher waits for more workers to submit
+HELPER_C_PUCT = (1.0, 0.75, 1.25, 0.9, 1.1)  # Exploration scale per worker, cycled
+
+BENCH_POSITIONS = [
+    chess.STARTING_FEN,
+    "r1bqkbnr/pppp1ppp/2n5/4p3/2B1P3/5N2/PPPP1PPP/RNBQK2R b KQkq - 3 3",
+    "r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1",
+    "8/2p5/3p4/KP5r/1R3p1k/8/4P1P1/8 w - - 0 1",
+]
+
+
+class TranspositionTable:
+    """Bounded map of Zobrist key -> network value, split into locked stripes."""
+
+    def __init__(self, entries=TT_ENTRIES, stripes=TT_STRIPES):
+        self.stripes = [{} for _ in range(stripes)]
+        self.locks = [threading.Lock() for _ in range(stripes)]
+        self.stripe_entries = max(1, entries // stripes)
+        self.hits = 0
+        self.probes = 0
+
+    def get(self, key):
+        stripe = key % len(self.stripes)
+        with self.locks[stripe]:
+            value = self.stripes[stripe].get(key)
+        # Statistics only; lost updates between threads do not matter
+        self.probes += 1
+        if value is not None:
+            self.hits += 1
+        return value
+
+    def put(self, keys, values):
+        for key, value in zip(keys, values):
+            stripe = key % len(self.stripes)
+            with self.locks[stripe]:
+                entries = self.stripes[stripe]
+                if len(entries) >= self.stripe_entries:
+                    del entries[next(iter(entries))]  # Evict the oldest entry
+                entries[key] = float(value)
+
+    def clear(self):
+        for stripe, lock in zip(self.stripes, self.locks):
+            with lock:
+                stripe.clear()
+        self.hits = 0
+        self.probes = 0
+
+
+class InferenceBatcher:
+    """Coalesces predict calls from many threads into single batches.
+
+    predict(batch) blocks the calling worker until its rows have been
+    evaluated. A batch is run as soon as every registered worker is
+    waiting, or after BATCH_WAIT seconds, whichever comes first.
+    """
+
+    def __init__(self, predict, workers=1):
+        self._predict = predict
+        self.workers = workers
+        self.requests = queue.Queue()
+        self.calls = 0
+        self.rows = 0
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def predict(self, batch):
+        done = threading.Event()
+        request = [batch, done, None]
+        self.requests.put(request)
+        done.wait()
+        if isinstance(request[2], Exception):
+            raise request[2]
+        return request[2]
+
+    def stop(self):
+        self.requests.put(None)
+
+    def _run(self):
+        while True:
+            request = self.requests.get()
+            if request is None:
+                return
+            pending = [request]
+            rows = len(request[0])
+            deadline = time.time() + BATCH_WAIT
+            while len(pending) < self.workers and rows < MAX_BATCH_ROWS:
+                try:
+                    request = self.requests.get(timeout=max(0.0, deadline - time.time()))
+                except queue.Empty:
+                    break
+                if request is None:
+                    self.requests.put(None)  # Finish this batch, then exit
+                    break
+                pending.append(request)
+                rows += len(request[0])
+
+            try:
+                values = np.asarray(self._predict(np.vstack([r[0] for r in pending]))).reshape(-1)
+                offset = 0
+                for r in pending:
+                    r[2] = values[offset:offset + len(r[0])]
+                    offset += len(r[0])
+            except Exception as e:
+                for r in pending:
+                    r[2] = e
+            self.calls += 1
+            self.rows += rows
+            for r in pending:
+                r[1].set()
+
+
+class ParallelSearch:
+    """MCTS on `threads` workers sharing a transposition table and an inference batcher.
+
+    Same interface as MCTS (search, best_line, root_value, visit_counts,
+    reset, nodes, elapsed); with one thread it is a plain MCTS plus the table.
+    """
+
+    def __init__(self, encode, predict, threads=1, table_entries=TT_ENTRIES):
+        self.threads = max(1, int(threads))
+        self.table = TranspositionTable(table_entries)
+        self.batcher = None
+        worker_predict = predict
+        if self.threads > 1:
+            self.batcher = InferenceBatcher(predict, self.threads)
+            worker_predict = self.batcher.predict
+        # Helpers explore a little more or less than the main worker
+        self.trees = [MCTS(encode, worker_predict, C_PUCT * HELPER_C_PUCT[i % len(HELPER_C_PUCT)],
+                           table=self.table)
+                      for i in range(self.threads)]
+        self.nodes = 0
+        self.evaluations = 0
+        self.elapsed = 0.0
+        self._counts = []
+
+    def reset(self):
+        """Drop all trees and cached values (e.g. after the weights changed)."""
+        for tree in self.trees:
+            tree.reset()
+        self.table.clear()
+
+    def close(self):
+        if self.batcher is not None:
+            self.batcher.stop()
+
+    def search(self, board, max_nodes=MAX_NODES, max_time=None, root_moves=None, stop=None):
+        """Search board on all workers and return the move with the most total visits.
+
+        max_nodes is the total budget, shared equally between the workers.
+        """
+        start = time.time()
+        if self.threads == 1:
+            move = self.trees[0].search(board, max_nodes, max_time, root_moves, stop)
+        else:
+            share = max_nodes / self.threads
+            errors = []
+
+            def work(tree, worker_board):
+                try:
+                    tree.search(worker_board, share, max_time, root_moves, stop)
+                except Exception as e:
+                    errors.append(e)
+
+            workers = [threading.Thread(target=work, args=(tree, board.copy()))
+                       for tree in self.trees]
+            for worker in workers:
+                worker.start()
+            for worker in workers:
+                worker.join()
+            if errors:
+                raise errors[0]
+            move = None
+
+        self.elapsed = time.time() - start
+        self.nodes = sum(tree.nodes for tree in self.trees)
+        self.evaluations = sum(tree.evaluations for tree in self.trees)
+
+        totals = {}
+        for tree in self.trees:
+            if tree.root is not None and tree.root.children:
+                for child in tree.root.children:
+                    totals[child.move] = totals.get(child.move, 0) + child.visits
+        self._counts = list(totals.items())
+        if move is None and totals:
+            # Checkmates at the root are returned unsearched, so they have no visits to compare
+            mates = [child.move for child in self.trees[0].root.children if child.terminal == 1.0]
+            move = mates[0] if mates else max(totals, key=totals.get)
+        return move
+
+    def best_line(self, max_length=8):
+        return self.trees[0].best_line(max_length)
+
+    def root_value(self):
+        return self.trees[0].root_value()
+
+    def visit_counts(self):
+        """[(move, visits)] summed over all workers' trees."""
+        return self._counts
+
+
+def material_predict(batch, latency=0.02):
+    """Synthetic evaluator for benchmarks without a trained model.
+
+    Material balance of the encoded planes plus a per-call latency like
+    model.predict's; the sleep releases the GIL just as TF inference does.
+    """
+    time.sleep(latency + 0.00001 * len(batch))
+    planes = batch.reshape(len(batch), 64, 12)
+    weights = np.array([1, 3, 3, 5, 9, 0, 0, 0, 0, 0, 0, 0], dtype=np.float32)
+    return np.tanh((planes * weights).sum(axis=(1, 2)) / 10.0)
+
+
+def benchmark(thread_counts=(1, 2, 4, 8), nodes=4000, synthetic=False, latency=0.02):
+    """Print nodes/sec and batch sizes for each thread count over BENCH_POSITIONS."""
+    if synthetic:
+        from dataset_builder import board_codes, codes_to_input
+        encode = lambda board: codes_to_input(board_codes(board)[np.newaxis])
+        predict = lambda batch: material_predict(batch, latency)
+    else:
+        import engine  # Loads the model
+        encode, predict = engine.board_to_input, engine.predict_values
+
+    baseline = None
+    print(f"{'threads':>7} {'nodes':>8} {'evals':>8} {'tt hit':>7} {'batch':>7} {'nps':>9} {'speedup':>8}")
+    for threads in thread_counts:
+        total_nodes = total_evals = total_time = 0
+        search = ParallelSearch(encode, predict, threads)
+        for fen in BENCH_POSITIONS:
+            search.reset()
+            search.search(chess.Board(fen), nodes)
+            total_nodes += search.nodes
+            total_evals += search.evaluations
+            total_time += search.elapsed
+        batcher = search.batcher
+        mean_batch = batcher.rows / max(batcher.calls, 1) if batcher else float("nan")
+        hit_rate = search.table.hits / max(search.table.probes, 1)
+        search.close()
+        nps = total_nodes / max(total_time, 1e-9)
+        baseline = baseline or nps
+        print(f"{threads:>7} {total_nodes:>8} {total_evals:>8} {hit_rate:>7.1%} {mean_batch:>7.1f} "
+              f"{nps:>9.0f} {nps / baseline:>7.2f}x")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark Lazy-SMP tree search scaling.")
+    parser.add_argument("--threads", default="1,2,4,8", help="comma-separated thread counts")
+    parser.add_argument("--nodes", type=int, default=4000, help="node budget per position")
+    parser.add_argument("--synthetic", action="store_true",
+                        help="use a material evaluator with model-like latency instead of the network")
+    parser.add_argument("--latency", type=float, default=20.0,
+                        help="milliseconds per predict call of the synthetic evaluator")
+    args = parser.parse_args()
+    benchmark([int(t) for t in args.threads.split(",")], args.nodes, args.synthetic, args.latency / 1000.0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,148 @@
+"""
+Perft and Move-Generation Throughput Harness
+
+perft(board, depth) counts the leaf nodes of the legal move tree; divide()
+splits the count by root move. Comparing against the published counts of
+the standard positions below verifies move generation (castling, en
+passant, promotions, checks and pins), and timing it gives a baseline for
+how much of a search step goes into python-chess move generation.
+
+The harness reports, for every suite position:
+
+    perft     leaf nodes/sec of a full perft with bulk counting at the last ply
+    movegen   positions/sec of generating the legal move list alone
+    push/pop  moves/sec of board.push() followed by board.pop()
+
+The engine answers "go perft N" (and "go perft N divide") with the same code.
+
+Usage: python perft.py [--depth 3] [--fen FEN --divide]
+"""
+
+import time
+import argparse
+import chess
+
+# Standard perft positions with their published leaf counts for depth 1, 2, ...
+PERFT_SUITE = [
+    ("startpos", chess.STARTING_FEN,
+     [20, 400, 8902, 197281, 4865609]),
+    ("kiwipete", "r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1",
+     [48, 2039, 97862, 4085603]),
+    ("position3", "8/2p5/3p4/KP5r/1R3p1k/8/4P1P1/8 w - - 0 1",
+     [14, 191, 2812, 43238, 674624]),
+    ("position4", "r3k2r/Pppp1ppp/1b3nbN/nP6/BBP1P3/q4N2/Pp1P2PP/R2Q1RK1 w kq - 0 1",
+     [6, 264, 9467, 422333]),
+    ("position5", "rnbq1k1r/pp1Pbppp/2p5/8/2B5/8/PPP1NnPP/RNBQK2R w KQ - 1 8",
+     [44, 1486, 62379, 2103487]),
+    ("position6", "r4rk1/1pp1qppp/p1np1n2/2b1p1B1/2B1P1b1/P1NP1N2/1PP1QPPP/R4RK1 w - - 0 10",
+     [46, 2079, 89890, 3894594]),
+]
+
+
+def perft(board, depth):
+    """Number of leaf nodes of the legal move tree of the given depth."""
+    if depth <= 0:
+        return 1
+    if depth == 1:
+        return board.legal_moves.count()  # Bulk counting: no need to play the last ply
+    nodes = 0
+    for move in board.generate_legal_moves():
+        board.push(move)
+        nodes += perft(board, depth - 1)
+        board.pop()
+    return nodes
+
+
+def divide(board, depth):
+    """Return {move: leaf count} for every root move (perft split by first move)."""
+    counts = {}
+    for move in list(board.legal_moves):
+        board.push(move)
+        counts[move] = perft(board, depth - 1)
+        board.pop()
+    return counts
+
+
+def interior_positions(board, depth):
+    """FENs of every position of the move tree above the given depth."""
+    positions = [board.fen()]
+    if depth > 0:
+        for move in list(board.legal_moves):
+            board.push(move)
+            positions.extend(interior_positions(board, depth - 1))
+            board.pop()
+    return positions
+
+
+def movegen_throughput(fens, min_time=0.5):
+    """Return (positions/sec of legal move generation, moves/sec of push+pop)."""
+    boards = [chess.Board(fen) for fen in fens]
+    move_lists = [list(board.legal_moves) for board in boards]
+
+    positions = 0
+    start = time.time()
+    while time.time() - start < min_time:
+        for board in boards:
+            for _ in board.generate_legal_moves():
+                pass
+        positions += len(boards)
+    movegen_rate = positions / (time.time() - start)
+
+    moves = 0
+    start = time.time()
+    while time.time() - start < min_time:
+        for board, move_list in zip(boards, move_lists):
+            for move in move_list:
+                board.push(move)
+                board.pop()
+            moves += len(move_list)
+    push_pop_rate = moves / (time.time() - start)
+    return movegen_rate, push_pop_rate
+
+
+def run_suite(max_depth=3):
+    """Verify and time perft on PERFT_SUITE; returns True if every count matches."""
+    all_ok = True
+    print(f"{'position':10s} {'depth':>5} {'nodes':>10} {'expected':>10} {'ok':>3} "
+          f"{'perft n/s':>10} {'movegen p/s':>12} {'push/pop m/s':>13}")
+    for name, fen, expected in PERFT_SUITE:
+        board = chess.Board(fen)
+        depth = min(max_depth, len(expected))
+        start = time.time()
+        nodes = perft(board, depth)
+        elapsed = max(time.time() - start, 1e-9)
+        ok = nodes == expected[depth - 1]
+        all_ok &= ok
+        movegen_rate, push_pop_rate = movegen_throughput(interior_positions(board, min(depth - 1, 2)))
+        print(f"{name:10s} {depth:>5} {nodes:>10} {expected[depth - 1]:>10} {'yes' if ok else 'NO':>3} "
+              f"{nodes / elapsed:>10.0f} {movegen_rate:>12.0f} {push_pop_rate:>13.0f}")
+    print("All perft counts match." if all_ok else "PERFT MISMATCH: move generation is wrong.")
+    return all_ok
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Perft verification and move-generation benchmark.")
+    parser.add_argument("--depth", type=int, default=3, help="maximum perft depth per suite position")
+    parser.add_argument("--fen", help="run perft on this position instead of the suite")
+    parser.add_argument("--divide", action="store_true", help="with --fen, print counts per root move")
+    args = parser.parse_args()
+
+    if args.fen:
+        board = chess.Board(args.fen)
+        start = time.time()
+        if args.divide:
+            counts = divide(board, args.depth)
+            for move, count in counts.items():
+                print(f"{move.uci()}: {count}")
+            nodes = sum(counts.values())
+        else:
+            nodes = perft(board, args.depth)
+        elapsed = max(time.time() - start, 1e-9)
+        print(f"Nodes searched: {nodes} ({nodes / elapsed:.0f} nodes/sec)")
+    else:
+        if not run_suite(args.depth):
+            raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
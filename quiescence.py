@@ -0,0 +1,135 @@
+"""
+Quiescence Search with Static Exchange Evaluation
+
+The value network is trained on game positions and is unreliable in the
+middle of a capture sequence: a position where a queen has just been taken
+but not yet recaptured looks like a queen up. Before a position is sent to
+the network, quiet_line() plays out the captures and promotions with a
+material-only alpha-beta search and returns the line to the quiet position
+at its end, which is what the network then evaluates.
+
+Captures are ordered by static exchange evaluation (SEE) and captures that
+lose material are not searched. Delta pruning skips captures that cannot
+raise the score to alpha even when the captured piece is won for free.
+"""
+
+import chess
+
+PIECE_VALUES = {
+    chess.PAWN: 100,
+    chess.KNIGHT: 320,
+    chess.BISHOP: 330,
+    chess.ROOK: 500,
+    chess.QUEEN: 900,
+    chess.KING: 20000,
+}
+DELTA_MARGIN = 200  # Positional slack allowed on top of the captured material
+MAX_QUIESCENCE_PLY = 8  # Capture sequences are cut off after this many plies
+
+_PROMOTION_RANKS = chess.BB_RANK_1 | chess.BB_RANK_8
+
+
+def material(board):
+    """Material balance in centipawns from the side to move's point of view."""
+    score = 0
+    for piece_type, value in PIECE_VALUES.items():
+        if piece_type == chess.KING:
+            continue
+        score += value * (chess.popcount(board.pieces_mask(piece_type, chess.WHITE)) -
+                          chess.popcount(board.pieces_mask(piece_type, chess.BLACK)))
+    return score if board.turn == chess.WHITE else -score
+
+
+def capture_gain(board, move):
+    """Material won immediately by move (captured piece plus promotion)."""
+    gain = 0
+    if board.is_en_passant(move):
+        gain = PIECE_VALUES[chess.PAWN]
+    else:
+        captured = board.piece_type_at(move.to_square)
+        if captured:
+            gain = PIECE_VALUES[captured]
+    if move.promotion:
+        gain += PIECE_VALUES[move.promotion] - PIECE_VALUES[chess.PAWN]
+    return gain
+
+
+def see(board, move):
+    """Static exchange evaluation: material result of the capture sequence on move's square.
+
+    Both sides recapture with their least valuable attacker and may stop
+    whenever continuing would lose material. X-ray attackers behind moved
+    pieces join in; pins are ignored.
+    """
+    target = move.to_square
+    occupied = board.occupied & ~chess.BB_SQUARES[move.from_square]
+    if board.is_en_passant(move):
+        occupied &= ~chess.BB_SQUARES[board.ep_square + (-8 if board.turn == chess.WHITE else 8)]
+
+    gains = [capture_gain(board, move)]
+    on_square = PIECE_VALUES[move.promotion or board.piece_type_at(move.from_square)]
+    side = not board.turn
+    while True:
+        attackers = board.attackers_mask(side, target, occupied) & occupied
+        if not attackers:
+            break
+        for piece_type in PIECE_VALUES:
+            candidates = attackers & board.pieces_mask(piece_type, side)
+            if candidates:
+                break
+        if piece_type == chess.KING and board.attackers_mask(not side, target, occupied) & occupied:
+            break  # The king cannot capture into a defended square
+        gains.append(on_square - gains[-1])
+        on_square = PIECE_VALUES[piece_type]
+        occupied &= ~chess.BB_SQUARES[chess.lsb(candidates)]
+        side = not side
+
+    # Each side picks the better of stopping and continuing, from the end backwards
+    for i in range(len(gains) - 1, 0, -1):
+        gains[i - 1] = -max(-gains[i - 1], gains[i])
+    return gains[0]
+
+
+def noisy_moves(board):
+    """Captures and promotions that do not lose material, best SEE first."""
+    moves = list(board.generate_legal_captures())
+    moves.extend(board.generate_legal_moves(board.pawns, _PROMOTION_RANKS & ~board.occupied))
+    scored = [(see(board, move), move) for move in moves]
+    scored = [(value, move) for value, move in scored if value >= 0]
+    scored.sort(key=lambda item: item[0], reverse=True)
+    return scored
+
+
+class Quiescence:
+    """Material-only quiescence search; nodes counts positions visited."""
+
+    def __init__(self, max_ply=MAX_QUIESCENCE_PLY, delta_margin=DELTA_MARGIN):
+        self.max_ply = max_ply
+        self.delta_margin = delta_margin
+        self.nodes = 0
+
+    def quiet_line(self, board):
+        """Return (material score for the side to move, moves to the quiet position)."""
+        return self._search(board, material(board), -float("inf"), float("inf"), 0)
+
+    def _search(self, board, stand_pat, alpha, beta, ply):
+        self.nodes += 1
+        # In check every evasion matters, not only captures; leave it to the network
+        if stand_pat >= beta or ply >= self.max_ply or board.is_check():
+            return stand_pat, []
+        best, best_line = stand_pat, []
+        alpha = max(alpha, stand_pat)
+        for _, move in noisy_moves(board):
+            gain = capture_gain(board, move)
+            if stand_pat + gain + self.delta_margin <= alpha:
+                continue  # Delta pruning: even winning the piece cannot reach alpha
+            board.push(move)
+            score, line = self._search(board, -(stand_pat + gain), -beta, -alpha, ply + 1)
+            board.pop()
+            score = -score
+            if score > best:
+                best, best_line = score, [move] + line
+                if score >= beta:
+                    break
+                alpha = max(alpha, score)
+        return best, best_line
@@ -0,0 +1,167 @@
+"""
+Experience Replay
+
+Experiences live in NumPy arrays rather than tuples. Every position is
+stored once, and an experience refers to its successor by slot instead of
+keeping a copy of the next state. A finished game is appended in one
+call: game_targets() computes its discounted rewards, next-state offsets
+and done flags with NumPy, and append_game() writes all of them at once.
+
+For prioritized replay, a sum-tree over TD-error priorities gives O(log n)
+proportional sampling and priority updates. Both are vectorized over a
+whole batch with NumPy: the tree is walked one level at a time for all
+samples together. Sampling returns importance-sampling weights to pass to
+model.fit as sample_weight.
+"""
+
+import numpy as np
+
+STATE_SIZE = 8 * 8 * 12
+
+
+def game_targets(num_positions, final_reward, gamma):
+    """Return (rewards, next-state offsets, dones) for the positions of one game.
+
+    Position i gets final_reward discounted by its distance to the end; its
+    next state is position i + 1, and the last position is terminal with
+    itself as next state.
+    """
+    steps_to_end = np.arange(num_positions - 1, -1, -1)
+    rewards = (final_reward * np.power(gamma, steps_to_end)).astype(np.float32)
+    next_offsets = np.minimum(np.arange(1, num_positions + 1), num_positions - 1)
+    return rewards, next_offsets, steps_to_end == 0
+
+
+class SumTree:
+    """Binary tree whose leaves hold priorities and whose nodes hold subtree sums.
+
+    Stored as a flat array: node i has children 2i and 2i+1, and the leaves
+    occupy [capacity, 2 * capacity). Capacity is rounded up to a power of two.
+    """
+
+    def __init__(self, capacity):
+        self.capacity = 1 << max(0, int(capacity - 1).bit_length())
+        self.tree = np.zeros(2 * self.capacity, dtype=np.float64)
+
+    @property
+    def total(self):
+        return self.tree[1]
+
+    def update(self, leaves, priorities):
+        """Set the priorities of leaf positions and refresh their ancestors."""
+        nodes = np.asarray(leaves, dtype=np.int64) + self.capacity
+        self.tree[nodes] = priorities
+        # All leaves share a depth, so each level is refreshed in one step
+        while nodes[0] > 1:
+            nodes = np.unique(nodes // 2)
+            self.tree[nodes] = self.tree[2 * nodes] + self.tree[2 * nodes + 1]
+
+    def find(self, values):
+        """Return the leaf positions whose cumulative priority range contains values."""
+        values = np.array(values, dtype=np.float64)
+        nodes = np.ones(len(values), dtype=np.int64)
+        while nodes[0] < self.capacity:
+            left = 2 * nodes
+            left_sum = self.tree[left]
+            go_right = values > left_sum
+            values -= left_sum * go_right
+            nodes = left + go_right
+        return nodes - self.capacity
+
+
+class ReplayBuffer:
+    """Ring of maxlen experiences, sampled uniformly.
+
+    Slots are filled in append order, so while the ring is not full the
+    experiences occupy slots [0, size). A successor is written right after
+    its position and therefore overwritten only after it.
+    """
+
+    def __init__(self, maxlen, state_size=STATE_SIZE):
+        self.maxlen = maxlen
+        self.states = np.zeros((maxlen, state_size), dtype=np.float32)
+        self.moves = np.zeros(maxlen, dtype=np.uint16)  # game_store.encode_move codes
+        self.rewards = np.zeros(maxlen, dtype=np.float32)
+        self.next_slots = np.zeros(maxlen, dtype=np.int64)
+        self.dones = np.zeros(maxlen, dtype=bool)
+        self.next_index = 0
+        self.size = 0
+        self.total = 0  # Experiences appended since the buffer was created
+
+    def __len__(self):
+        return self.size
+
+    def append_game(self, states, moves, final_reward, gamma):
+        """Append every position of a finished game; returns the slots written.
+
+        states is the game's (positions, state_size) array and moves the
+        encoded move played from each position. Only the last maxlen
+        positions of a longer game are kept.
+        """
+        count = len(states)
+        if count == 0:
+            return np.zeros(0, dtype=np.int64)
+        rewards, next_offsets, dones = game_targets(count, final_reward, gamma)
+        first = max(0, count - self.maxlen)
+        slots = (self.next_index + np.arange(count - first)) % self.maxlen
+        self.states[slots] = states[first:]
+        self.moves[slots] = moves[first:]
+        self.rewards[slots] = rewards[first:]
+        self.next_slots[slots] = slots[next_offsets[first:] - first]
+        self.dones[slots] = dones[first:]
+        self.next_index = (self.next_index + len(slots)) % self.maxlen
+        self.size = min(self.size + len(slots), self.maxlen)
+        self.total += len(slots)
+        return slots
+
+    def sample(self, batch_size):
+        """Return (slots, None): a uniform sample without importance weights."""
+        return np.random.choice(self.size, batch_size, replace=False), None
+
+    def batch(self, slots):
+        """Return (states, rewards, next_states, dones) of the experiences in slots."""
+        return (self.states[slots], self.rewards[slots],
+                self.states[self.next_slots[slots]], self.dones[slots])
+
+
+class PrioritizedReplayBuffer(ReplayBuffer):
+    """Replay buffer sampling experiences in proportion to priority ** alpha.
+
+    New experiences get the current maximum priority, so every one of them
+    is seen at least once.
+    """
+
+    def __init__(self, maxlen, alpha=0.6, beta=0.4, beta_increment=0.001, epsilon=1e-3,
+                 state_size=STATE_SIZE):
+        super().__init__(maxlen, state_size)
+        self.alpha = alpha
+        self.beta = beta  # Importance-sampling exponent, annealed towards 1
+        self.beta_increment = beta_increment
+        self.epsilon = epsilon  # Keeps zero-error experiences sampleable
+        self.tree = SumTree(maxlen)
+        self.max_priority = 1.0
+
+    def append_game(self, states, moves, final_reward, gamma):
+        slots = super().append_game(states, moves, final_reward, gamma)
+        if len(slots):
+            self.tree.update(slots, np.full(len(slots), self.max_priority ** self.alpha))
+        return slots
+
+    def sample(self, batch_size):
+        """Return (slots, importance-sampling weights)."""
+        # Stratified sampling: one value from each of batch_size equal segments
+        segment = self.tree.total / batch_size
+        values = (np.arange(batch_size) + np.random.random(batch_size)) * segment
+        indices = np.minimum(self.tree.find(values), self.size - 1)
+
+        probabilities = self.tree.tree[indices + self.tree.capacity] / self.tree.total
+        weights = (self.size * probabilities) ** -self.beta
+        weights = (weights / weights.max()).astype(np.float32)
+        self.beta = min(1.0, self.beta + self.beta_increment)
+        return indices, weights
+
+    def update_priorities(self, indices, td_errors):
+        """Set new priorities from the absolute TD errors of a sampled batch."""
+        priorities = np.abs(np.asarray(td_errors, dtype=np.float64)) + self.epsilon
+        self.max_priority = max(self.max_priority, float(priorities.max()))
+        self.tree.update(indices, priorities ** self.alpha)
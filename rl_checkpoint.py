@@ -0,0 +1,243 @@
+"""
+Resumable Self-Play Checkpoints
+
+Saves everything self-play training needs to continue exactly where it
+stopped: model and target weights, optimizer state, epsilon, the game
+counter, the Python and NumPy RNG states and the replay buffer.
+
+    rl_checkpoint/weights_<g>.npz      model_*, target_*, optimizer_* arrays
+    rl_checkpoint/replay_<g>_*.npy     memory-mapped replay buffer ring
+    rl_checkpoint/state.json           counters, epsilon, RNG states and the
+                                       valid generation g (written last)
+
+The replay buffer is a ring of maxlen slots on disk, laid out like the
+in-memory buffer (next states are slot numbers). Checkpoints alternate
+between two generations (g = 0, 1) of the weights and the ring: a save
+writes the generation state.json does not point to, syncs it to disk and
+only then replaces state.json, so a crash at any point leaves the previous
+checkpoint intact. Each save only writes the experiences appended since
+that generation was last written, so its cost does not grow with the
+buffer; the rest of the work (writing weights, syncing, replacing files)
+runs on a background thread while self-play continues.
+"""
+
+import os
+import json
+import time
+import random
+import threading
+import numpy as np
+from replay_buffer import STATE_SIZE
+
+CHECKPOINT_DIR = "rl_checkpoint"
+
+
+def _replace_durably(file, tmp_path, path):
+    """Sync an open temporary file to disk, then rename it over path."""
+    file.flush()
+    os.fsync(file.fileno())
+    file.close()
+    os.replace(tmp_path, path)
+    try:
+        directory = os.open(os.path.dirname(path) or ".", os.O_RDONLY)
+    except OSError:
+        return  # Directories cannot be opened (Windows); the rename is still atomic
+    try:
+        os.fsync(directory)
+    finally:
+        os.close(directory)
+
+
+def optimizer_variables(optimizer):
+    """The optimizer's state variables (tf.keras 2.x method or Keras 3 property)."""
+    variables = optimizer.variables
+    return list(variables() if callable(variables) else variables)
+
+
+def restore_optimizer(model, weights):
+    """Load saved optimizer state into the model's optimizer; False if it does not fit."""
+    optimizer = model.optimizer
+    if hasattr(optimizer, "build"):
+        optimizer.build(model.trainable_variables)
+    variables = optimizer_variables(optimizer)
+    if len(variables) != len(weights) or any(tuple(v.shape) != w.shape for v, w in zip(variables, weights)):
+        return False
+    for variable, value in zip(variables, weights):
+        variable.assign(value)
+    return True
+
+
+class Checkpointer:
+    """Writes and restores self-play checkpoints in a directory."""
+
+    def __init__(self, directory=CHECKPOINT_DIR):
+        self.directory = directory
+        self.state_path = os.path.join(directory, "state.json")
+        self.generation = None  # Generation state.json points to
+        self.saved_totals = [None, None]  # memory.total each generation was written at (None: unknown)
+        self.writer = None
+        self.arrays = {}  # Open replay rings by generation
+
+    def exists(self):
+        return os.path.exists(self.state_path)
+
+    def _weights_path(self, generation):
+        return os.path.join(self.directory, f"weights_{generation}.npz")
+
+    def _replay_arrays(self, generation, maxlen, mode):
+        """Open (or create) the memory-mapped replay ring files of a generation."""
+        specs = {
+            "states": (np.float32, (maxlen, STATE_SIZE)),
+            "next_slots": (np.int64, (maxlen,)),
+            "moves": (np.uint16, (maxlen,)),
+            "rewards": (np.float32, (maxlen,)),
+            "dones": (np.bool_, (maxlen,)),
+        }
+        arrays = {}
+        for name, (dtype, shape) in specs.items():
+            path = os.path.join(self.directory, f"replay_{generation}_{name}.npy")
+            if mode == "w+" and os.path.exists(path):
+                array = np.load(path, mmap_mode="r+")
+                if array.shape != shape or array.dtype != dtype:
+                    array = np.lib.format.open_memmap(path, mode="w+", dtype=dtype, shape=shape)
+            elif mode == "w+":
+                array = np.lib.format.open_memmap(path, mode="w+", dtype=dtype, shape=shape)
+            else:
+                array = np.load(path, mmap_mode=mode)
+            arrays[name] = array
+        return arrays
+
+    def wait(self):
+        """Block until the previous checkpoint has been written completely."""
+        if self.writer is not None:
+            self.writer.join()
+            self.writer = None
+
+    def save(self, agent, progress):
+        """Checkpoint agent; progress is a dict of training-loop counters.
+
+        Returns after the cheap in-memory copies; files are written by a
+        background thread (a new save first waits for the previous one).
+        """
+        self.wait()
+        os.makedirs(self.directory, exist_ok=True)
+        memory = agent.memory
+        maxlen = memory.maxlen
+        generation = 1 if self.generation == 0 else 0  # Never the one state.json points to
+        arrays = self.arrays.get(generation)
+        if arrays is None or len(arrays["moves"]) != maxlen:
+            if arrays is not None:
+                self.saved_totals[generation] = None  # Buffer resized: the ring is rewritten
+            arrays = self.arrays[generation] = self._replay_arrays(generation, maxlen, "w+")
+
+        # Experiences appended since this generation was written, in the same slots as in memory
+        total = memory.total
+        saved = self.saved_totals[generation]
+        new = len(memory) if saved is None else min(total - saved, len(memory))
+        slots = np.arange(total - new, total) % maxlen
+        if new:
+            for name in arrays:
+                arrays[name][slots] = getattr(memory, name)[slots]
+
+        weights = {}
+        for i, array in enumerate(agent.model.get_weights()):
+            weights[f"model_{i}"] = array
+        for i, array in enumerate(agent.target_model.get_weights()):
+            weights[f"target_{i}"] = array
+        for i, variable in enumerate(optimizer_variables(agent.model.optimizer)):
+            weights[f"optimizer_{i}"] = np.array(variable)
+        if agent.prioritized:
+            weights["priorities"] = memory.tree.tree[memory.tree.capacity:memory.tree.capacity + maxlen].copy()
+
+        python_state = random.getstate()
+        numpy_state = np.random.get_state()
+        state = dict(progress)
+        state.update({
+            "created": time.strftime("%Y-%m-%d %H:%M:%S"),
+            "generation": generation,
+            "epsilon": agent.epsilon,
+            "prioritized": agent.prioritized,
+            "maxlen": maxlen,
+            "experiences_seen": total,
+            "replay_size": len(memory),
+            "python_random": [python_state[0], list(python_state[1]), python_state[2]],
+            "numpy_random": [numpy_state[0], numpy_state[1].tolist(), int(numpy_state[2]),
+                             int(numpy_state[3]), float(numpy_state[4])],
+        })
+        if agent.prioritized:
+            state.update({"beta": memory.beta, "max_priority": memory.max_priority})
+        self.saved_totals[generation] = total
+
+        self.writer = threading.Thread(target=self._write, args=(generation, weights, state))
+        self.writer.start()
+
+    def _write(self, generation, weights, state):
+        for array in self.arrays[generation].values():
+            array.flush()  # msync: the ring is on disk before state.json names it
+        tmp_path = os.path.join(self.directory, "weights.tmp.npz")
+        weights_file = open(tmp_path, "wb")
+        np.savez(weights_file, **weights)
+        _replace_durably(weights_file, tmp_path, self._weights_path(generation))
+        # state.json last: a checkpoint counts only once it is complete
+        tmp_path = self.state_path + ".tmp"
+        state_file = open(tmp_path, "w")
+        json.dump(state, state_file)
+        _replace_durably(state_file, tmp_path, self.state_path)
+        self.generation = generation
+
+    def restore(self, agent):
+        """Load the checkpoint into agent and the RNGs; returns its progress dict or None."""
+        if not self.exists():
+            return None
+        with open(self.state_path, "r") as state_file:
+            state = json.load(state_file)
+        generation = state.get("generation")
+        weights_path = self._weights_path(generation) if generation is not None else \
+            os.path.join(self.directory, "weights.npz")
+
+        with np.load(weights_path) as arrays:
+            def group(prefix):
+                count = sum(1 for name in arrays.files if name.startswith(prefix))
+                return [arrays[f"{prefix}{i}"] for i in range(count)]
+            agent.model.set_weights(group("model_"))
+            agent.target_model.set_weights(group("target_"))
+            if not restore_optimizer(agent.model, group("optimizer_")):
+                print("Optimizer state does not match this TensorFlow version; starting it fresh.")
+            priorities = arrays["priorities"] if "priorities" in arrays.files else None
+
+        # Rebuild the replay buffer slot for slot
+        maxlen, total, size = state["maxlen"], state["experiences_seen"], state["replay_size"]
+        if agent.memory.maxlen != maxlen:
+            agent.memory = type(agent.memory)(maxlen)
+        memory = agent.memory
+        if generation is not None:
+            replay = self._replay_arrays(generation, maxlen, "r")
+            for name, array in replay.items():
+                getattr(memory, name)[:] = array
+            memory.next_index = total % maxlen
+            memory.size = size
+            memory.total = total
+        else:
+            print("Checkpoint replay buffer has an older layout; starting with an empty buffer.")
+            total = size = 0
+            priorities = None
+        if agent.prioritized:
+            if priorities is None:
+                # Checkpoint of a uniform buffer: every experience starts at the maximum priority
+                priorities = np.zeros(maxlen)
+                priorities[np.arange(total - size, total) % maxlen] = memory.max_priority ** memory.alpha
+            memory.tree.update(np.arange(maxlen), priorities)
+            memory.beta = state.get("beta", memory.beta)
+            memory.max_priority = state.get("max_priority", memory.max_priority)
+        agent.epsilon = state["epsilon"]
+        # The other generation may hold a half-written save; its next write is a full one
+        self.generation = generation
+        self.saved_totals = [None, None]
+        if generation is not None:
+            self.saved_totals[generation] = total
+
+        version, internal, gauss = state["python_random"]
+        random.setstate((version, tuple(internal), gauss))
+        name, keys, pos, has_gauss, cached = state["numpy_random"]
+        np.random.set_state((name, np.array(keys, dtype=np.uint32), pos, has_gauss, cached))
+        return state
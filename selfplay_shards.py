@@ -0,0 +1,159 @@
+"""
+Compressed Self-Play Game Shards
+
+Every self-play game is kept as its move sequence plus result, so it can be
+reused for supervised training, deduplication and analysis instead of being
+dropped once its experiences are in the replay buffer.
+
+    selfplay/selfplay_<date>_<time>_<pid>_0000.games.gz
+    selfplay/selfplay_<date>_<time>_<pid>_0001.games.gz  (after SHARD_GAMES games)
+
+A shard is append-only: games are collected into blocks and each block is
+appended as one gzip member. A record is num_moves (uint16), the result code
+(int8, game_store.RESULT_CODES) and the uint16 move codes of
+game_store.encode_move; games always start from the initial position.
+Readers stop at a block that is still being written, so shards can be read
+while self-play is running.
+
+Compression and disk writes happen on a background thread: ShardWriter.add()
+only queues the game.
+
+Usage: python selfplay_shards.py [--dir selfplay]
+"""
+
+import os
+import sys
+import time
+import zlib
+import gzip
+import queue
+import itertools
+import threading
+import numpy as np
+import chess
+from game_store import encode_move, decode_move, MOVE_DTYPE, RESULT_CODES, RESULT_STRINGS
+
+SHARD_DIR = "selfplay"
+SHARD_EXT = ".games.gz"
+SHARD_GAMES = 10000  # Games per shard before the next one is started
+FLUSH_GAMES = 64  # Games per compressed block
+FLUSH_SECONDS = 30  # A partial block is written after this long without new games
+
+GAME_HEADER = np.dtype([("num_moves", "<u2"), ("result", "i1")])
+
+
+def shard_paths(directory=SHARD_DIR):
+    """Return [(mtime, path)] of the shards in directory, oldest first."""
+    if not os.path.isdir(directory):
+        return []
+    return sorted((os.path.getmtime(os.path.join(directory, name)), os.path.join(directory, name))
+                  for name in os.listdir(directory) if name.endswith(SHARD_EXT))
+
+
+def is_shard(path):
+    return path.endswith(SHARD_EXT)
+
+
+def read_shard(path):
+    """Yield (move codes, result string) of every complete game in a shard."""
+    with open(path, "rb") as shard_file:
+        data = shard_file.read()
+    while data:
+        decompressor = zlib.decompressobj(zlib.MAX_WBITS | 16)  # One gzip member
+        block = decompressor.decompress(data)
+        if not decompressor.eof:
+            break  # Block still being written (or cut off by a crash)
+        offset = 0
+        while offset < len(block):
+            header = np.frombuffer(block, GAME_HEADER, 1, offset)[0]
+            offset += GAME_HEADER.itemsize
+            codes = np.frombuffer(block, MOVE_DTYPE, int(header["num_moves"]), offset)
+            offset += codes.nbytes
+            yield codes, RESULT_STRINGS[int(header["result"])]
+        data = decompressor.unused_data
+
+
+def read_games(path, first=0):
+    """Yield (start board, moves, result) of every complete game in a shard, skipping the first games."""
+    for codes, result in itertools.islice(read_shard(path), first, None):
+        yield chess.Board(), [decode_move(code) for code in codes], result
+
+
+class ShardWriter:
+    """Appends games to compressed shards from a background thread."""
+
+    def __init__(self, directory=SHARD_DIR, shard_games=SHARD_GAMES, flush_games=FLUSH_GAMES):
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.shard_games = shard_games
+        self.flush_games = flush_games
+        self.prefix = f"selfplay_{time.strftime('%Y%m%d_%H%M%S')}_{os.getpid()}"
+        self.games_written = 0
+        self.queue = queue.Queue()
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def add(self, moves, result):
+        """Queue a finished game (moves from the initial position, PGN result string)."""
+        codes = np.array([encode_move(move) for move in moves], dtype=MOVE_DTYPE)
+        self.queue.put((codes, RESULT_CODES.get(result, RESULT_CODES["*"])))
+
+    def close(self):
+        """Write the queued games and stop the writer thread."""
+        self.queue.put(None)
+        self.thread.join()
+
+    def _run(self):
+        pending = []
+        while True:
+            try:
+                item = self.queue.get(timeout=FLUSH_SECONDS)
+            except queue.Empty:
+                self._write(pending)
+                pending = []
+                continue
+            if item is None:
+                self._write(pending)
+                return
+            pending.append(item)
+            if len(pending) >= self.flush_games:
+                self._write(pending)
+                pending = []
+
+    def _write(self, games):
+        if not games:
+            return
+        records = []
+        for codes, result in games:
+            records.append(np.array([(len(codes), result)], dtype=GAME_HEADER).tobytes())
+            records.append(codes.tobytes())
+        path = os.path.join(self.directory,
+                            f"{self.prefix}_{self.games_written // self.shard_games:04d}{SHARD_EXT}")
+        try:
+            with open(path, "ab") as shard_file:
+                shard_file.write(gzip.compress(b"".join(records)))
+            self.games_written += len(games)
+        except OSError as e:
+            print(f"Could not write self-play games to {path}: {e}")
+
+
+def main():
+    directory = sys.argv[sys.argv.index("--dir") + 1] if "--dir" in sys.argv else SHARD_DIR
+    total_games = total_moves = 0
+    for _, path in shard_paths(directory):
+        results = {}
+        games = moves = 0
+        for codes, result in read_shard(path):
+            games += 1
+            moves += len(codes)
+            results[result] = results.get(result, 0) + 1
+        summary = " ".join(f"{result}:{count}" for result, count in sorted(results.items()))
+        print(f"{os.path.basename(path)}  {games} games  {moves} moves  "
+              f"{os.path.getsize(path) / max(moves, 1):.2f} bytes/move  {summary}")
+        total_games += games
+        total_moves += moves
+    print(f"{total_games} games, {total_moves} moves in {directory}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,277 @@
+"""
+Shared-Memory Model Weights for Worker Processes
+
+Worker processes (parallel self-play, arena matches, analysis pools) should
+not each import TensorFlow and load their own copy of the model. Instead the
+parent publishes the Dense layers once into multiprocessing.shared_memory
+and every worker maps the same pages and evaluates positions with a small
+NumPy forward pass. A worker then only loads Python, NumPy and
+python-chess (around 40 MB instead of several hundred with TensorFlow) and
+answers within a second of being spawned; the weights themselves exist once.
+
+    <prefix>            control block: int64 sequence number of the current weights
+    <prefix>_<seq>      weights block: header length, JSON header, aligned float32 arrays
+
+publish() writes a new weights block and then bumps the sequence number;
+workers call refresh() between jobs to switch over, so a worker never mixes
+two versions within a batch. The previous block is unlinked right away:
+workers that still map it keep their view until they refresh.
+
+Workers see the arrays through read-only NumPy views.
+
+Usage: python shared_weights.py [--workers 4] [--artifact chess_model_complex]
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+import numpy as np
+from multiprocessing import shared_memory
+import model_artifact
+from model_artifact import ARTIFACT_PATH
+
+ALIGNMENT = 64  # Byte alignment of every array in a weights block
+CONTROL_SIZE = 8
+
+
+def _attach(name):
+    """Open an existing block without handing its lifetime to a resource tracker.
+
+    Only the publisher unlinks blocks; a tracker that knew about the
+    worker's mapping would unlink (or warn about) the parent's block when
+    the worker exits.
+    """
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)  # Python 3.13+
+    except TypeError:
+        pass
+    from multiprocessing import resource_tracker
+    register = resource_tracker.register
+    resource_tracker.register = lambda name, rtype: None if rtype == "shared_memory" else register(name, rtype)
+    try:
+        return shared_memory.SharedMemory(name=name)
+    finally:
+        resource_tracker.register = register
+
+
+def _close(block):
+    try:
+        block.close()
+    except BufferError:
+        pass  # A caller still holds a view; the mapping goes away with it
+
+
+def forward(layers, inputs):
+    """NumPy forward pass of [(kernel, bias, activation)] on an (N, inputs) batch."""
+    x = np.asarray(inputs, dtype=np.float32)
+    for kernel, bias, activation in layers:
+        x = x @ kernel + bias
+        if activation == "relu":
+            np.maximum(x, 0, out=x)
+        elif activation == "tanh":
+            np.tanh(x, out=x)
+        elif activation == "sigmoid":
+            x = 1 / (1 + np.exp(-x))
+        elif activation != "linear":
+            raise ValueError(f"Unsupported activation {activation}")
+    return x
+
+
+class WeightPublisher:
+    """Parent side: owns the shared-memory blocks and publishes new weights."""
+
+    def __init__(self, prefix=None):
+        self.prefix = prefix or f"chess_weights_{os.getpid()}"
+        self.control = shared_memory.SharedMemory(name=self.prefix, create=True, size=CONTROL_SIZE)
+        self.sequence = np.ndarray((1,), dtype=np.int64, buffer=self.control.buf)
+        self.sequence[0] = 0
+        self.block = None
+
+    def publish(self, layers, version=0):
+        """Publish [(kernel, bias, activation)]; returns the new sequence number."""
+        header = {"version": version, "layers": []}
+        offset = 0
+        arrays = []
+        for kernel, bias, activation in layers:
+            entry = {"activation": activation}
+            for name, array in (("kernel", kernel), ("bias", bias)):
+                array = np.ascontiguousarray(array, dtype=np.float32)
+                entry[name] = [offset, list(array.shape)]
+                arrays.append((offset, array))
+                offset += -(-array.nbytes // ALIGNMENT) * ALIGNMENT
+            header["layers"].append(entry)
+        header_bytes = json.dumps(header).encode()
+        data_start = -(-(8 + len(header_bytes)) // ALIGNMENT) * ALIGNMENT
+
+        sequence = int(self.sequence[0]) + 1
+        block = shared_memory.SharedMemory(name=f"{self.prefix}_{sequence}", create=True,
+                                           size=data_start + max(offset, 1))
+        block.buf[:8] = len(header_bytes).to_bytes(8, "little")
+        block.buf[8:8 + len(header_bytes)] = header_bytes
+        for array_offset, array in arrays:
+            start = data_start + array_offset
+            block.buf[start:start + array.nbytes] = array.tobytes()
+
+        self.sequence[0] = sequence  # Workers switch on their next refresh()
+        if self.block is not None:
+            self.block.close()
+            self.block.unlink()
+        self.block = block
+        return sequence
+
+    def publish_model(self, model, version=0):
+        """Publish the Dense layers of a Keras model."""
+        return self.publish(model_artifact.dense_layers(model), version)
+
+    def publish_artifact(self, artifact_path=ARTIFACT_PATH):
+        """Publish a model artifact (no TensorFlow needed); returns the sequence number or None."""
+        loaded = model_artifact.load_layers(artifact_path)
+        if loaded is None:
+            return None
+        metadata, layers = loaded
+        return self.publish(layers, metadata["version"])
+
+    def close(self):
+        """Remove the blocks; call once the workers are done."""
+        del self.sequence
+        for block in (self.block, self.control):
+            if block is not None:
+                block.close()
+                block.unlink()
+        self.block = None
+
+
+class SharedWeights:
+    """Worker side: maps the published weights read-only and evaluates positions.
+
+    predict() has model.predict()'s call shape, so it can stand in for a
+    Keras model wherever only inference is needed.
+    """
+
+    def __init__(self, prefix):
+        self.prefix = prefix
+        self.control = _attach(prefix)
+        self.block = None
+        self.sequence = 0
+        self.version = 0
+        self.layers = []
+        if not self.refresh():
+            raise RuntimeError(f"No weights published under {prefix}")
+
+    def refresh(self):
+        """Switch to the newest published weights; True if they changed."""
+        while True:
+            sequence = int(np.ndarray((1,), dtype=np.int64, buffer=self.control.buf)[0])
+            if sequence == self.sequence or sequence == 0:
+                return False
+            try:
+                block = _attach(f"{self.prefix}_{sequence}")
+                break
+            except FileNotFoundError:
+                continue  # Replaced again while attaching; read the new sequence number
+
+        header_length = int.from_bytes(block.buf[:8], "little")
+        header = json.loads(bytes(block.buf[8:8 + header_length]))
+        data_start = -(-(8 + header_length) // ALIGNMENT) * ALIGNMENT
+        layers = []
+        for entry in header["layers"]:
+            arrays = []
+            for name in ("kernel", "bias"):
+                offset, shape = entry[name]
+                array = np.ndarray(shape, dtype=np.float32, buffer=block.buf, offset=data_start + offset)
+                array.flags.writeable = False
+                arrays.append(array)
+            layers.append((arrays[0], arrays[1], entry["activation"]))
+
+        old_block = self.block
+        self.layers, self.block = layers, block
+        self.sequence, self.version = sequence, header["version"]
+        if old_block is not None:
+            _close(old_block)
+        return True
+
+    def predict(self, inputs, verbose=0, batch_size=None):
+        return forward(self.layers, inputs)
+
+    def close(self):
+        self.layers = []
+        for block in (self.block, self.control):
+            if block is not None:
+                _close(block)
+        self.block = None
+
+
+def _worker(prefix, tasks, results, started):
+    """Demo worker: evaluate the positions of every task with the shared weights."""
+    from dataset_builder import codes_to_planes
+    from training_metrics import peak_rss_mb
+    weights = SharedWeights(prefix)
+    while True:
+        boards = tasks.get()
+        if boards is None:
+            break
+        weights.refresh()
+        values = weights.predict(codes_to_planes(boards))[:, 0]
+        results.put((os.getpid(), weights.version, weights.sequence, values, time.time() - started,
+                     peak_rss_mb(), "tensorflow" in sys.modules))
+    weights.close()
+
+
+def demo(workers=4, artifact_path=ARTIFACT_PATH):
+    """Publish an artifact, evaluate positions in spawned workers and republish once."""
+    import multiprocessing as mp
+    import chess
+    from dataset_builder import board_codes, codes_to_planes
+    from parallel_search import BENCH_POSITIONS
+    from training_metrics import peak_rss_mb
+
+    publisher = WeightPublisher()
+    if publisher.publish_artifact(artifact_path) is None:
+        publisher.close()
+        print(f"No model artifact at {artifact_path}; export one with model_artifact.py first.")
+        return
+    boards = np.array([board_codes(chess.Board(fen)) for fen in BENCH_POSITIONS])
+    expected = forward(model_artifact.load_layers(artifact_path)[1], codes_to_planes(boards))[:, 0]
+
+    context = mp.get_context("spawn")
+    results = context.Queue()
+    processes = []  # (process, its task queue)
+    try:
+        for _ in range(workers):
+            tasks = context.Queue()
+            process = context.Process(target=_worker, args=(publisher.prefix, tasks, results, time.time()))
+            process.start()
+            processes.append((process, tasks))
+
+        for round_name in ("first publish", "republish"):
+            if round_name == "republish":
+                publisher.publish_artifact(artifact_path)
+            for _, tasks in processes:
+                tasks.put(boards)
+            print(f"{round_name}:")
+            print(f"{'pid':>8} {'version':>7} {'seq':>4} {'seconds':>8} {'RSS MB':>7} {'TF':>3} {'matches':>7}")
+            for _ in processes:
+                pid, version, sequence, values, seconds, rss, tf_loaded = results.get()
+                seconds = f"{seconds:.2f}" if round_name == "first publish" else "-"
+                print(f"{pid:>8} {version:>7} {sequence:>4} {seconds:>8} {rss or 0:>7.1f} "
+                      f"{'yes' if tf_loaded else 'no':>3} {'yes' if np.allclose(values, expected, atol=1e-5) else 'NO':>7}")
+        print(f"Parent RSS {peak_rss_mb() or 0:.1f} MB; seconds are from spawn to the worker's answer")
+    finally:
+        for process, tasks in processes:
+            tasks.put(None)
+            process.join()
+        publisher.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Share model weights with worker processes through shared memory.")
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--artifact", default=ARTIFACT_PATH, help="model artifact to publish")
+    args = parser.parse_args()
+    demo(args.workers, args.artifact)
+
+
+if __name__ == "__main__":
+    main()
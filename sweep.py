@@ -0,0 +1,307 @@
+"""
+Parallel Hyperparameter Sweep
+
+Runs many training trials of the value network at once without parsing the
+games more than once or keeping a copy of the data per trial:
+
+    1. The corpus (train/ PGNs, game store, self-play shards) is encoded once
+       into memory-mapped arrays in sweep_data/: int8 piece codes of every
+       position, its game's result, the moves left to the end and the game id.
+       The corpus is read twice, to count and then to fill the arrays, so it
+       is never held in memory.
+    2. Each trial runs in its own process, pinned to its own share of the
+       CPUs this process may use and with TensorFlow limited to that many
+       threads. All trials map the same files, so the data sits in the page
+       cache once.
+    3. After every epoch a trial reports its validation loss. A trial worse
+       than the median of the other trials at the same epoch is stopped
+       (median stopping rule), and a trial stops by itself once its
+       validation loss stops improving.
+
+Trials vary learning_rate, batch_size, hidden (an architectures.py name or
+layer widths such as 128-64) and gamma: the target of a position is its game's result discounted by
+gamma per move to the end, like RLChessAgent's remembered rewards (gamma 1
+is train_custom.py's plain outcome). Every trial is validated against the
+plain outcome of held-out games, so the losses are comparable.
+
+Usage: python sweep.py [--parallel 4] [--trials 16] [--epochs 10]
+                       [--grid "learning_rate=0.001,0.0003 hidden=small,deep,256-64"] [--rebuild]
+"""
+
+import os
+import json
+import time
+import queue
+import random
+import argparse
+import itertools
+import multiprocessing as mp
+import numpy as np
+from numpy.lib.format import open_memmap
+import training_metrics
+import architectures
+from dataset_builder import corpus_games, board_codes, codes_to_planes
+
+SWEEP_DATA_DIR = "sweep_data"
+SWEEP_DIR = "sweeps"  # Ranked results of every sweep, one JSON file each
+VALIDATION_GAMES = 10  # Every tenth game is held out for validation
+MAX_VALIDATION = 20000  # Validation positions used per trial
+SAMPLES_PER_EPOCH = 200000  # Training positions per epoch, the same for every trial
+MIN_EPOCHS = 2  # Epochs a trial runs before the median rule may stop it
+PATIENCE = 2  # Epochs without improvement before a trial stops itself
+REPORT_POLL = 5  # Seconds between checks for trial processes that died without reporting
+
+DEFAULT_GRID = {
+    "learning_rate": [0.001, 0.0003],
+    "batch_size": [32, 128],
+    "hidden": ["small", "deep"],
+    "gamma": [1.0, 0.95],
+}
+RESULT_VALUES = {"1-0": 1.0, "0-1": -1.0, "1/2-1/2": 0.0}
+
+
+def available_cpus():
+    """CPUs this process may run on (its affinity mask, e.g. inside a container)."""
+    if hasattr(os, "sched_getaffinity"):
+        return sorted(os.sched_getaffinity(0))
+    return list(range(os.cpu_count() or 1))
+
+
+def encode_corpus(out_dir=SWEEP_DATA_DIR):
+    """Encode every finished game of the corpus into memory-mapped arrays in out_dir.
+
+    A first pass counts the positions; the second writes each game straight
+    into the memory maps.
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    total_games = total_positions = 0
+    for _, moves, result in corpus_games():
+        length = sum(1 for _ in moves)
+        if result in RESULT_VALUES and length:  # Unfinished games have no target
+            total_games += 1
+            total_positions += length
+    if not total_positions:
+        return 0
+
+    layout = (("boards", np.int8, (total_positions, 64)), ("results", np.float32, (total_positions,)),
+              ("steps", np.uint16, (total_positions,)), ("games", np.uint32, (total_positions,)))
+    tmp_paths = {name: os.path.join(out_dir, f"{name}.tmp.npy") for name, _, _ in layout}
+    arrays = {name: open_memmap(tmp_paths[name], mode="w+", dtype=dtype, shape=shape)
+              for name, dtype, shape in layout}
+    game_id = offset = 0
+    for board, moves, result in corpus_games():
+        if result not in RESULT_VALUES:
+            continue
+        codes = []
+        for move in moves:
+            board.push(move)
+            codes.append(board_codes(board))  # Position after each move, like train_custom.py
+        if not codes:
+            continue
+        end = offset + len(codes)
+        if game_id == total_games or end > total_positions:
+            break  # Games added since the first pass are left for the next --rebuild
+        arrays["boards"][offset:end] = codes
+        arrays["results"][offset:end] = RESULT_VALUES[result]
+        arrays["steps"][offset:end] = np.arange(len(codes) - 1, -1, -1)
+        arrays["games"][offset:end] = game_id
+        game_id += 1
+        offset = end
+    for array in arrays.values():
+        array.flush()
+    del arrays
+    if offset != total_positions:
+        raise RuntimeError(f"The corpus changed while it was encoded ({offset} of {total_positions} positions)")
+    for name, tmp_path in tmp_paths.items():
+        os.replace(tmp_path, os.path.join(out_dir, f"{name}.npy"))  # games.npy marks a complete dataset
+    print(f"Encoded {game_id} games, {offset} positions into {out_dir}")
+    return offset
+
+
+def load_corpus(data_dir=SWEEP_DATA_DIR):
+    """Return the memory-mapped (boards, results, steps, games) arrays."""
+    return tuple(np.load(os.path.join(data_dir, f"{name}.npy"), mmap_mode="r")
+                 for name in ("boards", "results", "steps", "games"))
+
+
+def parse_grid(text):
+    """Parse "name=v1,v2 name=v3" into {name: [values]}; numbers stay numbers."""
+    grid = {}
+    for item in text.split():
+        name, values = item.split("=", 1)
+        parsed = []
+        for value in values.split(","):
+            try:
+                parsed.append(int(value) if value.isdigit() else float(value))
+            except ValueError:
+                parsed.append(value)
+        grid[name] = parsed
+    return grid
+
+
+def make_trials(grid, count=None):
+    """Every combination of the grid, or count of them drawn at random."""
+    names = sorted(grid)
+    trials = [dict(zip(names, values)) for values in itertools.product(*(grid[name] for name in names))]
+    if count is not None and count < len(trials):
+        trials = random.sample(trials, count)
+    return trials
+
+
+def run_trial(trial_id, params, data_dir, cpus, reports, stop, max_epochs):
+    """Train one trial in this (child) process and report to the parent through reports."""
+    threads = max(1, len(cpus))
+    os.environ["OMP_NUM_THREADS"] = str(threads)
+    os.environ["TF_CPP_MIN_LOG_LEVEL"] = "2"
+    start = time.time()
+    try:
+        if hasattr(os, "sched_setaffinity"):
+            os.sched_setaffinity(0, cpus)
+        import tensorflow as tf
+        tf.config.threading.set_intra_op_parallelism_threads(threads)
+        tf.config.threading.set_inter_op_parallelism_threads(1)
+
+        boards, results, steps, games = load_corpus(data_dir)
+        validation = np.flatnonzero(games % VALIDATION_GAMES == 0)[:MAX_VALIDATION]
+        train = np.flatnonzero(games % VALIDATION_GAMES != 0)
+        if not len(validation) or not len(train):
+            raise ValueError("not enough games for a validation split")
+        x_validation, y_validation = codes_to_planes(boards[validation]), np.asarray(results[validation])
+
+        gamma = float(params.get("gamma", 1.0))
+        batch_size = int(params.get("batch_size", 32))
+        steps_per_epoch = max(1, min(len(train), SAMPLES_PER_EPOCH) // batch_size)
+
+        def batches():
+            while True:
+                batch = np.sort(np.random.choice(train, batch_size))  # Sorted reads from the memory map
+                yield codes_to_planes(boards[batch]), results[batch] * np.power(gamma, steps[batch])
+
+        model = architectures.build_model(params.get("hidden", "small"), float(params.get("learning_rate", 0.001)))
+
+        class Report(tf.keras.callbacks.Callback):
+            def on_epoch_end(self, epoch, logs=None):
+                reports.put(("epoch", trial_id, float(logs["val_loss"]), epoch + 1, time.time() - start))
+                if stop.is_set():
+                    self.model.stop_training = True
+
+        history = model.fit(batches(), steps_per_epoch=steps_per_epoch, epochs=max_epochs, verbose=0,
+                            validation_data=(x_validation, y_validation),
+                            callbacks=[Report(), tf.keras.callbacks.EarlyStopping(patience=PATIENCE)])
+        losses = history.history["val_loss"]
+        best = int(np.argmin(losses))
+        reports.put(("done", trial_id, float(losses[best]), best + 1, time.time() - start))
+    except Exception as e:
+        reports.put(("failed", trial_id, str(e), 0, time.time() - start))
+
+
+def sweep(trials, parallel, max_epochs=10, data_dir=SWEEP_DATA_DIR):
+    """Run trials, parallel at a time, and return their results ranked by validation loss."""
+    cpus = available_cpus()
+    parallel = max(1, min(parallel, len(trials), len(cpus)))
+    cores = len(cpus) // parallel
+    slots = [cpus[i * cores:(i + 1) * cores] for i in range(parallel)]
+
+    context = mp.get_context("spawn")  # Children start without the parent's state
+    reports = context.Queue()
+    results = {trial_id: {"trial": trial_id, "params": params, "status": "pending"}
+                for trial_id, params in enumerate(trials)}
+    epoch_losses = {}  # epoch -> validation losses reported by all trials
+    pending = list(range(len(trials)))
+    running = {}  # trial_id -> (process, stop event, cpu slot)
+    free_slots = list(range(parallel))
+
+    while pending or running:
+        while pending and free_slots:
+            trial_id, slot = pending.pop(0), free_slots.pop(0)
+            stop = context.Event()
+            process = context.Process(target=run_trial, daemon=True,
+                                      args=(trial_id, trials[trial_id], data_dir, slots[slot], reports,
+                                            stop, max_epochs))
+            process.start()
+            running[trial_id] = (process, stop, slot)
+            results[trial_id]["status"] = "running"
+            print(f"Trial {trial_id} started on cores {slots[slot]}: {trials[trial_id]}")
+
+        try:
+            kind, trial_id, value, epoch, seconds = reports.get(timeout=REPORT_POLL)
+        except queue.Empty:
+            # A process killed from outside (e.g. out of memory) never reports
+            dead = [trial_id for trial_id, (process, _, _) in running.items() if not process.is_alive()]
+            if not dead or not reports.empty():
+                continue
+            trial_id = dead[0]
+            kind, value, epoch, seconds = "failed", f"exit code {running[trial_id][0].exitcode}", 0, 0.0
+        result = results[trial_id]
+        if kind == "epoch":
+            others = epoch_losses.setdefault(epoch, [])
+            stopping = (result["status"] == "running" and epoch >= MIN_EPOCHS and len(others) >= 2
+                        and value > np.median(others))
+            if stopping:
+                running[trial_id][1].set()
+                result["status"] = "stopped"
+            others.append(value)
+            print(f"Trial {trial_id} epoch {epoch}: val_loss {value:.4f} ({seconds:.0f}s)"
+                  + (" - stopping, worse than the median" if stopping else ""))
+            continue
+
+        process, _, slot = running.pop(trial_id)
+        process.join()
+        free_slots.append(slot)
+        result["seconds"] = round(seconds, 1)
+        if kind == "failed":
+            result["status"] = "failed"
+            result["error"] = value
+            print(f"Trial {trial_id} failed: {value}")
+        else:
+            result.update({"val_loss": value, "best_epoch": epoch})
+            if result["status"] != "stopped":
+                result["status"] = "done"
+        training_metrics.log("trial", **result)
+
+    return sorted(results.values(), key=lambda r: r.get("val_loss", float("inf")))
+
+
+def print_table(ranked):
+    names = sorted({name for r in ranked for name in r["params"]})
+    print(f"{'rank':>4} {'val_loss':>9} {'epoch':>5} {'seconds':>8} {'status':8s} "
+          + " ".join(f"{name:>13s}" for name in names))
+    for rank, r in enumerate(ranked, 1):
+        loss = f"{r['val_loss']:.4f}" if "val_loss" in r else "-"
+        print(f"{rank:>4} {loss:>9} {r.get('best_epoch', '-'):>5} {r.get('seconds', '-'):>8} {r['status']:8s} "
+              + " ".join(f"{str(r['params'].get(name, '-')):>13s}" for name in names))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Parallel hyperparameter sweep of the value network.")
+    parser.add_argument("--parallel", type=int, default=max(1, len(available_cpus()) // 2),
+                        help="trials running at once; each gets an equal share of the available cores")
+    parser.add_argument("--trials", type=int, help="random sample of this many grid points (default: all)")
+    parser.add_argument("--epochs", type=int, default=10, help="maximum epochs per trial")
+    parser.add_argument("--grid", help='e.g. "learning_rate=0.001,0.0003 batch_size=32,128 hidden=small,128-32"')
+    parser.add_argument("--data", default=SWEEP_DATA_DIR, help="encoded dataset directory")
+    parser.add_argument("--rebuild", action="store_true", help="re-encode the corpus")
+    args = parser.parse_args()
+
+    if args.rebuild or not os.path.exists(os.path.join(args.data, "games.npy")):
+        if not encode_corpus(args.data):
+            print("No finished games found to sweep on.")
+            return
+    trials = make_trials(parse_grid(args.grid) if args.grid else DEFAULT_GRID, args.trials)
+
+    training_metrics.start_run("sweep", parallel=args.parallel, trials=len(trials), epochs=args.epochs)
+    try:
+        ranked = sweep(trials, args.parallel, args.epochs, args.data)
+    finally:
+        training_metrics.end_run()
+    print_table(ranked)
+
+    os.makedirs(SWEEP_DIR, exist_ok=True)
+    path = os.path.join(SWEEP_DIR, f"sweep_{time.strftime('%Y%m%d_%H%M%S')}.json")
+    with open(path, "w") as results_file:
+        json.dump(ranked, results_file, indent=2)
+    print(f"Results saved to {path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,48 @@
+"""
+Regression tests for mcts.py.
+
+Usage: python -m pytest test_mcts.py
+"""
+
+import threading
+import numpy as np
+import chess
+from mcts import MCTS
+
+# Every move reaches the 75-move rule (halfmove clock 150)
+SEVENTYFIVE_FEN = "k7/8/8/4n3/8/8/8/KR6 w - - 149 200"
+
+
+def zero_tree():
+    return MCTS(lambda board: np.zeros(768, dtype=np.float32),
+                lambda batch: np.zeros((len(batch), 1), dtype=np.float32))
+
+
+def search_with_timeout(fen, max_nodes=2000, timeout=20):
+    """Run a search on a thread; fail instead of hanging the test run."""
+    tree = zero_tree()
+    result = []
+    thread = threading.Thread(target=lambda: result.append(tree.search(chess.Board(fen), max_nodes)), daemon=True)
+    thread.start()
+    thread.join(timeout)
+    assert not thread.is_alive(), f"search did not finish within {timeout}s"
+    return tree, result[0]
+
+
+def test_all_root_children_terminal():
+    tree, move = search_with_timeout(SEVENTYFIVE_FEN)
+    assert move in chess.Board(SEVENTYFIVE_FEN).legal_moves
+    assert all(child.terminal is not None for child in tree.root.children)
+
+
+def test_terminal_replies_count_toward_budget():
+    # One ply earlier: every reply of the opponent ends the game
+    fen = SEVENTYFIVE_FEN.replace(" 149 ", " 148 ")
+    tree, move = search_with_timeout(fen, max_nodes=500)
+    assert move in chess.Board(fen).legal_moves
+    assert tree.nodes < 2 * 500  # One batch of expansions past the budget at most
+
+
+def test_mate_in_one_is_played():
+    _, move = search_with_timeout("6k1/5ppp/8/8/8/8/8/R5K1 w - - 0 1", max_nodes=50)
+    assert move == chess.Move.from_uci("a1a8")
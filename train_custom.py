@@ -1,14 +1,61 @@
 import os
+import sys
+import json
+import time
+import random
 import chess
 import chess.pgn
 import numpy as np
 import tensorflow as tf
-from tensorflow.keras.models import Sequential
-from tensorflow.keras.layers import Dense, Flatten
+from game_store import GameStore
+from dataset_builder import build_dataset, load_dataset, codes_to_input, DATASET_DIR
+from selfplay_shards import shard_paths, read_shard, read_games, SHARD_DIR
+import model_artifact
+import architectures
+import training_metrics
 from tensorflow.keras.optimizers import Adam
 
 TRAIN_FOLDER = "train"
 MODEL_PATH = "chess_model_complex.h5"
+STATE_PATH = "train_custom_state.json"  # Watermarks for incremental training
+
+# Incremental training parameters
+INCREMENTAL_EPOCHS = 3
+FINE_TUNE_LEARNING_RATE = 0.0005
+REPLAY_FILES = 20  # Older PGN files or stored games re-read per incremental run
+REPLAY_SAMPLES = 2000  # Maximum older positions mixed into each run
+
+# Deduplicated training (--dedup)
+MAX_SAMPLES_PER_POSITION = 10  # Cap on the visit-count weight of one position
+
+def game_samples(board, moves, result):
+    """Extracts board positions and evaluation values from one game's moves."""
+    data = []
+
+    # Use game outcome as reward (RL approach)
+    if result == "1-0":  # White wins
+        evaluation = 1.0
+    elif result == "0-1":  # Black wins  
+        evaluation = -1.0
+    elif result == "1/2-1/2":  # Draw
+        evaluation = 0.0
+    else:
+        evaluation = 0.0  # Unknown result
+
+    for move in moves:
+        board.push(move)  # Play the move
+        
+        # Convert board state to input array
+        input_array = np.zeros((8, 8, 12))
+        piece_map = board.piece_map()
+        
+        for square, piece in piece_map.items():
+            row, col = divmod(square, 8)
+            input_array[row, col, piece.piece_type - 1] = 1 if piece.color == chess.WHITE else -1
+        
+        data.append((input_array.flatten(), evaluation))
+    
+    return data
 
 def parse_pgn_file(pgn_path):
     """Extracts board positions and evaluation values from a PGN file."""
@@ -16,39 +63,49 @@ def parse_pgn_file(pgn_path):
     
     with open(pgn_path, "r") as pgn_file:
         while True:
-            game = chess.pgn.read_game(pgn_file)
+            with training_metrics.timed("parse"):
+                game = chess.pgn.read_game(pgn_file)
             if game is None:
                 break  # End of file
 
-            board = game.board()
-            for move in game.mainline_moves():
-                board.push(move)  # Play the move
-                
-                # Convert board state to input array
-                input_array = np.zeros((8, 8, 12))
-                piece_map = board.piece_map()
-                
-                for square, piece in piece_map.items():
-                    row, col = divmod(square, 8)
-                    input_array[row, col, piece.piece_type - 1] = 1 if piece.color == chess.WHITE else -1
-                
-                # Use game outcome as reward (RL approach)
-                result = game.headers.get("Result", "*")
-                if result == "1-0":  # White wins
-                    evaluation = 1.0
-                elif result == "0-1":  # Black wins  
-                    evaluation = -1.0
-                elif result == "1/2-1/2":  # Draw
-                    evaluation = 0.0
-                else:
-                    evaluation = 0.0  # Unknown result
-                
-                data.append((input_array.flatten(), evaluation))
+            with training_metrics.timed("encode"):
+                samples = game_samples(game.board(), game.mainline_moves(), game.headers.get("Result", "*"))
+            data.extend(samples)
+            training_metrics.count("games")
+            training_metrics.count("positions", len(samples))
     
     return data
 
+def load_store_games(store, game_ids):
+    """Extracts training data from games in the binary game store (no PGN parsing)."""
+    data = []
+    for game_id in game_ids:
+        with training_metrics.timed("store_read"):
+            board, moves, result = store.start_board(game_id), store.moves(game_id), store.result(game_id)
+        with training_metrics.timed("encode"):
+            samples = game_samples(board, moves, result)
+        data.extend(samples)
+        training_metrics.count("games")
+        training_metrics.count("positions", len(samples))
+    return data
+
+def load_games(games):
+    """Extracts training data from (start board, moves, result) tuples."""
+    data = []
+    for board, moves, result in games:
+        with training_metrics.timed("encode"):
+            samples = game_samples(board, moves, result)
+        data.extend(samples)
+        training_metrics.count("games")
+        training_metrics.count("positions", len(samples))
+    return data
+
+def load_shard_games(shard_path):
+    """Extracts training data from a compressed self-play shard (no PGN parsing)."""
+    return load_games(read_games(shard_path))
+
 def load_pgn_data(train_folder):
-    """Reads all PGN files in the train folder and extracts training data."""
+    """Reads all PGN files in the train folder, the game store and the self-play shards and extracts training data."""
     all_data = []
     
     for file in os.listdir(train_folder):
@@ -56,36 +113,243 @@ def load_pgn_data(train_folder):
             file_path = os.path.join(train_folder, file)
             print(f"Processing {file_path}...")
             all_data.extend(parse_pgn_file(file_path))
+
+    store = GameStore()
+    if len(store):
+        print(f"Processing {len(store)} games from {store.path}...")
+        all_data.extend(load_store_games(store, range(len(store))))
+    
+    for _, shard_path in shard_paths(SHARD_DIR):
+        print(f"Processing {shard_path}...")
+        all_data.extend(load_shard_games(shard_path))
     
     if not all_data:
         print("No valid PGN data found!")
         return None, None
     
-    X_train = np.array([x[0] for x in all_data])
-    y_train = np.array([x[1] for x in all_data])
+    with training_metrics.timed("stack", items=len(all_data)):
+        X_train = np.array([x[0] for x in all_data])
+        y_train = np.array([x[1] for x in all_data])
     
     return X_train, y_train
 
-# Load training data from PGN files
-X_train, y_train = load_pgn_data(TRAIN_FOLDER)
+class ProgressLogger(tf.keras.callbacks.Callback):
+    """Print one machine-readable progress line per epoch for job_manager.py."""
+
+    def __init__(self, num_samples):
+        super().__init__()
+        self.num_samples = num_samples
+
+    def on_epoch_begin(self, epoch, logs=None):
+        self.epoch_start = time.time()
+
+    def on_epoch_end(self, epoch, logs=None):
+        elapsed = max(time.time() - self.epoch_start, 1e-9)
+        logs = logs or {}
+        loss = logs.get("loss", float("nan"))
+        print(f"PROGRESS epoch={epoch + 1}/{self.params.get('epochs')} "
+              f"samples_per_sec={self.num_samples / elapsed:.1f} loss={loss:.4f}", flush=True)
+        training_metrics.log("epoch", epoch=epoch + 1, seconds=round(elapsed, 3),
+                             samples_per_sec=self.num_samples / elapsed,
+                             **{name: float(value) for name, value in logs.items()})
+
+def dataset_batches(boards, values, sample_weight, indices, batch_size, shuffle=True):
+    """Endless (inputs, targets, weights) batches; boards are encoded a batch at a time."""
+    while True:
+        order = np.random.permutation(indices) if shuffle else indices
+        for first in range(0, len(order), batch_size):
+            batch = np.sort(order[first:first + batch_size])  # Sorted reads from the memory map
+            yield codes_to_input(boards[batch]), values[batch], sample_weight[batch]
+
+def fit_dataset(model, boards, values, sample_weight, epochs=10, batch_size=32):
+    """Fit on a memory-mapped dataset, holding out the last 10% like validation_split."""
+    split = max(1, int(len(boards) * 0.9))
+    train, validation = np.arange(split), np.arange(split, len(boards))
+    validation_args = {}
+    if len(validation):
+        validation_args = {"validation_data": dataset_batches(boards, values, sample_weight, validation,
+                                                              batch_size, shuffle=False),
+                           "validation_steps": -(-len(validation) // batch_size)}
+    model.fit(dataset_batches(boards, values, sample_weight, train, batch_size),
+              steps_per_epoch=-(-split // batch_size), epochs=epochs,
+              callbacks=[ProgressLogger(split)], **validation_args)
+
+def build_model():
+    """Define the neural network model."""
+    return architectures.build_model("small", learning_rate=0.001)
 
-if X_train is None:
-    print("Training aborted due to missing data.")
-    exit()
+def pgn_files(train_folder):
+    """List the PGN files in the train folder with their modification times."""
+    files = []
+    for file in os.listdir(train_folder):
+        if file.endswith(".pgn"):
+            file_path = os.path.join(train_folder, file)
+            files.append((os.path.getmtime(file_path), file_path))
+    return sorted(files)
+
+def shard_game_counts():
+    """Number of complete games in each self-play shard, by file name."""
+    return {os.path.basename(path): sum(1 for _ in read_shard(path)) for _, path in shard_paths(SHARD_DIR)}
+
+def load_state():
+    """Read the training watermarks.
+
+    watermark is the mtime of the newest PGN file already trained on. The
+    store and the shards are append-only, so for them it is a game count:
+    store_watermark, and shard_games per shard file name.
+    """
+    if os.path.exists(STATE_PATH):
+        with open(STATE_PATH, "r") as state_file:
+            return json.load(state_file)
+    return {"watermark": 0.0, "store_watermark": 0, "shard_games": {}}
+
+def save_state(state):
+    """Write the training watermarks atomically."""
+    tmp_path = STATE_PATH + ".tmp"
+    with open(tmp_path, "w") as state_file:
+        json.dump(state, state_file)
+    os.replace(tmp_path, STATE_PATH)
+
+def save_model(model):
+    """Save the model atomically so the engine never sees a half-written file."""
+    root, ext = os.path.splitext(MODEL_PATH)
+    tmp_path = f"{root}.tmp{ext}"
+    model.save(tmp_path)
+    os.replace(tmp_path, MODEL_PATH)
+    print(f"Model saved to {MODEL_PATH}")
+    # Versioned weights-only artifact picked up by running engines
+    model_artifact.save_model(model, source="train_custom", encoding="signed")
+
+def train_full(dedup=False):
+    """Train a fresh model on every game in the train folder and the game store.
+
+    With dedup, duplicate positions are merged by dataset_builder.py into one
+    sample with the mean outcome, weighted by its (capped) visit count.
+    """
+    files = pgn_files(TRAIN_FOLDER)
+    store_size = len(GameStore())
+    shard_games = shard_game_counts()
+
+    if dedup:
+        with training_metrics.timed("build_dataset"):
+            build_dataset(TRAIN_FOLDER, out_dir=DATASET_DIR)
+        with training_metrics.timed("load_dataset"):
+            boards, values, sample_weight = load_dataset(DATASET_DIR, max_count=MAX_SAMPLES_PER_POSITION)
+        if not len(boards):
+            print("Training aborted due to missing data.")
+            return
+        model = build_model()
+        # The dataset can exceed RAM once encoded, so it is fed from the memory map
+        with training_metrics.timed("fit", items=int(len(boards) * 0.9) * 10):
+            fit_dataset(model, boards, values, sample_weight)
+    else:
+        # Load training data from PGN files
+        X_train, y_train = load_pgn_data(TRAIN_FOLDER)
+        if X_train is None:
+            print("Training aborted due to missing data.")
+            return
+
+        model = build_model()
 
-# Define Neural Network Model
-model = Sequential([
-    Dense(128, activation="relu", input_shape=(8*8*12,)),
-    Dense(64, activation="relu"),
-    Dense(1, activation="linear")  # Single value output
-])
+        # Train Model
+        with training_metrics.timed("fit", items=int(len(X_train) * 0.9) * 10):
+            model.fit(X_train, y_train, epochs=10, batch_size=32, validation_split=0.1,
+                      callbacks=[ProgressLogger(int(len(X_train) * 0.9))])
 
-model.compile(optimizer=Adam(learning_rate=0.001), loss="mse", metrics=["mae"])
+    # Save Model
+    with training_metrics.timed("save"):
+        save_model(model)
+    save_state({"watermark": files[-1][0] if files else 0.0, "store_watermark": store_size,
+                "shard_games": shard_games})
+
+def train_incremental():
+    """Fine-tune the existing model on games newer than the watermark.
+
+    New games are mixed with a bounded replay sample of older games so the
+    cost depends on the size of the delta, not of the whole corpus.
+    """
+    if not os.path.exists(MODEL_PATH):
+        print(f"Model file {MODEL_PATH} not found. Running full training...")
+        train_full(dedup="--dedup" in sys.argv)
+        return
+
+    state = load_state()
+    files = pgn_files(TRAIN_FOLDER)
+    new_files = [path for mtime, path in files if mtime > state["watermark"]]
+    old_files = [path for mtime, path in files if mtime <= state["watermark"]]
+
+    # Games in the store are ordered by id, so the watermark is a game count
+    store = GameStore()
+    store_size = len(store)
+    store_watermark = min(state.get("store_watermark", 0), store_size)
+
+    # Shards only grow by appending, so only the games after each shard's count are new
+    shard_games = dict(state.get("shard_games", {}))
+    new_shard_games = []
+    old_shards = []
+    for _, shard_path in shard_paths(SHARD_DIR):
+        name = os.path.basename(shard_path)
+        first = shard_games.get(name, 0)
+        if first:
+            old_shards.append(shard_path)
+        games = list(read_games(shard_path, first))
+        if games:
+            print(f"Processing {len(games)} new games from {shard_path}...")
+            new_shard_games.extend(games)
+            shard_games[name] = first + len(games)
+
+    if not new_files and store_watermark == store_size and not new_shard_games:
+        print("No new games since last training.")
+        return
+
+    new_data = []
+    for file_path in new_files:
+        print(f"Processing {file_path}...")
+        new_data.extend(parse_pgn_file(file_path))
+    new_data.extend(load_store_games(store, range(store_watermark, store_size)))
+    new_data.extend(load_games(new_shard_games))
+
+    # Bounded replay sample of older games to avoid forgetting
+    replay_data = []
+    old_games = ([("pgn", path) for path in old_files] + [("shard", path) for path in old_shards]
+                 + [("store", game_id) for game_id in range(store_watermark)])
+    for source, item in random.sample(old_games, min(REPLAY_FILES, len(old_games))):
+        if source == "pgn":
+            replay_data.extend(parse_pgn_file(item))
+        elif source == "shard":
+            replay_data.extend(load_shard_games(item))
+        else:
+            replay_data.extend(load_store_games(store, [item]))
+    if len(replay_data) > REPLAY_SAMPLES:
+        replay_data = random.sample(replay_data, REPLAY_SAMPLES)
+
+    all_data = new_data + replay_data
+    if not all_data:
+        print("No valid PGN data found!")
+        return
+    with training_metrics.timed("stack", items=len(all_data)):
+        X_train = np.array([x[0] for x in all_data])
+        y_train = np.array([x[1] for x in all_data])
+    print(f"Fine-tuning on {len(new_data)} new and {len(replay_data)} replay positions...")
 
-# Train Model
-model.fit(X_train, y_train, epochs=10, batch_size=32, validation_split=0.1)
+    model = tf.keras.models.load_model(MODEL_PATH, compile=False)
+    model.compile(optimizer=Adam(learning_rate=FINE_TUNE_LEARNING_RATE), loss="mse", metrics=["mae"])
+    with training_metrics.timed("fit", items=len(X_train) * INCREMENTAL_EPOCHS):
+        model.fit(X_train, y_train, epochs=INCREMENTAL_EPOCHS, batch_size=32, shuffle=True,
+                  callbacks=[ProgressLogger(len(X_train))])
 
-# Save Model
-model.save(MODEL_PATH)
-print(f"Model saved to {MODEL_PATH}")
+    with training_metrics.timed("save"):
+        save_model(model)
+    save_state({"watermark": files[-1][0] if files else state["watermark"], "store_watermark": store_size,
+                "shard_games": shard_games})
 
+if __name__ == "__main__":
+    training_metrics.start_run("train_custom", incremental="--incremental" in sys.argv,
+                               dedup="--dedup" in sys.argv)
+    try:
+        if "--incremental" in sys.argv:
+            train_incremental()
+        else:
+            train_full(dedup="--dedup" in sys.argv)
+    finally:
+        training_metrics.end_run()
@@ -1,20 +1,8 @@
-from tensorflow.keras.models import Sequential
-from tensorflow.keras.layers import Dense, Dropout
 import numpy as np
+import architectures
 
-# Define the new 5-7 layer model
-model = Sequential([
-    Dense(256, activation='relu', input_shape=(768,)),  # Input layer with 256 neurons
-    Dropout(0.2),  # Dropout for regularization
-    Dense(128, activation='relu'),  # Hidden layer with 128 neurons
-    Dropout(0.2),  # Dropout for regularization
-    Dense(64, activation='relu'),  # Hidden layer with 64 neurons
-    Dense(32, activation='relu'),  # Hidden layer with 32 neurons
-    Dense(1, activation='linear')  # Output layer with 1 neuron
-])
-
-# Compile the model
-model.compile(optimizer='adam', loss='mse', metrics=['mae'])
+# Define the new 5-7 layer model: 256-128-64-32 with dropout after the first two layers
+model = architectures.build_model("deep")
 
 # Print the model summary
 model.summary()
@@ -27,5 +15,5 @@ training_labels = np.random.rand(1000)  # Example: 1000 labels
 # Train the model
 model.fit(training_data, training_labels, epochs=10, batch_size=32, validation_split=0.2)
 
-# Save the trained model
-model.save("chess_model_complex.h5")
\ No newline at end of file
+# Save the trained model (distill.py's default teacher); chess_model_complex.h5 is train_custom.py's
+model.save("chess_model_deep.h5")
\ No newline at end of file
@@ -3,25 +3,38 @@ import chess
 import chess.pgn
 import numpy as np
 import tensorflow as tf
-from tensorflow.keras.models import Sequential
-from tensorflow.keras.layers import Dense, Flatten
 from tensorflow.keras.optimizers import Adam
-from collections import deque
 import random
+import time
+from game_store import GameStore, encode_move
+from replay_buffer import ReplayBuffer, PrioritizedReplayBuffer, STATE_SIZE
+from mcts import MCTS
+from rl_checkpoint import Checkpointer, CHECKPOINT_DIR
+from selfplay_shards import ShardWriter, shard_paths, read_games, SHARD_DIR
+import model_artifact
+import architectures
+import training_metrics
 
 TRAIN_FOLDER = "train"
+MCTS_TEMPERATURE_PLIES = 10  # Self-play samples moves by visit count in the opening
 MODEL_PATH = "chess_model_complex.keras"  # Use native Keras format
+CHECKPOINT_SECONDS = 300  # Self-play checkpoint interval
 
 class RLChessAgent:
-    def __init__(self, load_existing=True):
+    def __init__(self, load_existing=True, prioritized=False):
+        self.learning_rate = 0.001  # Needed by build_model
         self.model = self.build_model()
         self.target_model = self.build_model()
-        self.memory = deque(maxlen=10000)  # Experience replay buffer
+        # Experience replay buffer: uniform or sum-tree prioritized by TD error
+        self.prioritized = prioritized
+        if prioritized:
+            self.memory = PrioritizedReplayBuffer(maxlen=10000)
+        else:
+            self.memory = ReplayBuffer(maxlen=10000)
         self.epsilon = 0.9  # Exploration rate
         self.epsilon_decay = 0.995
         self.epsilon_min = 0.01
         self.gamma = 0.95  # Discount factor
-        self.learning_rate = 0.001
         
         if load_existing and os.path.exists(MODEL_PATH):
             try:
@@ -38,24 +51,19 @@ class RLChessAgent:
     
     def build_model(self):
         """Build the neural network model for RL."""
-        model = Sequential([
-            Dense(128, activation="relu", input_shape=(8*8*12,)),
-            Dense(64, activation="relu"),
-            Dense(32, activation="relu"),
-            Dense(1, activation="linear")  # Q-value output
-        ])
-        
-        model.compile(optimizer=Adam(learning_rate=self.learning_rate), 
-                     loss="mse", metrics=["mae"])
-        return model
+        return architectures.build_model("standard", self.learning_rate)  # Q-value output
     
     def update_target_model(self):
         """Copy weights from main model to target model."""
         self.target_model.set_weights(self.model.get_weights())
     
-    def remember(self, state, action, reward, next_state, done):
-        """Store experience in replay buffer."""
-        self.memory.append((state, action, reward, next_state, done))
+    def remember_game(self, states, moves, final_reward):
+        """Store every position of a finished game in the replay buffer in one call.
+
+        states is the game's stacked (positions, 768) array and moves the
+        move played from each position.
+        """
+        self.memory.append_game(states, [encode_move(move) for move in moves], final_reward, self.gamma)
     
     def choose_move(self, board, training=True):
         """Choose move with epsilon-greedy exploration."""
@@ -114,16 +122,9 @@ class RLChessAgent:
         if len(self.memory) < batch_size:
             return
         
-        batch = random.sample(self.memory, batch_size)
-        states = np.array([e[0] for e in batch])
-        actions = np.array([e[1] for e in batch])
-        rewards = np.array([e[2] for e in batch])
-        next_states = np.array([e[3] for e in batch])
-        dones = np.array([e[4] for e in batch])
-        
-        # Reshape states
-        states = states.reshape(batch_size, -1)
-        next_states = next_states.reshape(batch_size, -1)
+        step_start = time.time()
+        indices, weights = self.memory.sample(batch_size)
+        states, rewards, next_states, dones = self.memory.batch(indices)
         
         # Current Q-values
         current_q_values = self.model.predict(states, verbose=0)
@@ -133,14 +134,20 @@ class RLChessAgent:
         
         # Calculate target Q-values
         target_q_values = current_q_values.copy()
-        for i in range(batch_size):
-            if dones[i]:
-                target_q_values[i][0] = rewards[i]
-            else:
-                target_q_values[i][0] = rewards[i] + self.gamma * np.max(next_q_values[i])
+        target_q_values[:, 0] = np.where(dones, rewards, rewards + self.gamma * next_q_values.max(axis=1))
         
-        # Train the model
-        self.model.fit(states, target_q_values, epochs=1, verbose=0)
+        # New priorities from the TD errors of the whole batch at once
+        if self.prioritized:
+            self.memory.update_priorities(indices, target_q_values[:, 0] - current_q_values[:, 0])
+        
+        # Train the model (importance-sampling weights correct the prioritized bias)
+        history = self.model.fit(states, target_q_values, sample_weight=weights, epochs=1, verbose=0)
+        
+        elapsed = max(time.time() - step_start, 1e-9)
+        training_metrics.count("replay_steps")
+        training_metrics.log("replay_step", batch_size=batch_size, seconds=round(elapsed, 4),
+                             samples_per_sec=batch_size / elapsed, loss=float(history.history["loss"][0]),
+                             replay_size=len(self.memory), epsilon=self.epsilon)
         
         # Decay epsilon
         if self.epsilon > self.epsilon_min:
@@ -152,7 +159,8 @@ def parse_pgn_file_rl(pgn_path):
     
     with open(pgn_path, "r") as pgn_file:
         while True:
-            game = chess.pgn.read_game(pgn_file)
+            with training_metrics.timed("parse"):
+                game = chess.pgn.read_game(pgn_file)
             if game is None:
                 break
             
@@ -170,17 +178,69 @@ def parse_pgn_file_rl(pgn_path):
                 reward = 0.0
             
             # Extract game moves
-            board = game.board()
-            moves = []
-            for move in game.mainline_moves():
-                state = board_to_input_simple(board)
-                moves.append((state, move))
-                board.push(move)
+            with training_metrics.timed("encode"):
+                board = game.board()
+                states, moves = [], []
+                for move in game.mainline_moves():
+                    states.append(board_to_input_simple(board))
+                    moves.append(move)
+                    board.push(move)
+                states = np.array(states, dtype=np.float32).reshape(len(moves), STATE_SIZE)
             
-            game_data.append((moves, reward))
+            game_data.append((states, moves, reward))
+            training_metrics.count("games")
+            training_metrics.count("positions", len(moves))
+    
+    return game_data
+
+def load_store_games_rl(store, game_ids=None):
+    """Extract game data for RL training from the binary game store (no PGN parsing)."""
+    game_data = []
+    game_ids = range(len(store)) if game_ids is None else game_ids
+    
+    for game_id in game_ids:
+        result = store.result(game_id)
+        if result == "*":
+            continue  # Skip unfinished games
+        
+        # Convert result to reward
+        if result == "1-0":  # White wins
+            reward = 1.0
+        elif result == "0-1":  # Black wins
+            reward = -1.0
+        else:  # Draw
+            reward = 0.0
+        
+        with training_metrics.timed("encode"):
+            states, moves = [], []
+            for board, move in store.boards(game_id):
+                states.append(board_to_input_simple(board))
+                moves.append(move)
+            states = np.array(states, dtype=np.float32).reshape(len(moves), STATE_SIZE)
+        game_data.append((states, moves, reward))
+        training_metrics.count("games")
+        training_metrics.count("positions", len(moves))
     
     return game_data
 
+def load_shard_games_rl(shard_path):
+    """Extract game data for RL training from a compressed self-play shard."""
+    game_data = []
+    for board, moves, result in read_games(shard_path):
+        if result == "*":
+            continue  # Skip unfinished games (move limit reached)
+        reward = 1.0 if result == "1-0" else -1.0 if result == "0-1" else 0.0
+        with training_metrics.timed("encode"):
+            states = []
+            for move in moves:
+                states.append(board_to_input_simple(board))
+                board.push(move)
+            states = np.array(states, dtype=np.float32).reshape(len(moves), STATE_SIZE)
+        game_data.append((states, moves, reward))
+        training_metrics.count("games")
+        training_metrics.count("positions", len(moves))
+    return game_data
+
 def board_to_input_simple(board):
     """Simple board to input conversion."""
     input_array = np.zeros((8, 8, 12), dtype=np.float32)
@@ -199,11 +259,8 @@ def board_to_input_simple(board):
         input_array[row, col, index] = 1
     return input_array.flatten()
 
-def train_from_games():
-    """Train the RL agent from played games."""
-    agent = RLChessAgent()
-    
-    # Load game data
+def load_all_game_data():
+    """Load RL game data from the train folder, the game store and the self-play shards."""
     all_game_data = []
     for file in os.listdir(TRAIN_FOLDER):
         if file.endswith(".pgn"):
@@ -211,6 +268,28 @@ def train_from_games():
             print(f"Processing {file_path}...")
             all_game_data.extend(parse_pgn_file_rl(file_path))
     
+    store = GameStore()
+    if len(store):
+        print(f"Processing {len(store)} games from {store.path}...")
+        all_game_data.extend(load_store_games_rl(store))
+    
+    for _, shard_path in shard_paths(SHARD_DIR):
+        print(f"Processing {shard_path}...")
+        all_game_data.extend(load_shard_games_rl(shard_path))
+    return all_game_data
+
+def remember_games(agent, all_game_data):
+    """Store the experiences of finished games in the agent's replay buffer."""
+    for states, moves, final_reward in all_game_data:
+        agent.remember_game(states, moves, final_reward)
+
+def train_from_games(prioritized=False):
+    """Train the RL agent from played games."""
+    agent = RLChessAgent(prioritized=prioritized)
+    
+    # Load game data
+    all_game_data = load_all_game_data()
+    
     if not all_game_data:
         print("No game data found for training!")
         return
@@ -218,27 +297,14 @@ def train_from_games():
     print(f"Training on {len(all_game_data)} games...")
     
     # Train from game outcomes
-    for game_moves, final_reward in all_game_data:
-        for i, (state, move) in enumerate(game_moves):
-            # Calculate discounted reward
-            steps_to_end = len(game_moves) - i - 1
-            discounted_reward = final_reward * (agent.gamma ** steps_to_end)
-            
-            # Get next state
-            if i < len(game_moves) - 1:
-                next_state = game_moves[i + 1][0]
-                done = False
-            else:
-                next_state = state  # Terminal state
-                done = True
-            
-            # Store experience
-            agent.remember(state, move, discounted_reward, next_state, done)
+    with training_metrics.timed("remember"):
+        remember_games(agent, all_game_data)
     
     # Train on experiences
     print("Training neural network...")
     for epoch in range(50):
-        agent.replay_train()
+        with training_metrics.timed("replay", items=32):
+            agent.replay_train()
         if epoch % 10 == 0:
             print(f"Epoch {epoch}, Epsilon: {agent.epsilon:.3f}")
     
@@ -248,84 +314,194 @@ def train_from_games():
     # Save model
     agent.model.save(MODEL_PATH, save_format='keras')
     print(f"RL model saved to {MODEL_PATH}")
+    model_artifact.save_model(agent.model, source="train_rl")  # Picked up by running engines
+
+def mcts_self_play_move(tree, board, num_nodes, move_count):
+    """Search board with MCTS; early moves are sampled in proportion to visits for variety."""
+    move = tree.search(board, num_nodes)
+    if move is not None and move_count < MCTS_TEMPERATURE_PLIES:
+        moves, visits = zip(*tree.visit_counts())
+        visits = np.array(visits, dtype=np.float64)
+        move = moves[np.random.choice(len(moves), p=visits / visits.sum())]
+    return move
 
-def self_play_training(num_games=100):
-    """Train through self-play."""
-    agent = RLChessAgent()
+def self_play_training(num_games=100, prioritized=False, mcts_nodes=0, resume=False,
+                       checkpoint_dir=CHECKPOINT_DIR, shard_dir=SHARD_DIR):
+    """Train through self-play.
+
+    With mcts_nodes > 0 moves come from a batched tree search of that many
+    evaluated positions instead of epsilon-greedy 1-ply play. A checkpoint
+    is taken every CHECKPOINT_SECONDS; with resume, training continues from
+    the last one. Every game is also exported to compressed shards in
+    shard_dir (None to disable).
+    """
+    agent = RLChessAgent(prioritized=prioritized)
+    checkpointer = Checkpointer(checkpoint_dir)
+    first_game = 0
+    if resume:
+        progress = checkpointer.restore(agent)
+        if progress is None:
+            print(f"No checkpoint in {checkpoint_dir}; starting from the first game.")
+        else:
+            first_game, num_games = progress["game_num"], progress["num_games"]
+            print(f"Resuming self-play at game {first_game} of {num_games} "
+                  f"(checkpoint {progress['created']}, {len(agent.memory)} experiences)")
+    shards = ShardWriter(shard_dir) if shard_dir else None
+    try:
+        tree = None
+        if mcts_nodes > 0:
+            tree = MCTS(agent.board_to_input, lambda batch: agent.model.predict(batch, verbose=0).flatten())
     
-    print(f"Starting self-play training for {num_games} games...")
+        print(f"Starting self-play training for {num_games} games...")
     
-    for game_num in range(num_games):
-        board = chess.Board()
-        game_moves = []
+        last_checkpoint = time.time()
+        for game_num in range(first_game, num_games):
+            game_start = time.time()
+            board = chess.Board()
+            states, moves = [], []
+            if tree is not None:
+                tree.reset()  # Weights may have changed since the last game
         
-        # Play a complete game
-        move_count = 0
-        while not board.is_game_over() and move_count < 200:  # Limit game length
-            state = agent.board_to_input(board).flatten()
-            move = agent.choose_move(board, training=True)
+            # Play a complete game
+            move_count = 0
+            while not board.is_game_over() and move_count < 200:  # Limit game length
+                state = agent.board_to_input(board).flatten()
+                if tree is not None:
+                    move = mcts_self_play_move(tree, board, mcts_nodes, move_count)
+                else:
+                    move = agent.choose_move(board, training=True)
             
-            if move is None:
-                break
+                if move is None:
+                    break
             
-            game_moves.append((state, move))
-            board.push(move)
-            move_count += 1
-        
-        # Determine game result
-        result = board.result()
-        if result == "1-0":
-            reward = 1.0
-        elif result == "0-1":
-            reward = -1.0
-        else:
-            reward = 0.0
+                states.append(state)
+                moves.append(move)
+                board.push(move)
+                move_count += 1
         
-        # Store experiences
-        for i, (state, move) in enumerate(game_moves):
-            steps_to_end = len(game_moves) - i - 1
-            discounted_reward = reward * (agent.gamma ** steps_to_end)
-            
-            if i < len(game_moves) - 1:
-                next_state = game_moves[i + 1][0]
-                done = False
+            # Determine game result
+            result = board.result()
+            if result == "1-0":
+                reward = 1.0
+            elif result == "0-1":
+                reward = -1.0
             else:
-                next_state = state
-                done = True
-            
-            agent.remember(state, move, discounted_reward, next_state, done)
+                reward = 0.0
+            game_seconds = max(time.time() - game_start, 1e-9)
+            training_metrics.add_time("self_play", game_seconds, items=move_count)
         
-        # Train periodically
-        if game_num % 10 == 0:
-            agent.replay_train()
-            agent.update_target_model()
-            print(f"Game {game_num}, Result: {result}, Epsilon: {agent.epsilon:.3f}")
+            # Store experiences
+            agent.remember_game(np.array(states, dtype=np.float32).reshape(len(moves), STATE_SIZE), moves, reward)
+            if shards is not None:
+                shards.add(moves, result)
+            training_metrics.count("games")
+            training_metrics.log("game", game=game_num, moves=move_count, result=result,
+                                 seconds=round(game_seconds, 3), moves_per_sec=move_count / game_seconds,
+                                 replay_size=len(agent.memory))
+        
+            # Train periodically
+            if game_num % 10 == 0:
+                with training_metrics.timed("replay", items=32):
+                    agent.replay_train()
+                agent.update_target_model()
+                print(f"Game {game_num}, Result: {result}, Epsilon: {agent.epsilon:.3f}")
+        
+            if time.time() - last_checkpoint >= CHECKPOINT_SECONDS:
+                with training_metrics.timed("checkpoint"):
+                    checkpointer.save(agent, {"game_num": game_num + 1, "num_games": num_games})
+                last_checkpoint = time.time()
     
-    # Final training
-    for _ in range(20):
-        agent.replay_train()
+        # Final training
+        for _ in range(20):
+            with training_metrics.timed("replay", items=32):
+                agent.replay_train()
+    
+        checkpointer.save(agent, {"game_num": num_games, "num_games": num_games})
+        checkpointer.wait()
+    finally:
+        if shards is not None:
+            shards.close()  # Writes the games still queued
     
     agent.model.save(MODEL_PATH, save_format='keras')
     print(f"Self-play training completed. Model saved to {MODEL_PATH}")
+    model_artifact.save_model(agent.model, source="train_rl")  # Picked up by running engines
+
+def benchmark_replay(target_loss=0.05, max_steps=1000, eval_every=10, eval_size=512, batch_size=32):
+    """Compare replay steps needed to reach target_loss with uniform and prioritized replay.
+
+    Both agents start from identical weights and the same frozen target
+    network, and are scored on the same fixed sample of experiences.
+    """
+    all_game_data = load_all_game_data()
+    if not all_game_data:
+        print("No game data found for benchmark!")
+        return
+
+    uniform = RLChessAgent(load_existing=False)
+    prioritized = RLChessAgent(load_existing=False, prioritized=True)
+    prioritized.model.set_weights(uniform.model.get_weights())
+    prioritized.update_target_model()
+    uniform.update_target_model()
+    remember_games(uniform, all_game_data)
+    remember_games(prioritized, all_game_data)
+
+    # Fixed evaluation set with targets from the shared frozen target network
+    eval_slots = np.random.choice(len(uniform.memory), min(eval_size, len(uniform.memory)), replace=False)
+    states, rewards, next_states, dones = uniform.memory.batch(eval_slots)
+    next_q = uniform.target_model.predict(next_states, verbose=0)[:, 0]
+    targets = np.where(dones, rewards, rewards + uniform.gamma * next_q)
+
+    results = {}
+    for name, agent in (("uniform", uniform), ("prioritized", prioritized)):
+        start = time.time()
+        steps_to_target = None
+        loss = float("nan")
+        for step in range(1, max_steps + 1):
+            agent.replay_train(batch_size)
+            if step % eval_every == 0:
+                loss = float(np.mean((agent.model.predict(states, verbose=0)[:, 0] - targets) ** 2))
+                if loss <= target_loss:
+                    steps_to_target = step
+                    break
+        results[name] = (steps_to_target, loss, time.time() - start)
+
+    print(f"Replay benchmark (target loss {target_loss}, batch {batch_size}):")
+    for name, (steps, loss, elapsed) in results.items():
+        reached = f"{steps} steps" if steps else f"not reached in {max_steps} steps"
+        print(f"  {name:12s} {reached}, final loss {loss:.4f}, {elapsed:.1f}s")
+    return results
 
 if __name__ == "__main__":
     print("Chess RL Training")
     
     # Check if running from GUI (no interactive input available)
     import sys
-    if len(sys.argv) > 1 and sys.argv[1] == "--auto":
-        # Auto mode: train from existing games
-        train_from_games()
-    else:
-        # Interactive mode
-        print("1. Train from existing games")
-        print("2. Self-play training")
-        choice = input("Choose training mode (1 or 2): ")
-        
-        if choice == "1":
-            train_from_games()
-        elif choice == "2":
-            self_play_training()
+    prioritized = "--prioritized" in sys.argv  # Prioritized experience replay
+    mcts_nodes = 0  # --mcts-nodes N: self-play moves from a tree search
+    if "--mcts-nodes" in sys.argv:
+        mcts_nodes = int(sys.argv[sys.argv.index("--mcts-nodes") + 1])
+    training_metrics.start_run("train_rl", prioritized=prioritized, mcts_nodes=mcts_nodes)
+    try:
+        if "--bench-replay" in sys.argv:
+            benchmark_replay()
+        elif "--resume" in sys.argv:
+            # Continue an interrupted self-play run from its last checkpoint
+            self_play_training(prioritized=prioritized, mcts_nodes=mcts_nodes, resume=True)
+        elif len(sys.argv) > 1 and sys.argv[1] == "--auto":
+            # Auto mode: train from existing games
+            train_from_games(prioritized)
         else:
-            print("Invalid choice. Training from existing games...")
-            train_from_games()
+            # Interactive mode
+            print("1. Train from existing games")
+            print("2. Self-play training")
+            choice = input("Choose training mode (1 or 2): ")
+        
+            if choice == "1":
+                train_from_games(prioritized)
+            elif choice == "2":
+                self_play_training(prioritized=prioritized, mcts_nodes=mcts_nodes)
+            else:
+                print("Invalid choice. Training from existing games...")
+                train_from_games(prioritized)
+    finally:
+        training_metrics.end_run()
@@ -0,0 +1,233 @@
+"""
+Training Throughput Telemetry
+
+Records where training time goes: seconds per phase (PGN parsing, encoding,
+fitting, self-play, replay steps), samples/sec per epoch or replay step,
+peak RSS and replay buffer size. Every run writes one JSONL file:
+
+    {"event": "run", "run_id", "script", "argv", "host", "metadata", ...}
+    {"event": "epoch" | "replay_step" | "game", "t", "rss_mb", ...}
+    {"event": "summary", "wall_seconds", "phases", "counters", "peak_rss_mb"}
+
+The trainers call the module-level functions (start_run, timed, add_time,
+count, log, end_run); without an active run they do nothing, so library code can
+be instrumented unconditionally.
+
+Usage: python training_metrics.py list
+       python training_metrics.py compare RUN_A RUN_B
+"""
+
+import os
+import sys
+import json
+import time
+import socket
+import platform
+from contextlib import contextmanager
+
+METRICS_DIR = "metrics"
+
+_run = None
+
+
+def peak_rss_mb():
+    """Peak resident set size of this process in MB, or None if unknown."""
+    try:
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # Linux reports kilobytes, macOS bytes
+        return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+    except ImportError:
+        pass
+    try:
+        import ctypes
+        from ctypes import wintypes
+
+        class ProcessMemoryCounters(ctypes.Structure):
+            _fields_ = [("cb", wintypes.DWORD), ("PageFaultCount", wintypes.DWORD),
+                        ("PeakWorkingSetSize", ctypes.c_size_t), ("WorkingSetSize", ctypes.c_size_t),
+                        ("QuotaPeakPagedPoolUsage", ctypes.c_size_t), ("QuotaPagedPoolUsage", ctypes.c_size_t),
+                        ("QuotaPeakNonPagedPoolUsage", ctypes.c_size_t), ("QuotaNonPagedPoolUsage", ctypes.c_size_t),
+                        ("PagefileUsage", ctypes.c_size_t), ("PeakPagefileUsage", ctypes.c_size_t)]
+
+        counters = ProcessMemoryCounters()
+        counters.cb = ctypes.sizeof(counters)
+        process = ctypes.windll.kernel32.GetCurrentProcess()
+        if ctypes.windll.psapi.GetProcessMemoryInfo(process, ctypes.byref(counters), counters.cb):
+            return counters.PeakWorkingSetSize / (1024 * 1024)
+    except (ImportError, AttributeError, OSError):
+        pass
+    return None
+
+
+class RunMetrics:
+    """Phase timers, counters and event log of one training run."""
+
+    def __init__(self, script, metadata=None, directory=METRICS_DIR):
+        os.makedirs(directory, exist_ok=True)
+        self.start = time.time()
+        self.run_id = f"{script}_{time.strftime('%Y%m%d_%H%M%S')}_{os.getpid()}"
+        self.path = os.path.join(directory, self.run_id + ".jsonl")
+        self.phases = {}  # name -> {"seconds", "calls", "items"}
+        self.counters = {}
+        self.file = open(self.path, "a")
+        self._write({
+            "event": "run",
+            "run_id": self.run_id,
+            "script": script,
+            "argv": sys.argv[1:],
+            "started": time.strftime("%Y-%m-%d %H:%M:%S"),
+            "host": socket.gethostname(),
+            "platform": platform.platform(),
+            "python": platform.python_version(),
+            "cpu_count": os.cpu_count(),
+            "metadata": metadata or {},
+        })
+
+    def _write(self, record):
+        self.file.write(json.dumps(record) + "\n")
+        self.file.flush()
+
+    def add_time(self, phase, seconds, items=0):
+        totals = self.phases.setdefault(phase, {"seconds": 0.0, "calls": 0, "items": 0})
+        totals["seconds"] += seconds
+        totals["calls"] += 1
+        totals["items"] += items
+
+    def count(self, name, amount=1):
+        self.counters[name] = self.counters.get(name, 0) + amount
+
+    def log(self, event, **fields):
+        record = {"event": event, "t": round(time.time() - self.start, 3), "rss_mb": peak_rss_mb()}
+        record.update(fields)
+        self._write(record)
+
+    def close(self):
+        self._write({
+            "event": "summary",
+            "wall_seconds": round(time.time() - self.start, 3),
+            "phases": self.phases,
+            "counters": self.counters,
+            "peak_rss_mb": peak_rss_mb(),
+        })
+        self.file.close()
+        print(f"Training metrics written to {self.path}")
+
+
+def start_run(script, **metadata):
+    """Start recording a run; returns the RunMetrics."""
+    global _run
+    if _run is not None:
+        _run.close()
+    _run = RunMetrics(script, metadata)
+    return _run
+
+
+def end_run():
+    global _run
+    if _run is not None:
+        _run.close()
+        _run = None
+
+
+@contextmanager
+def timed(phase, items=0):
+    """Add the wall time of the with-block to a phase of the active run."""
+    if _run is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        _run.add_time(phase, time.perf_counter() - start, items)
+
+
+def add_time(phase, seconds, items=0):
+    """Add already measured seconds to a phase of the active run."""
+    if _run is not None:
+        _run.add_time(phase, seconds, items)
+
+
+def count(name, amount=1):
+    if _run is not None:
+        _run.count(name, amount)
+
+
+def log(event, **fields):
+    if _run is not None:
+        _run.log(event, **fields)
+
+
+def read_run(path):
+    """Return (run record, [event records], summary or None) of a metrics file."""
+    run, events, summary = None, [], None
+    with open(path, "r") as metrics_file:
+        for line in metrics_file:
+            record = json.loads(line)
+            if record["event"] == "run":
+                run = record
+            elif record["event"] == "summary":
+                summary = record
+            else:
+                events.append(record)
+    return run, events, summary
+
+
+def run_stats(path):
+    """Flatten a run into {label: value} rows for comparison."""
+    _, events, summary = read_run(path)
+    stats = {}
+    if summary:
+        stats["wall seconds"] = summary["wall_seconds"]
+        for phase, totals in sorted(summary["phases"].items()):
+            stats[f"{phase} seconds"] = totals["seconds"]
+            if totals["items"]:
+                stats[f"{phase} items/sec"] = totals["items"] / max(totals["seconds"], 1e-9)
+        for name, value in sorted(summary["counters"].items()):
+            stats[name] = value
+        stats["peak RSS MB"] = summary["peak_rss_mb"]
+    for event in ("epoch", "replay_step"):
+        rates = [e["samples_per_sec"] for e in events if e["event"] == event and "samples_per_sec" in e]
+        if rates:
+            stats[f"{event} samples/sec (mean)"] = sum(rates) / len(rates)
+    sizes = [e["replay_size"] for e in events if "replay_size" in e]
+    if sizes:
+        stats["replay buffer size (max)"] = max(sizes)
+    return stats
+
+
+def resolve(run):
+    """Accept a metrics file path or a run id in METRICS_DIR."""
+    if os.path.exists(run):
+        return run
+    return os.path.join(METRICS_DIR, run if run.endswith(".jsonl") else run + ".jsonl")
+
+
+def compare(path_a, path_b):
+    stats_a, stats_b = run_stats(path_a), run_stats(path_b)
+    print(f"A: {path_a}\nB: {path_b}\n")
+    print(f"{'metric':32s} {'A':>12} {'B':>12} {'change':>9}")
+    for label in list(stats_a) + [label for label in stats_b if label not in stats_a]:
+        a, b = stats_a.get(label), stats_b.get(label)
+        change = f"{(b - a) / a:+.1%}" if a and b is not None else ""
+        print(f"{label:32s} {'-' if a is None else f'{a:.2f}':>12} {'-' if b is None else f'{b:.2f}':>12} {change:>9}")
+
+
+def main():
+    if len(sys.argv) == 2 and sys.argv[1] == "list":
+        if os.path.isdir(METRICS_DIR):
+            for name in sorted(os.listdir(METRICS_DIR)):
+                if name.endswith(".jsonl"):
+                    run, _, summary = read_run(os.path.join(METRICS_DIR, name))
+                    wall = f"{summary['wall_seconds']:.0f}s" if summary else "unfinished"
+                    print(f"{name[:-6]}  {wall}  {' '.join(run['argv']) if run else ''}")
+    elif len(sys.argv) == 4 and sys.argv[1] == "compare":
+        compare(resolve(sys.argv[2]), resolve(sys.argv[3]))
+    else:
+        print("Usage: python training_metrics.py list | compare RUN_A RUN_B")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()